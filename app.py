@@ -1,12 +1,14 @@
 """
 LLM Runner - MVP приложение для сравнения LLM моделей
 """
-import streamlit as st
 import os
-from dotenv import load_dotenv
+
+import streamlit as st
+
+from llm_runner.ui.registry import PAGES, load_environment, load_page
 
 # Загружаем переменные окружения
-load_dotenv()
+load_environment()
 
 # Настройка страницы
 st.set_page_config(
@@ -27,20 +29,11 @@ def main():
         return
     
     # Навигация по страницам
-    pages = {
-        "📊 Dataset": "llm_runner.ui.pages.dataset",
-        "🚀 Runs": "llm_runner.ui.pages.runs", 
-        "⭐ Evaluate": "llm_runner.ui.pages.evaluate",
-        "📋 History": "llm_runner.ui.pages.history",
-        "⚙️ Settings": "llm_runner.ui.pages.settings"
-    }
-    
-    selected_page = st.sidebar.selectbox("Выберите страницу:", list(pages.keys()))
+    selected_page = st.sidebar.selectbox("Выберите страницу:", list(PAGES.keys()))
     
     # Импортируем и запускаем выбранную страницу
     try:
-        module_name = pages[selected_page]
-        module = __import__(module_name, fromlist=['main'])
+        module = load_page(PAGES[selected_page])
         module.main()
     except ImportError as e:
         st.error(f"Ошибка загрузки страницы: {e}")
@@ -0,0 +1,292 @@
+"""
+Микро-бенчмарки репозиториев на синтетических базах реального масштаба
+
+Запуск:
+    python benchmarks/bench_repo.py --sizes 10000 100000 1000000
+
+Каждый размер засевается в отдельный SQLite файл (benchmarks/.data/),
+затем замеряются операции, которые реально выполняют страницы. Кэш
+запросов (db.cache) выключен: повторы иначе измеряют попадания в LRU,
+а не SQLite; --query-cache включает его для сравнения.
+Результаты дописываются в benchmarks/results/history.jsonl вместе с
+хешем коммита, а таблица сравнивается с последним замером другого коммита.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from sqlalchemy import func, insert
+
+from llm_runner.db.models import Base, Task, Run, Evaluation, create_engine_and_session, init_database
+
+from common import ROOT, compare, git_revision, load_history, save_results
+
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", ".data")
+
+MODELS = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo", "gpt-4o", "gpt-4o-mini", "claude-3-haiku", "llama-3-70b", "mistral-large"]
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua".split()
+
+RUNS_PER_TASK = 100
+ERROR_RATE = 0.05
+EVALUATED_RATE = 0.3
+SEED_CHUNK = 20000
+
+
+def _text(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def seed_database(path: str, runs_count: int, seed: int = 42) -> None:
+    """Создает SQLite файл с runs_count синтетическими запусками"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.environ["LLM_RUNNER_DB"] = path
+    engine, _ = create_engine_and_session()
+    Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    tasks_count = max(10, runs_count // RUNS_PER_TASK)
+    task_ids = [str(uuid.uuid4()) for _ in range(tasks_count)]
+
+    with engine.begin() as conn:
+        conn.execute(insert(Task), [
+            {
+                "id": task_id,
+                "name": f"Task {i}",
+                "prompt_template": _text(rng, 10, 40),
+                "input_text": _text(rng, 0, 60),
+                "created_at": now - timedelta(days=rng.uniform(0, 365))
+            }
+            for i, task_id in enumerate(task_ids)
+        ])
+
+    inserted = 0
+    while inserted < runs_count:
+        chunk = min(SEED_CHUNK, runs_count - inserted)
+        runs, evaluations = [], []
+        for _ in range(chunk):
+            run_id = str(uuid.uuid4())
+            started = now - timedelta(seconds=rng.uniform(0, 365 * 86400))
+            is_error = rng.random() < ERROR_RATE
+            prompt_tokens = rng.randint(20, 400)
+            completion_tokens = 0 if is_error else rng.randint(10, 600)
+            runs.append({
+                "id": run_id,
+                "task_id": rng.choice(task_ids),
+                "provider": "comet",
+                "model": rng.choice(MODELS),
+                "params_json": json.dumps({"temperature": round(rng.uniform(0, 1.5), 1), "max_tokens": 1000, "top_p": 0.9}),
+                "messages_json": json.dumps([{"role": "user", "content": _text(rng, 10, 60)}]),
+                "started_at": started,
+                "ended_at": started + timedelta(milliseconds=rng.randint(200, 8000)),
+                "latency_ms": rng.randint(200, 8000),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "finish_reason": None if is_error else "stop",
+                "response_text": None if is_error else _text(rng, 10, 120),
+                "response_json": None if is_error else json.dumps({"id": run_id, "choices": [{"index": 0}]}),
+                "error": "Ошибка сервера: 502" if is_error else None
+            })
+            if not is_error and rng.random() < EVALUATED_RATE:
+                evaluations.append({
+                    "id": str(uuid.uuid4()),
+                    "run_id": run_id,
+                    "rating": rng.randint(1, 5),
+                    "comment": None,
+                    "created_at": started + timedelta(hours=1)
+                })
+        with engine.begin() as conn:
+            conn.execute(insert(Run), runs)
+            if evaluations:
+                conn.execute(insert(Evaluation), evaluations)
+        inserted += chunk
+        logger.info(f"Засеяно {inserted}/{runs_count} запусков")
+    # Индексы и FTS строятся после вставки: так быстрее, чем триггерами по строке
+    init_database()
+    engine.dispose()
+
+
+def time_op(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Запускает fn repeat раз и возвращает min/median в миллисекундах"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": min(samples), "median_ms": statistics.median(samples), "n": repeat}
+
+
+def run_benchmarks(
+    path: str,
+    runs_count: int,
+    repeat: int,
+    ops: Optional[List[str]] = None,
+    use_cache: bool = False
+) -> Dict[str, Dict[str, float]]:
+    """Замеряет операции репозиториев на засеянной базе"""
+    os.environ["LLM_RUNNER_DB"] = path
+    from llm_runner.db.cache import query_cache
+    from llm_runner.db.repo import DatabaseManager
+    from llm_runner.db.writer import DatabaseWriter
+
+    query_cache.enabled = use_cache
+    query_cache.clear()
+
+    db_manager = DatabaseManager()
+    rng = random.Random(7)
+
+    with db_manager.get_session() as session:
+        sample_run_ids = [r[0] for r in session.query(Run.id).order_by(func.random()).limit(1000).all()]
+        sample_task_ids = [r[0] for r in session.query(Task.id).order_by(func.random()).limit(100).all()]
+    task_id = sample_task_ids[0]
+    model = MODELS[0]
+
+    # Большие выборки грузят все ORM объекты, на миллионе повторяем их реже
+    heavy_repeat = max(1, repeat if runs_count <= 100000 else 1)
+
+    def with_session(fn: Callable) -> Callable[[], object]:
+        def wrapper():
+            with db_manager.get_session() as session:
+                return fn(session)
+        return wrapper
+
+    def list_tasks(session):
+        return db_manager.get_task_repo(session).get_all_tasks()
+
+    def list_runs(session):
+        return db_manager.get_run_repo(session).get_all_runs()
+
+    def filter_runs_by_model(session):
+        # Так фильтруют страницы Runs и History: все запуски + фильтр в Python
+        runs = db_manager.get_run_repo(session).get_all_runs()
+        return [r for r in runs if r.model == model and not r.error]
+
+    def runs_by_task(session):
+        return db_manager.get_run_repo(session).get_runs_by_task(rng.choice(sample_task_ids))
+
+    def evaluation_lookups(session):
+        # Страницы Evaluate/History делают по запросу на каждый запуск
+        eval_repo = db_manager.get_evaluation_repo(session)
+        return [eval_repo.get_evaluation_by_run_id(run_id) for run_id in sample_run_ids]
+
+    def run_by_id(session):
+        run_repo = db_manager.get_run_repo(session)
+        return [run_repo.get_run_by_id(run_id) for run_id in sample_run_ids[:100]]
+
+    def insert_runs(session):
+        run_repo = db_manager.get_run_repo(session)
+        for _ in range(100):
+            run_repo.create_run(task_id, "comet", model, {"temperature": 0.7}, [{"role": "user", "content": "bench"}],
+                                response_text="bench", usage={"total_tokens": 10})
+
+    def bulk_insert_runs():
+        writer = DatabaseWriter(db_manager.SessionLocal).start()
+        for _ in range(5000):
+            writer.submit_run(task_id=task_id, provider="comet", model=model, params={"temperature": 0.7},
+                              messages=[{"role": "user", "content": "bench"}], response_text="bench",
+                              usage={"total_tokens": 10})
+        writer.flush()
+        writer.close()
+
+    def search_runs(session):
+        # Поиск на странице History: первая страница и счетчик найденного
+        run_repo = db_manager.get_run_repo(session)
+        word = rng.choice(WORDS)
+        return run_repo.search_runs(word, limit=50), run_repo.count_search_runs(word)
+
+    def settings_stats(session):
+        # Так страница Settings считает статистику
+        tasks_count = len(db_manager.get_task_repo(session).get_all_tasks())
+        run_repo = db_manager.get_run_repo(session)
+        runs_count = len(run_repo.get_all_runs())
+        successful = len([r for r in run_repo.get_all_runs() if not r.error])
+        return tasks_count, runs_count, successful
+
+    def sql_aggregates(session):
+        return session.query(
+            Run.model, func.count(Run.id), func.avg(Run.latency_ms), func.sum(Run.total_tokens), func.avg(Evaluation.rating)
+        ).outerjoin(Evaluation, Evaluation.run_id == Run.id).group_by(Run.model).all()
+
+    benchmarks = {
+        "list_tasks": (with_session(list_tasks), repeat),
+        "list_runs": (with_session(list_runs), heavy_repeat),
+        "filter_runs_by_model": (with_session(filter_runs_by_model), heavy_repeat),
+        "runs_by_task": (with_session(runs_by_task), repeat),
+        "evaluation_lookup_x1000": (with_session(evaluation_lookups), repeat),
+        "run_by_id_x100": (with_session(run_by_id), repeat),
+        "insert_run_x100": (with_session(insert_runs), repeat),
+        "bulk_insert_x5000": (bulk_insert_runs, repeat),
+        "search_runs": (with_session(search_runs), repeat),
+        "settings_stats": (with_session(settings_stats), heavy_repeat),
+        "sql_aggregates": (with_session(sql_aggregates), repeat),
+    }
+
+    results = {}
+    for name, (fn, op_repeat) in benchmarks.items():
+        if ops and name not in ops:
+            continue
+        results[name] = time_op(fn, op_repeat)
+        logger.info(f"{runs_count:>9} {name:<26} median {results[name]['median_ms']:.1f}ms")
+    db_manager.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки репозиториев LLM Runner")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ops", nargs="*", default=None, help="Запустить только указанные операции")
+    parser.add_argument("--reuse", action="store_true", help="Не пересевать существующие базы в benchmarks/.data")
+    parser.add_argument("--no-save", action="store_true", help="Не дописывать результаты в history.jsonl")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Порог регрессии (доля)")
+    parser.add_argument("--query-cache", action="store_true", help="Замерять с кэшем запросов (без записи в историю)")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    revision = git_revision()
+    timestamp = datetime.utcnow().isoformat(timespec="seconds")
+    records = []
+
+    for size in args.sizes:
+        path = os.path.join(DATA_DIR, f"runs_{size}.db")
+        if not (args.reuse and os.path.exists(path)):
+            seed_database(path, size)
+        # Бенчмарки вставок меняют базу, поэтому без --reuse каждый прогон стартует с чистого сида
+        for op, result in run_benchmarks(path, size, args.repeat, args.ops, use_cache=args.query_cache).items():
+            records.append({
+                **revision,
+                "timestamp": timestamp,
+                "python": platform.python_version(),
+                "size": size,
+                "op": op,
+                **result
+            })
+
+    history = load_history()
+    compare(records, history, args.threshold)
+    # Замеры с кэшем несравнимы с историей замеров SQLite
+    if not args.no_save and not args.query_cache:
+        save_results(records)
+
+
+if __name__ == "__main__":
+    main()
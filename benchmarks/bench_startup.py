@@ -0,0 +1,130 @@
+"""
+Бенчмарк холодного старта и переключения страниц Streamlit приложения
+
+Запуск:
+    python benchmarks/bench_startup.py --repeat 5
+
+Каждый замер выполняется в отдельном процессе, чтобы импорты были холодными:
+- import_<page>   — время импорта модуля страницы с нуля;
+- first_paint     — первый прогон app.py (streamlit.testing AppTest);
+- switch_<page>   — первое открытие страницы из сайдбара;
+- rerun_<page>    — повторный прогон той же страницы (клик по виджету).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from common import ROOT, compare, git_revision, load_history, save_results
+
+
+PAGE_MODULES = {
+    "dataset": "llm_runner.ui.pages.dataset",
+    "runs": "llm_runner.ui.pages.runs",
+    "evaluate": "llm_runner.ui.pages.evaluate",
+    "history": "llm_runner.ui.pages.history",
+    "settings": "llm_runner.ui.pages.settings",
+}
+
+
+def child_imports() -> Dict[str, float]:
+    """Замер в дочернем процессе: холодный импорт одной страницы"""
+    module = os.environ["BENCH_MODULE"]
+    started = time.perf_counter()
+    __import__(module)
+    return {"import_" + module.rsplit(".", 1)[-1]: (time.perf_counter() - started) * 1000}
+
+
+def child_app() -> Dict[str, float]:
+    """Замер в дочернем процессе: первый рендер и переключение страниц"""
+    from streamlit.testing.v1 import AppTest
+    from llm_runner.ui.registry import PAGES
+
+    results = {}
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    started = time.perf_counter()
+    app.run()
+    results["first_paint"] = (time.perf_counter() - started) * 1000
+
+    names = {module: name for name, module in PAGE_MODULES.items()}
+    for title, module in PAGES.items():
+        name = names[module]
+        started = time.perf_counter()
+        app.sidebar.selectbox[0].select(title).run()
+        results[f"switch_{name}"] = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        app.run()
+        results[f"rerun_{name}"] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def run_child(mode: str, env: Dict[str, str]) -> Dict[str, float]:
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--child", mode],
+        cwd=ROOT, env=env, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк старта LLM Runner")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-app", action="store_true", help="Только импорты, без AppTest")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        result = child_imports() if args.child == "imports" else child_app()
+        print(json.dumps(result))
+        return
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": ROOT,
+            "LLM_RUNNER_DB": os.path.join(tmp, "startup.db"),
+            "COMET_API_KEY": os.environ.get("COMET_API_KEY", "bench-key"),
+        }
+        for _ in range(args.repeat):
+            for module in PAGE_MODULES.values():
+                for op, value in run_child("imports", {**env, "BENCH_MODULE": module}).items():
+                    samples[op].append(value)
+            if not args.no_app:
+                for op, value in run_child("app", env).items():
+                    samples[op].append(value)
+
+    revision = git_revision()
+    timestamp = datetime.utcnow().isoformat(timespec="seconds")
+    records = [
+        {
+            **revision,
+            "timestamp": timestamp,
+            "python": platform.python_version(),
+            "size": "startup",
+            "op": op,
+            "min_ms": min(values),
+            "median_ms": statistics.median(values),
+            "n": len(values)
+        }
+        for op, values in samples.items()
+    ]
+
+    compare(records, load_history(), args.threshold)
+    if not args.no_save:
+        save_results(records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Общие функции бенчмарков: ревизия git и история результатов
+"""
+import json
+import os
+import subprocess
+from typing import Dict, List
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FILE = os.path.join(ROOT, "benchmarks", "results", "history.jsonl")
+
+
+def git_revision() -> Dict[str, object]:
+    """Текущий коммит и признак незакоммиченных изменений"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = "unknown", True
+    return {"commit": commit, "dirty": dirty}
+
+
+def load_history() -> List[Dict[str, object]]:
+    """Читает ранее сохраненные результаты"""
+    if not os.path.exists(RESULTS_FILE):
+        return []
+    with open(RESULTS_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_results(records: List[Dict[str, object]]) -> None:
+    """Дописывает результаты в history.jsonl"""
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def compare(records: List[Dict[str, object]], history: List[Dict[str, object]], threshold: float) -> None:
+    """Печатает сравнение с последним замером другого коммита"""
+    previous = {}
+    for record in history:
+        if record["commit"] != records[0]["commit"]:
+            previous[(record["size"], record["op"])] = record
+
+    print(f"\n{'size':>9}  {'operation':<26} {'median ms':>11} {'previous':>11} {'change':>8}")
+    for record in records:
+        prev = previous.get((record["size"], record["op"]))
+        line = f"{record['size']:>9}  {record['op']:<26} {record['median_ms']:>11.1f}"
+        if prev:
+            change = (record["median_ms"] - prev["median_ms"]) / max(prev["median_ms"], 1e-9)
+            flag = "  REGRESSION" if change > threshold else ""
+            line += f" {prev['median_ms']:>11.1f} {change:>+7.0%}{flag}  (vs {prev['commit']})"
+        print(line)
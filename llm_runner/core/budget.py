@@ -0,0 +1,264 @@
+"""
+Бюджеты токенов и стоимости: на день и на батч
+
+Перед отправкой запрос резервирует оценку токенов и стоимости (core.tokens,
+core.cost) во всех своих бюджетах одной транзакцией SQLite: условный
+UPDATE не дает выйти за лимит, а блокировка записи SQLite делает резерв
+атомарным для потоков и процессов, работающих с одной базой. После ответа
+резерв сверяется с фактическим usage.
+
+Дневные лимиты — LLM_RUNNER_DAILY_TOKENS и LLM_RUNNER_DAILY_USD, лимиты
+батча передаются в BatchBudget. Без лимитов база не трогается.
+
+Запрос к модели без цены (core.cost) при лимите в USD не резервируется,
+если не задана LLM_RUNNER_FALLBACK_PRICE. Резервы процесса, умершего до
+сверки, перестают считаться "в полете", когда бюджет не менялся дольше
+LLM_RUNNER_BUDGET_STALE секунд (потраченные ими токены остаются учтены).
+"""
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import text
+
+from .cost import estimate_cost
+
+
+class BudgetExceeded(Exception):
+    """Резерв не помещается в бюджет"""
+
+    def __init__(self, scope: str, spent_tokens: int, spent_usd: float):
+        self.scope = scope
+        self.spent_tokens = spent_tokens
+        self.spent_usd = spent_usd
+        super().__init__(f"Бюджет {scope} исчерпан: израсходовано {spent_tokens} токенов, ${spent_usd:.4f}")
+
+
+class UnpricedModel(BudgetExceeded):
+    """Стоимость запроса не оценить, а бюджет ограничен в USD"""
+
+    def __init__(self, scope: str, model: str):
+        self.scope = scope
+        self.spent_tokens = 0
+        self.spent_usd = 0.0
+        Exception.__init__(
+            self,
+            f"Цена {model} неизвестна, а бюджет {scope} ограничен в USD: "
+            f"задайте цену в LLM_RUNNER_PRICES или LLM_RUNNER_FALLBACK_PRICE"
+        )
+
+
+@dataclass
+class BatchBudget:
+    """Лимиты одного батча запусков"""
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    batch_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+    @property
+    def scope(self) -> str:
+        return f"batch:{self.batch_id}"
+
+
+@dataclass
+class Reservation:
+    """Зарезервированная оценка запроса"""
+    model: str
+    tokens: int
+    cost_usd: float
+    scopes: List[str]
+
+
+_ENSURE_SQL = text(
+    "INSERT OR IGNORE INTO budget_usage (scope, tokens, cost_usd, in_flight, updated_at) "
+    "VALUES (:scope, 0, 0.0, 0, :now)"
+)
+_RESERVE_SQL = text(
+    "UPDATE budget_usage SET tokens = tokens + :tokens, cost_usd = cost_usd + :cost, "
+    "in_flight = in_flight + 1, updated_at = :now "
+    "WHERE scope = :scope "
+    "AND (:max_tokens IS NULL OR tokens + :tokens <= :max_tokens) "
+    "AND (:max_cost IS NULL OR cost_usd + :cost <= :max_cost)"
+)
+_SETTLE_SQL = text(
+    "UPDATE budget_usage SET tokens = MAX(tokens + :tokens_delta, 0), "
+    "cost_usd = MAX(cost_usd + :cost_delta, 0.0), in_flight = MAX(in_flight - 1, 0), updated_at = :now "
+    "WHERE scope = :scope"
+)
+_USAGE_SQL = text("SELECT tokens, cost_usd, in_flight FROM budget_usage WHERE scope = :scope")
+_EXPIRE_SQL = text(
+    "UPDATE budget_usage SET in_flight = 0 "
+    "WHERE scope = :scope AND in_flight > 0 AND updated_at < :cutoff"
+)
+
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    return float(value) if value and float(value) > 0 else None
+
+
+class BudgetManager:
+    """Резервирование и сверка расходов в таблице budget_usage"""
+
+    def __init__(
+        self,
+        engine,
+        daily_tokens: Optional[int] = None,
+        daily_cost_usd: Optional[float] = None,
+        wait_s: float = 30.0,
+        stale_s: float = 600.0
+    ):
+        self.engine = engine
+        self.daily_tokens = daily_tokens
+        self.daily_cost_usd = daily_cost_usd
+        # Сколько ждать освобождения резервов других запросов, прежде чем сдаться
+        self.wait_s = wait_s
+        # Через сколько секунд без изменений бюджета резервы в полете считаются брошенными
+        self.stale_s = stale_s
+
+    @staticmethod
+    def day_scope(now: Optional[datetime] = None) -> str:
+        return f"day:{(now or datetime.utcnow()):%Y-%m-%d}"
+
+    def _limits(self, budget: Optional[BatchBudget]) -> Dict[str, Tuple[Optional[int], Optional[float]]]:
+        limits = {}
+        if self.daily_tokens is not None or self.daily_cost_usd is not None:
+            limits[self.day_scope()] = (self.daily_tokens, self.daily_cost_usd)
+        if budget is not None and (budget.max_tokens is not None or budget.max_cost_usd is not None):
+            limits[budget.scope] = (budget.max_tokens, budget.max_cost_usd)
+        return limits
+
+    def active(self, budget: Optional[BatchBudget] = None) -> bool:
+        """Есть ли лимиты, в которые нужно резервировать"""
+        return bool(self._limits(budget))
+
+    def reserve(
+        self,
+        model: str,
+        tokens: int,
+        budget: Optional[BatchBudget] = None,
+        cost_usd: Optional[float] = None,
+        wait_s: Optional[float] = None
+    ) -> Reservation:
+        """
+        Резервирует tokens токенов (и их стоимость) во всех бюджетах запроса.
+
+        Если бюджет занят резервами, которые еще могут вернуться после сверки,
+        ждет до wait_s секунд (по умолчанию self.wait_s); иначе поднимает
+        BudgetExceeded. Если стоимость не оценить, а лимит в USD задан —
+        UnpricedModel.
+        """
+        limits = self._limits(budget)
+        if cost_usd is None:
+            cost_usd = estimate_cost(model, tokens, 0, fallback=True)
+        if cost_usd is None:
+            cost_limited = [scope for scope, (_, max_cost) in limits.items() if max_cost is not None]
+            if cost_limited:
+                raise UnpricedModel(cost_limited[0], model)
+            cost_usd = 0.0
+        deadline = time.monotonic() + (self.wait_s if wait_s is None else wait_s)
+        while True:
+            failed = self._try_reserve(limits, tokens, cost_usd)
+            if failed is None:
+                return Reservation(model=model, tokens=tokens, cost_usd=cost_usd, scopes=list(limits))
+            spent_tokens, spent_usd, in_flight = self.usage(failed)
+            if in_flight and self._expire_stale(failed):
+                in_flight = 0
+            if in_flight == 0 or time.monotonic() >= deadline:
+                raise BudgetExceeded(failed, spent_tokens, spent_usd)
+            time.sleep(0.2)
+
+    def _try_reserve(self, limits: Dict[str, Tuple[Optional[int], Optional[float]]], tokens: int, cost_usd: float) -> Optional[str]:
+        """Одна транзакция на все бюджеты; возвращает бюджет, в который резерв не влез"""
+        now = datetime.utcnow()
+        failed = None
+        conn = self.engine.connect()
+        try:
+            # INSERT берет блокировку записи SQLite до коммита: проверка и списание атомарны между процессами
+            for scope in limits:
+                conn.execute(_ENSURE_SQL, {"scope": scope, "now": now})
+            for scope, (max_tokens, max_cost) in limits.items():
+                updated = conn.execute(_RESERVE_SQL, {
+                    "scope": scope, "tokens": tokens, "cost": cost_usd, "now": now,
+                    "max_tokens": max_tokens, "max_cost": max_cost
+                }).rowcount
+                if updated == 0:
+                    failed = scope
+                    break
+            if failed is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        finally:
+            conn.close()
+        return failed
+
+    def _expire_stale(self, scope: str) -> bool:
+        """Обнуляет in_flight бюджета, не менявшегося дольше stale_s секунд"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_s)
+        with self.engine.begin() as conn:
+            expired = conn.execute(_EXPIRE_SQL, {"scope": scope, "cutoff": cutoff}).rowcount > 0
+        if expired:
+            logger.warning(f"Бюджет {scope}: резервы без сверки дольше {self.stale_s:.0f} с считаются брошенными")
+        return expired
+
+    def settle(self, reservation: Reservation, usage: Optional[Dict[str, int]]) -> None:
+        """Заменяет резерв фактическим расходом (пустой usage — запрос ничего не стоил)"""
+        usage = usage or {}
+        actual_tokens = usage.get("total_tokens", 0) or 0
+        actual_cost = estimate_cost(
+            reservation.model, usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0, fallback=True
+        ) or 0.0
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            for scope in reservation.scopes:
+                conn.execute(_SETTLE_SQL, {
+                    "scope": scope,
+                    "tokens_delta": actual_tokens - reservation.tokens,
+                    "cost_delta": actual_cost - reservation.cost_usd,
+                    "now": now
+                })
+
+    def usage(self, scope: str) -> Tuple[int, float, int]:
+        """(токены, USD, резервов в полете) бюджета"""
+        with self.engine.connect() as conn:
+            row = conn.execute(_USAGE_SQL, {"scope": scope}).first()
+        return (row[0], row[1], row[2]) if row else (0, 0.0, 0)
+
+
+def budgets_configured(budget: Optional[BatchBudget] = None) -> bool:
+    """Заданы ли дневные лимиты или лимиты батча (без них база не нужна)"""
+    if budget is not None and (budget.max_tokens is not None or budget.max_cost_usd is not None):
+        return True
+    return _env_number("LLM_RUNNER_DAILY_TOKENS") is not None or _env_number("LLM_RUNNER_DAILY_USD") is not None
+
+
+_managers: Dict[str, BudgetManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_budget_manager() -> BudgetManager:
+    """Менеджер бюджетов для текущей базы (лимиты из переменных окружения)"""
+    from llm_runner.db.models import init_database
+
+    engine = init_database()
+    database_url = str(engine.url)
+    with _managers_lock:
+        manager = _managers.get(database_url)
+        if manager is None:
+            daily_tokens = _env_number("LLM_RUNNER_DAILY_TOKENS")
+            manager = _managers[database_url] = BudgetManager(
+                engine,
+                daily_tokens=int(daily_tokens) if daily_tokens else None,
+                daily_cost_usd=_env_number("LLM_RUNNER_DAILY_USD"),
+                wait_s=float(os.getenv("LLM_RUNNER_BUDGET_WAIT", "30")),
+                stale_s=float(os.getenv("LLM_RUNNER_BUDGET_STALE", "600"))
+            )
+            if manager.active():
+                logger.info(f"Дневной бюджет: {manager.daily_tokens} токенов, ${manager.daily_cost_usd}")
+        return manager
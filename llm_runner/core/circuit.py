@@ -0,0 +1,151 @@
+"""
+Автоматический выключатель (circuit breaker) на пару (base_url, модель)
+
+closed — запросы идут, исходы копятся в скользящем окне. Если доля сбоев
+(5xx, таймауты, ошибки сети) в окне превышает порог, выключатель
+размыкается: open — запросы сразу откладываются, не дожидаясь таймаута.
+Через open_s секунд он переходит в half-open и пропускает несколько
+пробных запросов: успех замыкает цепь, сбой снова размыкает.
+
+Настройка: LLM_RUNNER_CIRCUIT=0 отключает, LLM_RUNNER_CIRCUIT_FAILURE_RATE,
+LLM_RUNNER_CIRCUIT_MIN_REQUESTS, LLM_RUNNER_CIRCUIT_WINDOW,
+LLM_RUNNER_CIRCUIT_OPEN_SECONDS.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from .metrics import get_metrics
+from .providers.base import ProviderResult
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Ошибки, говорящие о нездоровье модели, а не о самом запросе
+FAILURE_KINDS = {"server", "timeout", "network"}
+
+
+def is_failure(result: ProviderResult) -> bool:
+    return result.error is not None and result.error_kind in FAILURE_KINDS
+
+
+class CircuitBreaker:
+    """Выключатель одной модели на одном эндпоинте, безопасен для потоков"""
+
+    def __init__(
+        self,
+        name: str = "",
+        failure_rate: float = 0.5,
+        min_requests: int = 5,
+        window: int = 20,
+        open_s: float = 30.0,
+        half_open_probes: int = 1
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.open_s = open_s
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True — сбой
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit {self.name}: {self._state} -> {state}")
+        get_metrics().inc("circuit_transitions_total", circuit=self.name, state=state)
+        self._state = state
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_s:
+            self._set_state(HALF_OPEN)
+            self._probes_in_flight = 0
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас (в half-open — занимает слот пробы)"""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, failed: bool) -> None:
+        """Учитывает исход отправленного запроса"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._open(now)
+                else:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                return
+            if self._state == OPEN:
+                # Ответ запроса, отправленного до размыкания
+                return
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.failure_rate:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._set_state(OPEN)
+
+    def retry_in(self) -> float:
+        """Секунд до следующей пробы (0, если цепь не разомкнута)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_s - (time.monotonic() - self._opened_at))
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_enabled() -> bool:
+    return os.getenv("LLM_RUNNER_CIRCUIT", "1") != "0"
+
+
+def get_circuit_breaker(base_url: Optional[str], model: str) -> CircuitBreaker:
+    """Общий для процесса выключатель пары (base_url, модель)"""
+    key = (base_url or "", model)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(
+                name=f"{model}@{base_url}" if base_url else model,
+                failure_rate=float(os.getenv("LLM_RUNNER_CIRCUIT_FAILURE_RATE", "0.5")),
+                min_requests=int(os.getenv("LLM_RUNNER_CIRCUIT_MIN_REQUESTS", "5")),
+                window=int(os.getenv("LLM_RUNNER_CIRCUIT_WINDOW", "20")),
+                open_s=float(os.getenv("LLM_RUNNER_CIRCUIT_OPEN_SECONDS", "30"))
+            )
+        return breaker
+
+
+def circuit_states() -> Dict[Tuple[str, str], str]:
+    """Состояния всех выключателей процесса"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {key: breaker.state for key, breaker in breakers.items()}
@@ -0,0 +1,98 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+
+Если несколько вызывающих (аналитики в разных сессиях Streamlit или
+элементы одного батча) одновременно отправляют один и тот же
+детерминированный запрос, к API уходит один HTTP вызов, а его результат
+получают все. Каждый вызывающий сохраняет собственный запуск. Запросы со
+случайностью (temperature > 0 без seed, n > 1) не объединяются: их
+ответы должны различаться.
+
+Отключается переменной окружения LLM_RUNNER_COALESCE=0.
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .providers.base import ProviderResult
+
+
+def is_deterministic(params: Dict[str, Any]) -> bool:
+    """Дает ли запрос с такими параметрами один и тот же ответ"""
+    if int(params.get("n") or 1) > 1:
+        return False
+    return params.get("temperature") == 0 or params.get("seed") is not None
+
+
+def request_key(provider: Any, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    """Ключ запроса: эндпоинт провайдера, модель, сообщения и параметры"""
+    payload = json.dumps(
+        [type(provider).__name__, getattr(provider, "base_url", None), model, messages, params],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[ProviderResult] = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Выполняет fn один раз на ключ среди одновременных вызовов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.shared = 0  # сколько вызовов получили чужой результат
+
+    def do(self, key: str, fn: Callable[[], ProviderResult]) -> Tuple[ProviderResult, bool]:
+        """Возвращает (результат, был ли он получен от другого вызова)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Глубокая копия: usage, raw и choices тоже не должны быть общими
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Новые вызовы после завершения идут в API заново
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+# Общий для процесса: его разделяют все сессии Streamlit и потоки батчей
+single_flight = SingleFlight()
+
+
+def coalescing_enabled() -> bool:
+    return os.getenv("LLM_RUNNER_COALESCE", "1") != "0"
@@ -0,0 +1,80 @@
+"""
+JSON кодек для полей params_json, messages_json, response_json и vars_json
+
+Если установлен orjson, он используется для кодирования и разбора (в разы
+быстрее stdlib json на больших сырых ответах), иначе — стандартный json.
+LLM_RUNNER_JSON=json принудительно включает стандартный модуль. Даты и
+время кодируются строками ISO 8601 в обоих случаях (как это делает orjson).
+
+JsonField — ленивое представление колонки с JSON: строка разбирается при
+первом обращении и запоминается на объекте, пока сама строка не изменится.
+Закэшированные репозиторием объекты общие для перерисовок Streamlit, поэтому
+разобранное значение переживает rerun. Значения общие — не изменяйте их.
+"""
+import copy
+import datetime
+import json
+import os
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+def backend() -> str:
+    """Какой модуль используется: orjson или json"""
+    if orjson is not None and os.getenv("LLM_RUNNER_JSON", "orjson") != "json":
+        return "orjson"
+    return "json"
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые orjson кодирует сам, а json — нет"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(value: Any) -> str:
+    """Кодирует значение в JSON строку (UTF-8 без экранирования)"""
+    if backend() == "orjson":
+        try:
+            return orjson.dumps(value).decode("utf-8")
+        except TypeError:
+            # Ключи не строки, целые больше 64 бит и т.п. — как раньше, через json
+            pass
+    return json.dumps(value, ensure_ascii=False, default=_default)
+
+
+def loads(data: Optional[str]) -> Any:
+    """Разбирает JSON строку"""
+    if backend() == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JsonField:
+    """
+    Дескриптор модели: разобранное значение JSON колонки column.
+
+    Пустая колонка дает копию default. Разбор кэшируется в __dict__ объекта
+    вместе с исходной строкой и повторяется, только если строка сменилась.
+    """
+
+    def __init__(self, column: str, default: Any = None):
+        self.column = column
+        self.default = default
+        self.cache_attr = f"_decoded_{column}"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        raw = getattr(obj, self.column)
+        cached = obj.__dict__.get(self.cache_attr)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        value = loads(raw) if raw else copy.copy(self.default)
+        obj.__dict__[self.cache_attr] = (raw, value)
+        return value
@@ -0,0 +1,83 @@
+"""
+Цены моделей и оценка стоимости запросов
+
+Цены указаны в USD за 1M токенов (вход, выход) и ищутся по самому длинному
+префиксу имени модели. Переопределяются JSON в LLM_RUNNER_PRICES, например
+{"gpt-4o": [2.5, 10.0]}. Для неизвестной модели стоимость — None; бюджеты в
+USD считают ее по LLM_RUNNER_FALLBACK_PRICE (например, [10.0, 30.0]), если
+цена задана.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-32k": (60.0, 120.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "o1": (15.0, 60.0),
+    "o3-mini": (1.1, 4.4),
+}
+
+
+@lru_cache(maxsize=1)
+def _price_table() -> Dict[str, Tuple[float, float]]:
+    prices = dict(PRICES)
+    overrides = os.getenv("LLM_RUNNER_PRICES")
+    if overrides:
+        try:
+            prices.update({model: (float(p[0]), float(p[1])) for model, p in json.loads(overrides).items()})
+        except (ValueError, TypeError, IndexError) as e:
+            logger.warning(f"Неверный LLM_RUNNER_PRICES, используются цены по умолчанию: {e}")
+    return prices
+
+
+@lru_cache(maxsize=1)
+def fallback_price() -> Optional[Tuple[float, float]]:
+    """Цена (вход, выход) для моделей без цены из LLM_RUNNER_FALLBACK_PRICE или None"""
+    value = os.getenv("LLM_RUNNER_FALLBACK_PRICE")
+    if not value:
+        return None
+    try:
+        price = json.loads(value)
+        return float(price[0]), float(price[1])
+    except (ValueError, TypeError, IndexError, KeyError) as e:
+        logger.warning(f"Неверный LLM_RUNNER_FALLBACK_PRICE, цена по умолчанию не задана: {e}")
+        return None
+
+
+@lru_cache(maxsize=256)
+def price_for(model: str) -> Optional[Tuple[float, float]]:
+    """Цена (вход, выход) в USD за 1M токенов или None"""
+    prices = _price_table()
+    best = None
+    for prefix in prices:
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return prices[best] if best else None
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, fallback: bool = False) -> Optional[float]:
+    """Стоимость в USD для заданного числа токенов (fallback — с ценой по умолчанию)"""
+    price = price_for(model)
+    if price is None and fallback:
+        price = fallback_price()
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def usage_cost(model: str, usage: Dict[str, int]) -> Optional[float]:
+    """Стоимость фактического usage ответа (подходит как cost_fn для sweep)"""
+    if not usage:
+        return None
+    return estimate_cost(model, usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0)
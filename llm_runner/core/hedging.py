@@ -0,0 +1,177 @@
+"""
+Хеджирование медленных запросов
+
+Если запрос не ответил за заданный перцентиль недавней латентности модели,
+отправляется дубль, и используется тот ответ, что пришел первым. Доля
+хеджированных запросов ограничена, чтобы хвост латентности не превращался
+в удвоение расходов. Проигравший запрос отменяется, если еще не начался;
+синхронный httpx запрос прервать нельзя, поэтому начатый проигравший
+дорабатывает в фоне, а его usage сверяется с лимитами и бюджетом, когда он
+завершится. Сам ответ проигравшего никуда не записывается: ни запуском в
+БД, ни в окно латентности модели, ни в автомат цепи.
+
+Задержка дубля отсчитывается от фактического старта первой попытки:
+ожидание свободного потока в общем пуле в нее не входит.
+
+Включается LLM_RUNNER_HEDGE=1; LLM_RUNNER_HEDGE_PERCENTILE (по умолчанию 95),
+LLM_RUNNER_HEDGE_MAX_RATE (доля запросов, по умолчанию 0.1).
+"""
+import math
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError, wait
+from typing import Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+from .providers.base import ProviderResult
+
+
+class LatencyTracker:
+    """Скользящее окно латентностей успешных ответов модели"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency_ms: int) -> None:
+        with self._lock:
+            self._latencies.append(latency_ms)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Перцентиль p (0..100) в миллисекундах или None, если данных нет"""
+        with self._lock:
+            values = sorted(self._latencies)
+        if not values:
+            return None
+        rank = max(0, math.ceil(p / 100 * len(values)) - 1)
+        return float(values[rank])
+
+
+class HedgePolicy:
+    """Когда хеджировать и не слишком ли часто"""
+
+    def __init__(self, percentile: float = 95.0, max_rate: float = 0.1, min_samples: int = 20, min_delay_ms: float = 50.0):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay_ms = min_delay_ms
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+
+    def delay_s(self, tracker: LatencyTracker) -> Optional[float]:
+        """Сколько ждать до дубля; None — хеджировать нельзя (мало истории)"""
+        with self._lock:
+            self.requests += 1
+        if len(tracker) < self.min_samples:
+            return None
+        latency_ms = tracker.percentile(self.percentile)
+        return max(latency_ms, self.min_delay_ms) / 1000.0
+
+    def try_hedge(self) -> bool:
+        """Учитывает дубль, если доля хеджей не превышает max_rate"""
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_policy: Optional[HedgePolicy] = None
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def hedging_enabled() -> bool:
+    return os.getenv("LLM_RUNNER_HEDGE", "0") == "1"
+
+
+def get_latency_tracker(model: str) -> LatencyTracker:
+    with _lock:
+        tracker = _trackers.get(model)
+        if tracker is None:
+            tracker = _trackers[model] = LatencyTracker()
+        return tracker
+
+
+def get_hedge_policy() -> HedgePolicy:
+    global _policy
+    with _lock:
+        if _policy is None:
+            _policy = HedgePolicy(
+                percentile=float(os.getenv("LLM_RUNNER_HEDGE_PERCENTILE", "95")),
+                max_rate=float(os.getenv("LLM_RUNNER_HEDGE_MAX_RATE", "0.1"))
+            )
+        return _policy
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-runner-hedge")
+        return _executor
+
+
+def hedged_call(
+    call: Callable[[], ProviderResult],
+    delay_s: float,
+    start_hedge: Callable[[], bool],
+    on_abandoned: Callable[[ProviderResult], None]
+) -> Tuple[ProviderResult, bool]:
+    """
+    Выполняет call и через delay_s после его старта при необходимости дубль.
+
+    start_hedge решает, можно ли отправить дубль (лимиты, бюджет), и
+    резервирует под него ресурсы. on_abandoned получает результат
+    проигравшей попытки, когда она завершится. Возвращает
+    (результат, был ли отправлен дубль).
+    """
+    executor = _get_executor()
+    started = threading.Event()
+
+    def primary_call() -> ProviderResult:
+        started.set()
+        return call()
+
+    primary = executor.submit(primary_call)
+    # Очередь пула — не латентность API: задержка считается от старта попытки
+    started.wait()
+    try:
+        return primary.result(timeout=delay_s), False
+    except TimeoutError:
+        pass
+
+    if not start_hedge():
+        return primary.result(), False
+    hedge = executor.submit(call)
+
+    done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+    winner = primary if primary in done else hedge
+    loser = hedge if winner is primary else primary
+    # Ошибка первой попытки не должна перебивать успешный ответ второй
+    if winner.exception() is not None or winner.result().error:
+        wait([loser])
+        if loser.exception() is None and not loser.result().error:
+            winner, loser = loser, winner
+
+    def abandoned(future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            # Попытка не дошла до API или упала: расход нулевой
+            result = ProviderResult(text=None, usage={}, finish_reason=None, raw={}, latency_ms=0, error="Попытка отменена")
+        else:
+            result = future.result()
+        try:
+            on_abandoned(result)
+        except Exception as e:
+            logger.warning(f"Ошибка учета проигравшей попытки: {e}")
+
+    loser.cancel()
+    loser.add_done_callback(abandoned)
+    return winner.result(), True
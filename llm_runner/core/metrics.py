@@ -0,0 +1,286 @@
+"""
+Метрики и трассировка горячих путей (провайдер, БД)
+
+По умолчанию используется NoopMetrics, вызовы ничего не стоят.
+Включается переменными окружения:
+    LLM_RUNNER_METRICS=prometheus
+    LLM_RUNNER_METRICS_PORT=9464            # HTTP эндпоинт /metrics
+    LLM_RUNNER_METRICS_FILE=./metrics.prom  # периодическая выгрузка в файл
+"""
+import atexit
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+
+# Границы бакетов гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Гистограммы размеров (не времени) со своими границами
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+HISTOGRAM_BUCKETS: Dict[str, Tuple[float, ...]] = {
+    "db_writer_batch_size": SIZE_BUCKETS,
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class Span:
+    """Завершенный участок трассы"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    duration_s: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("llm_runner_span", default=None)
+
+
+class Metrics:
+    """Интерфейс метрик; сама реализация ничего не делает (no-op)"""
+
+    enabled = False
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Увеличивает счетчик"""
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Добавляет наблюдение в гистограмму"""
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        """Участок трассы вокруг блока кода"""
+        yield None
+
+    def render(self) -> str:
+        """Текст в формате Prometheus exposition"""
+        return ""
+
+
+class NoopMetrics(Metrics):
+    """Метрики по умолчанию: ничего не собирают"""
+
+
+class _Histogram:
+    """Кумулятивная гистограмма Prometheus"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class PrometheusMetrics(Metrics):
+    """Метрики в памяти процесса с выгрузкой в текстовый формат Prometheus"""
+
+    enabled = True
+
+    def __init__(self, prefix: str = "llm_runner_", buckets: Tuple[float, ...] = DEFAULT_BUCKETS, max_spans: int = 1000):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(HISTOGRAM_BUCKETS.get(name, self.buckets))
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attrs=attrs
+        )
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - started
+            _current_span.reset(token)
+            self.observe("span_duration_seconds", span.duration_s, span=name)
+            with self._lock:
+                self.spans.append(span)
+
+    def recent_spans(self, limit: int = 100) -> List[Span]:
+        """Последние завершенные участки трасс"""
+        with self._lock:
+            return list(self.spans)[-limit:]
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = key + extra
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = self.prefix + name
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{metric}{self._format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                metric = self.prefix + name
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{self._format_labels(key, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{metric}_bucket{self._format_labels(key, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{metric}_sum{self._format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{metric}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str) -> None:
+        """Атомарно записывает метрики в файл (для node_exporter textfile collector)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Поднимает HTTP эндпоинт /metrics в фоновом потоке"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="llm-runner-metrics-http", daemon=True).start()
+        logger.info(f"Метрики Prometheus доступны на http://{host}:{port}/metrics")
+        return server
+
+    def export_periodically(self, path: str, interval_s: float = 15.0) -> threading.Thread:
+        """Периодически выгружает метрики в файл"""
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    logger.warning(f"Не удалось записать метрики в {path}: {e}")
+
+        thread = threading.Thread(target=loop, name="llm-runner-metrics-file", daemon=True)
+        thread.start()
+        atexit.register(self.write_file, path)
+        return thread
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def configure_from_env() -> Metrics:
+    """Создает метрики по переменным окружения"""
+    if os.getenv("LLM_RUNNER_METRICS", "").lower() != "prometheus":
+        return NoopMetrics()
+
+    metrics = PrometheusMetrics()
+    port = os.getenv("LLM_RUNNER_METRICS_PORT")
+    if port:
+        try:
+            metrics.serve(int(port))
+        except OSError as e:
+            logger.warning(f"Не удалось поднять эндпоинт метрик на порту {port}: {e}")
+    path = os.getenv("LLM_RUNNER_METRICS_FILE")
+    if path:
+        metrics.export_periodically(path)
+    return metrics
+
+
+def get_metrics() -> Metrics:
+    """Возвращает метрики процесса (при первом вызове настраивает их по окружению)"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = configure_from_env()
+    return _metrics
+
+
+def set_metrics(metrics: Metrics) -> None:
+    """Подменяет метрики процесса (например, PrometheusMetrics в бенчмарке)"""
+    global _metrics
+    with _metrics_lock:
+        _metrics = metrics
+
+
+def traced(name: str) -> Callable:
+    """Декоратор: оборачивает функцию в span, если метрики включены"""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = get_metrics()
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            with metrics.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
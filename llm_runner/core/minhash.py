@@ -0,0 +1,76 @@
+"""
+MinHash подписи и LSH бакеты для поиска почти одинаковых текстов
+
+Текст нормализуется (регистр, пробелы), разбивается на словесные шинглы
+и сворачивается в подпись из NUM_PERM минимальных хешей. Доля совпавших
+позиций двух подписей оценивает коэффициент Жаккара их шинглов. Подпись
+режется на BANDS полос по ROWS значений; тексты, совпавшие хотя бы в одной
+полосе, становятся кандидатами — так похожие находятся без перебора всех.
+
+Параметры зафиксированы: подписи и ключи бакетов хранятся в базе, и их
+смена требует переиндексации.
+"""
+import hashlib
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Постоянное зерно: подписи должны совпадать между процессами и запусками
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """Словесные n-граммы нормализованного текста (короткий текст — одним шинглом)"""
+    words = _WORD.findall((text or "").lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash подпись текста (uint32[NUM_PERM]) или None для пустого текста"""
+    parts = shingles(text)
+    if not parts:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in set(parts)), dtype=np.uint64)
+    # Все перестановки сразу: матрица шинглы × перестановки, минимум по столбцам
+    permuted = (hashes[:, None] * _A + _B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[int]:
+    """Ключи LSH бакетов подписи: по одному знаковому 64-битному на полосу"""
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оценка коэффициента Жаккара по двум подписям"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype("<u4").tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4").astype(np.uint32)
@@ -0,0 +1,333 @@
+"""
+Локальный OpenAI-совместимый мок-сервер с инъекцией сбоев
+
+Запуск:
+    python -m llm_runner.core.mock_server --port 8787 --latency-ms 300 --error-429-rate 0.05
+
+После этого CometProvider(base_url="http://127.0.0.1:8787") ходит в мок
+вместо настоящего API.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, replace, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+_WORDS = (
+    "the model returns a synthetic answer for load testing of the llm runner "
+    "pipeline with configurable latency tokens and injected faults"
+).split()
+
+
+@dataclass
+class MockServerConfig:
+    """Поведение мок-сервера"""
+    latency: str = "lognormal"              # fixed | uniform | lognormal
+    latency_ms: float = 300.0               # фиксированная задержка или медиана
+    latency_spread: float = 0.5             # sigma для lognormal, доля разброса для uniform
+    prompt_tokens: Optional[int] = None     # None — оценивается по длине сообщений
+    completion_tokens: Tuple[int, int] = (20, 200)
+    error_429_rate: float = 0.0
+    error_5xx_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_s: float = 120.0                # сколько "висит" запрос при инъекции таймаута
+    retry_after_s: Optional[float] = 1.0    # заголовок Retry-After для 429/503
+    models: Optional[List[str]] = None      # если задан, прочие модели отвечают 404
+    model_overrides: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    seed: Optional[int] = None
+
+    def for_model(self, model: str) -> "MockServerConfig":
+        """Возвращает конфигурацию с учетом переопределений для модели"""
+        overrides = self.model_overrides.get(model)
+        return replace(self, **overrides) if overrides else self
+
+
+class MockStats:
+    """Счетчики обработанных запросов (для проверок в нагрузочных тестах)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов мок-сервера"""
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, format, *args):
+        logger.debug(f"mock_server: {format % args}")
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            models = self.server.config.models or ["mock-model"]
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models]})
+        elif self.path.rstrip("/") == "/mock/stats":
+            self._send_json(200, self.server.stats.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+            return
+
+        stats = self.server.stats
+        stats.incr("requests")
+
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            stats.incr("status_401")
+            self._send_json(401, {"error": {"message": "Missing API key"}})
+            return
+
+        model = payload.get("model", "")
+        base_config = self.server.config
+        if base_config.models is not None and model not in base_config.models:
+            stats.incr("status_404")
+            self._send_json(404, {"error": {"message": f"Model '{model}' not found"}})
+            return
+
+        config = base_config.for_model(model)
+        rng = self.server.rng
+
+        # Инъекция сбоев
+        roll = rng.random()
+        if roll < config.timeout_rate:
+            stats.incr("timeouts")
+            time.sleep(config.timeout_s)
+            self.close_connection = True
+            return
+        roll -= config.timeout_rate
+        if roll < config.error_429_rate:
+            stats.incr("status_429")
+            self._send_json(429, {"error": {"message": "Rate limit exceeded"}}, retry_after=config.retry_after_s)
+            return
+        roll -= config.error_429_rate
+        if roll < config.error_5xx_rate:
+            status = rng.choice([500, 502, 503])
+            stats.incr(f"status_{status}")
+            self._send_json(
+                status,
+                {"error": {"message": "Upstream error"}},
+                retry_after=config.retry_after_s if status == 503 else None
+            )
+            return
+
+        latency_s = self.server.sample_latency(config) / 1000.0
+        completion = self.server.build_completion(payload, config)
+        stats.incr("status_200")
+
+        if payload.get("stream"):
+            self._send_stream(completion, latency_s)
+        else:
+            time.sleep(latency_s)
+            self._send_json(200, completion)
+
+    def _send_json(self, status: int, body: Dict[str, Any], retry_after: Optional[float] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if retry_after is not None:
+            self.send_header("Retry-After", f"{retry_after:g}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, completion: Dict[str, Any], latency_s: float) -> None:
+        """Отдает ответ как SSE поток chat.completion.chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        # Первая порция приходит после ~30% задержки, остальное равномерно
+        time.sleep(latency_s * 0.3)
+        pieces = []
+        for choice in completion["choices"]:
+            words = choice["message"]["content"].split(" ")
+            pieces.append([(choice["index"], w + (" " if i < len(words) - 1 else "")) for i, w in enumerate(words)])
+        chunks = [p for group in pieces for p in group]
+        step = (latency_s * 0.7) / max(len(chunks), 1)
+
+        def emit(body: Dict[str, Any]) -> None:
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        base = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"]}
+        for index, text in chunks:
+            emit({**base, "choices": [{"index": index, "delta": {"content": text}, "finish_reason": None}]})
+            time.sleep(step)
+        for choice in completion["choices"]:
+            emit({**base, "choices": [{"index": choice["index"], "delta": {}, "finish_reason": choice["finish_reason"]}]})
+        emit({**base, "choices": [], "usage": completion["usage"]})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    """HTTP сервер, имитирующий /v1/chat/completions"""
+    daemon_threads = True
+
+    def __init__(self, config: Optional[MockServerConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockServerConfig()
+        self.stats = MockStats()
+        self.rng = random.Random(self.config.seed)
+        self._thread: Optional[threading.Thread] = None
+        super().__init__((host, port), _MockHandler)
+
+    @property
+    def base_url(self) -> str:
+        """Base URL для CometProvider"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def sample_latency(self, config: MockServerConfig) -> float:
+        """Случайная задержка ответа в миллисекундах"""
+        if config.latency == "fixed":
+            return config.latency_ms
+        if config.latency == "uniform":
+            spread = config.latency_ms * config.latency_spread
+            return max(0.0, self.rng.uniform(config.latency_ms - spread, config.latency_ms + spread))
+        if config.latency == "lognormal":
+            # Медиана lognormal распределения равна exp(mu) = latency_ms
+            return self.rng.lognormvariate(0.0, config.latency_spread) * config.latency_ms
+        raise ValueError(f"Неизвестное распределение задержки: {config.latency}")
+
+    def build_completion(self, payload: Dict[str, Any], config: MockServerConfig) -> Dict[str, Any]:
+        """Собирает тело ответа chat.completion"""
+        n = max(int(payload.get("n") or 1), 1)
+        max_tokens = payload.get("max_tokens")
+
+        if config.prompt_tokens is not None:
+            prompt_tokens = config.prompt_tokens
+        else:
+            text = " ".join(str(m.get("content", "")) for m in payload.get("messages", []))
+            prompt_tokens = max(1, len(text) // 4)
+
+        choices = []
+        completion_tokens = 0
+        for index in range(n):
+            tokens = self.rng.randint(*config.completion_tokens)
+            finish_reason = "stop"
+            if max_tokens is not None and tokens >= max_tokens:
+                tokens, finish_reason = max_tokens, "length"
+            completion_tokens += tokens
+            content = " ".join(self.rng.choice(_WORDS) for _ in range(tokens))
+            choices.append({
+                "index": index,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            })
+
+        return {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", ""),
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def start(self) -> "MockServer":
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self.serve_forever, name="llm-runner-mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Останавливает сервер"""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def start_mock_server(config: Optional[MockServerConfig] = None, host: str = "127.0.0.1", port: int = 0) -> MockServer:
+    """Запускает мок-сервер в фоне; port=0 выбирает свободный порт"""
+    return MockServer(config, host, port).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-совместимый мок-сервер для LLM Runner")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--prompt-tokens", type=int, default=None)
+    parser.add_argument("--completion-tokens", type=int, nargs=2, default=(20, 200), metavar=("MIN", "MAX"))
+    parser.add_argument("--error-429-rate", type=float, default=0.0)
+    parser.add_argument("--error-5xx-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-s", type=float, default=120.0)
+    parser.add_argument("--retry-after-s", type=float, default=1.0)
+    parser.add_argument("--models", nargs="*", default=None, help="Допустимые модели (остальные — 404)")
+    parser.add_argument("--config", default=None, help="JSON файл с MockServerConfig (включая model_overrides)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = MockServerConfig(**json.load(f))
+    else:
+        config = MockServerConfig(
+            latency=args.latency,
+            latency_ms=args.latency_ms,
+            latency_spread=args.latency_spread,
+            prompt_tokens=args.prompt_tokens,
+            completion_tokens=tuple(args.completion_tokens),
+            error_429_rate=args.error_429_rate,
+            error_5xx_rate=args.error_5xx_rate,
+            timeout_rate=args.timeout_rate,
+            timeout_s=args.timeout_s,
+            retry_after_s=args.retry_after_s,
+            models=args.models,
+            seed=args.seed
+        )
+
+    server = MockServer(config, args.host, args.port)
+    logger.info(f"Мок-сервер запущен: {server.base_url} ({asdict(config)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 """
 Базовый интерфейс для провайдеров LLM
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any
 from abc import ABC, abstractmethod
 
@@ -15,6 +15,11 @@ class ProviderResult:
     raw: Dict[str, Any]
     latency_ms: int
     error: Optional[str] = None
+    status_code: Optional[int] = None   # HTTP статус ответа, если он был
+    error_kind: Optional[str] = None    # auth | not_found | rate_limit | server | timeout | network | context_length | budget | circuit_open | unexpected
+    choices: List[Dict[str, Any]] = field(default_factory=list)  # все сэмплы при n > 1: {"index", "text", "finish_reason"}
+    coalesced: bool = False  # результат получен от одновременного одинакового запроса, API не вызывался
+    retry_after_s: Optional[float] = None  # Retry-After ответа 429/503, если сервер его прислал
 
 
 class Provider(ABC):
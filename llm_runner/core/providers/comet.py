@@ -1,6 +1,10 @@
 """
 Comet API провайдер
+
+При stream=True ответ читается как SSE поток и собирается в обычный
+ProviderResult; время до первого токена сохраняется в raw.
 """
+import json
 import time
 import httpx
 import os
@@ -8,14 +12,16 @@ from typing import Dict, List, Optional, Any
 from loguru import logger
 
 from .base import Provider, ProviderResult
+from ..metrics import get_metrics
 
 
 class CometProvider(Provider):
     """Провайдер для Comet API"""
     
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: float = 60.0):
         self.api_key = api_key or os.getenv("COMET_API_KEY")
         self.base_url = base_url or os.getenv("COMET_BASE_URL", "https://api.cometapi.com")
+        self.timeout = timeout
         
         if not self.api_key:
             raise ValueError("COMET_API_KEY не найден в переменных окружения")
@@ -31,6 +37,31 @@ class CometProvider(Provider):
         **params
     ) -> ProviderResult:
         """Генерирует ответ через Comet API"""
+        metrics = get_metrics()
+        if not metrics.enabled:
+            return self._generate(messages, model, **params)
+        
+        with metrics.span("provider.generate", provider="comet", model=model) as span:
+            result = self._generate(messages, model, **params)
+            span.attrs["status"] = result.status_code or result.error_kind
+        
+        metrics.inc("provider_requests_total", model=model)
+        metrics.observe("provider_latency_seconds", result.latency_ms / 1000.0, model=model)
+        if result.error:
+            metrics.inc("provider_errors_total", model=model, status=result.status_code or result.error_kind)
+        for kind in ("prompt", "completion"):
+            tokens = result.usage.get(f"{kind}_tokens")
+            if tokens:
+                metrics.inc("provider_tokens_total", tokens, model=model, kind=kind)
+        return result
+    
+    def _generate(
+        self, 
+        messages: List[Dict[str, str]], 
+        model: str, 
+        **params
+    ) -> ProviderResult:
+        """Выполняет HTTP запрос к Comet API"""
         
         url = f"{self.base_url}/v1/chat/completions"
         
@@ -46,59 +77,39 @@ class CometProvider(Provider):
             "Content-Type": "application/json"
         }
         
+        stream = bool(params.get("stream"))
+        if stream:
+            # usage в потоке OpenAI-совместимые API присылают только по запросу
+            payload.setdefault("stream_options", {"include_usage": True})
+        
         start_time = time.perf_counter()
         
         try:
-            with httpx.Client(timeout=60.0) as client:
-                response = client.post(url, json=payload, headers=headers)
+            with httpx.Client(timeout=self.timeout) as client, \
+                    client.stream("POST", url, json=payload, headers=headers) as response:
+                error = self._status_error(response, model, start_time)
+                if error is not None:
+                    return error
                 
-                # Проверяем статус ответа
-                if response.status_code == 401:
-                    return ProviderResult(
-                        text=None,
-                        usage={},
-                        finish_reason=None,
-                        raw={},
-                        latency_ms=int((time.perf_counter() - start_time) * 1000),
-                        error="Неверный API ключ"
-                    )
-                elif response.status_code == 404:
-                    return ProviderResult(
-                        text=None,
-                        usage={},
-                        finish_reason=None,
-                        raw={},
-                        latency_ms=int((time.perf_counter() - start_time) * 1000),
-                        error=f"Модель '{model}' не найдена"
-                    )
-                elif response.status_code == 429:
-                    return ProviderResult(
-                        text=None,
-                        usage={},
-                        finish_reason=None,
-                        raw={},
-                        latency_ms=int((time.perf_counter() - start_time) * 1000),
-                        error="Превышен лимит запросов (rate limit)"
-                    )
-                elif response.status_code >= 500:
-                    return ProviderResult(
-                        text=None,
-                        usage={},
-                        finish_reason=None,
-                        raw={},
-                        latency_ms=int((time.perf_counter() - start_time) * 1000),
-                        error=f"Ошибка сервера: {response.status_code}"
-                    )
+                if stream:
+                    data = self._read_stream(response, start_time)
+                else:
+                    response.read()
+                    response.raise_for_status()
+                    data = response.json()
                 
-                response.raise_for_status()
-                data = response.json()
-                
-                # Извлекаем результат
-                choice = data.get("choices", [{}])[0]
-                message = choice.get("message", {})
-                text = message.get("content")
-                finish_reason = choice.get("finish_reason")
-                usage = data.get("usage", {})
+                # Извлекаем результат (при n > 1 первый сэмпл — основной)
+                choices = [
+                    {
+                        "index": c.get("index", i),
+                        "text": c.get("message", {}).get("content"),
+                        "finish_reason": c.get("finish_reason")
+                    }
+                    for i, c in enumerate(data.get("choices") or [{}])
+                ]
+                text = choices[0]["text"]
+                finish_reason = choices[0]["finish_reason"]
+                usage = data.get("usage") or {}
                 
                 latency_ms = int((time.perf_counter() - start_time) * 1000)
                 
@@ -109,7 +120,9 @@ class CometProvider(Provider):
                     usage=usage,
                     finish_reason=finish_reason,
                     raw=data,
-                    latency_ms=latency_ms
+                    latency_ms=latency_ms,
+                    status_code=response.status_code,
+                    choices=choices
                 )
                 
         except httpx.TimeoutException:
@@ -119,7 +132,8 @@ class CometProvider(Provider):
                 finish_reason=None,
                 raw={},
                 latency_ms=int((time.perf_counter() - start_time) * 1000),
-                error="Таймаут запроса (60 секунд)"
+                error=f"Таймаут запроса ({self.timeout:g} секунд)",
+                error_kind="timeout"
             )
         except httpx.RequestError as e:
             return ProviderResult(
@@ -128,7 +142,8 @@ class CometProvider(Provider):
                 finish_reason=None,
                 raw={},
                 latency_ms=int((time.perf_counter() - start_time) * 1000),
-                error=f"Ошибка сети: {str(e)}"
+                error=f"Ошибка сети: {str(e)}",
+                error_kind="network"
             )
         except Exception as e:
             logger.error(f"Неожиданная ошибка в CometProvider: {e}")
@@ -138,9 +153,80 @@ class CometProvider(Provider):
                 finish_reason=None,
                 raw={},
                 latency_ms=int((time.perf_counter() - start_time) * 1000),
-                error=f"Неожиданная ошибка: {str(e)}"
+                error=f"Неожиданная ошибка: {str(e)}",
+                error_kind="unexpected"
             )
     
+    def _status_error(self, response: httpx.Response, model: str, start_time: float) -> Optional[ProviderResult]:
+        """Результат с ошибкой для статусов, которые не являются ответом модели"""
+        status = response.status_code
+        if status == 401:
+            error, kind = "Неверный API ключ", "auth"
+        elif status == 404:
+            error, kind = f"Модель '{model}' не найдена", "not_found"
+        elif status == 429:
+            error, kind = "Превышен лимит запросов (rate limit)", "rate_limit"
+        elif status >= 500:
+            error, kind = f"Ошибка сервера: {status}", "server"
+        else:
+            return None
+        return ProviderResult(
+            text=None,
+            usage={},
+            finish_reason=None,
+            raw={},
+            latency_ms=int((time.perf_counter() - start_time) * 1000),
+            error=error,
+            status_code=status,
+            error_kind=kind,
+            retry_after_s=_retry_after(response) if status in (429, 503) else None
+        )
+    
+    def _read_stream(self, response: httpx.Response, start_time: float) -> Dict[str, Any]:
+        """
+        Собирает SSE поток chat.completion.chunk в тело обычного ответа.
+        
+        Время до первого фрагмента текста — в raw["time_to_first_token_ms"].
+        """
+        response.raise_for_status()
+        data: Dict[str, Any] = {"object": "chat.completion", "choices": [], "usage": {}}
+        texts: Dict[int, List[str]] = {}
+        finish_reasons: Dict[int, Optional[str]] = {}
+        first_token_ms = None
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            body = line[len("data:"):].strip()
+            if body == "[DONE]":
+                break
+            chunk = json.loads(body)
+            for key in ("id", "created", "model"):
+                if key in chunk:
+                    data[key] = chunk[key]
+            if chunk.get("usage"):
+                data["usage"] = chunk["usage"]
+            for choice in chunk.get("choices") or []:
+                index = choice.get("index", 0)
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    if first_token_ms is None:
+                        first_token_ms = int((time.perf_counter() - start_time) * 1000)
+                    texts.setdefault(index, []).append(content)
+                else:
+                    texts.setdefault(index, [])
+                if choice.get("finish_reason") is not None:
+                    finish_reasons[index] = choice["finish_reason"]
+        data["choices"] = [
+            {
+                "index": index,
+                "message": {"role": "assistant", "content": "".join(texts[index])},
+                "finish_reason": finish_reasons.get(index)
+            }
+            for index in sorted(texts)
+        ]
+        data["time_to_first_token_ms"] = first_token_ms
+        return data
+    
     def validate_model(self, model: str) -> bool:
         """Проверяет доступность модели через тестовый запрос"""
         try:
@@ -157,4 +243,12 @@ class CometProvider(Provider):
             
         except Exception as e:
             logger.warning(f"Ошибка валидации модели {model}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Retry-After в секундах (дата в заголовке не поддерживается)"""
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
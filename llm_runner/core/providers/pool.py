@@ -0,0 +1,219 @@
+"""
+Пул провайдеров: несколько ключей и OpenAI-совместимых base URL
+
+Запросы распределяются между участниками по стратегии round_robin,
+least_outstanding (меньше всего запросов в полете) или least_latency
+(наименьшая сглаженная латентность). Участник, подряд вернувший несколько
+сбоев, неверный ключ или 429, выводится из ротации на время, растущее с
+каждым повтором. Для каждого участника ведется статистика.
+
+Конфигурация — LLM_RUNNER_POOL (JSON список {"api_key", "base_url", "name"})
+или списки через запятую COMET_API_KEYS / COMET_BASE_URLS; стратегия —
+LLM_RUNNER_POOL_STRATEGY.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .base import Provider, ProviderResult
+from .comet import CometProvider
+
+
+STRATEGIES = ("round_robin", "least_outstanding", "least_latency")
+
+# Ошибки, которые говорят о проблеме участника, а не запроса
+_MEMBER_FAILURES = {"auth", "rate_limit", "server", "timeout", "network"}
+
+
+@dataclass
+class MemberStats:
+    """Статистика участника пула"""
+    requests: int = 0
+    errors: int = 0
+    outstanding: int = 0
+    tokens: int = 0
+    latency_ms: Optional[float] = None   # экспоненциальное скользящее среднее
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    last_error: Optional[str] = None
+
+
+class PoolMember:
+    """Участник пула: провайдер и его состояние"""
+
+    def __init__(self, provider: Provider, name: str):
+        self.provider = provider
+        self.name = name
+        self.stats = MemberStats()
+
+    def healthy(self, now: float) -> bool:
+        return self.stats.ejected_until <= now
+
+
+class ProviderPool(Provider):
+    """Провайдер, распределяющий запросы между несколькими провайдерами"""
+
+    def __init__(
+        self,
+        members: List[PoolMember],
+        strategy: str = "least_outstanding",
+        max_consecutive_failures: int = 3,
+        eject_s: float = 30.0,
+        max_eject_s: float = 600.0
+    ):
+        if not members:
+            raise ValueError("Пул провайдеров пуст")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия пула: {strategy}")
+        self.members = members
+        self.strategy = strategy
+        self.max_consecutive_failures = max_consecutive_failures
+        self.eject_s = eject_s
+        self.max_eject_s = max_eject_s
+        self.base_url = "pool:" + ",".join(m.name for m in members)
+        self._lock = threading.Lock()
+        self._cursor = itertools.count()
+
+    def _pick(self) -> PoolMember:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [m for m in self.members if m.healthy(now)]
+            if not candidates:
+                # Все выведены — пробуем того, кто вернется раньше всех
+                candidates = [min(self.members, key=lambda m: m.stats.ejected_until)]
+            if self.strategy == "round_robin":
+                member = candidates[next(self._cursor) % len(candidates)]
+            elif self.strategy == "least_outstanding":
+                start = next(self._cursor)
+                rotated = candidates[start % len(candidates):] + candidates[:start % len(candidates)]
+                member = min(rotated, key=lambda m: m.stats.outstanding)
+            else:
+                # Участники без истории идут первыми, чтобы набрать статистику
+                member = min(candidates, key=lambda m: (m.stats.latency_ms is not None, m.stats.latency_ms or 0.0, m.stats.outstanding))
+            member.stats.outstanding += 1
+            member.stats.requests += 1
+            return member
+
+    def _record(self, member: PoolMember, result: ProviderResult) -> None:
+        now = time.monotonic()
+        with self._lock:
+            stats = member.stats
+            stats.outstanding -= 1
+            stats.tokens += result.usage.get("total_tokens", 0) or 0
+            if result.error and result.error_kind in _MEMBER_FAILURES:
+                stats.errors += 1
+                stats.last_error = result.error
+                stats.consecutive_failures += 1
+                # Неверный ключ и 429 выводят сразу, остальное — после серии сбоев
+                if result.error_kind in ("auth", "rate_limit") or stats.consecutive_failures >= self.max_consecutive_failures:
+                    stats.ejections += 1
+                    duration = min(self.eject_s * 2 ** (stats.ejections - 1), self.max_eject_s)
+                    stats.ejected_until = now + duration
+                    stats.consecutive_failures = 0
+                    logger.warning(f"Пул: {member.name} выведен из ротации на {duration:.0f} с ({result.error})")
+                return
+            if result.error:
+                stats.errors += 1
+                stats.last_error = result.error
+                return
+            stats.consecutive_failures = 0
+            stats.ejections = 0
+            alpha = 0.2
+            stats.latency_ms = result.latency_ms if stats.latency_ms is None else (1 - alpha) * stats.latency_ms + alpha * result.latency_ms
+
+    def generate(self, messages: List[Dict[str, str]], model: str, **params) -> ProviderResult:
+        """Генерирует ответ через выбранного участника"""
+        member = self._pick()
+        try:
+            result = member.provider.generate(messages, model, **params)
+        except Exception as e:
+            result = ProviderResult(
+                text=None, usage={}, finish_reason=None, raw={}, latency_ms=0,
+                error=f"Неожиданная ошибка: {str(e)}", error_kind="unexpected"
+            )
+        self._record(member, result)
+        return result
+
+    def healthy_count(self) -> int:
+        """Число участников в ротации (не меньше одного: выведенные все — пробуем одного)"""
+        now = time.monotonic()
+        with self._lock:
+            return max(1, sum(1 for m in self.members if m.healthy(now)))
+
+    def validate_model(self, model: str) -> bool:
+        """Проверяет доступность модели через любого участника"""
+        result = self.generate([{"role": "user", "content": "Hi"}], model, max_tokens=1)
+        return result.error is None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Статистика участников для UI"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": m.name,
+                    "healthy": m.healthy(now),
+                    "requests": m.stats.requests,
+                    "errors": m.stats.errors,
+                    "outstanding": m.stats.outstanding,
+                    "tokens": m.stats.tokens,
+                    "latency_ms": round(m.stats.latency_ms) if m.stats.latency_ms is not None else None,
+                    "ejected_for_s": round(max(0.0, m.stats.ejected_until - now)),
+                    "last_error": m.stats.last_error
+                }
+                for m in self.members
+            ]
+
+
+def _mask(api_key: str) -> str:
+    return f"{api_key[:4]}…{api_key[-4:]}" if len(api_key) > 8 else "…"
+
+
+def _pool_config() -> List[Tuple[str, str, str]]:
+    """(api_key, base_url, name) участников из окружения"""
+    raw = os.getenv("LLM_RUNNER_POOL")
+    if raw:
+        entries = json.loads(raw)
+        default_url = os.getenv("COMET_BASE_URL", "https://api.cometapi.com")
+        return [
+            (e["api_key"], e.get("base_url", default_url), e.get("name") or f"{e.get('base_url', default_url)} {_mask(e['api_key'])}")
+            for e in entries
+        ]
+    keys = [k.strip() for k in os.getenv("COMET_API_KEYS", "").split(",") if k.strip()]
+    urls = [u.strip() for u in os.getenv("COMET_BASE_URLS", "").split(",") if u.strip()]
+    if not keys and not urls:
+        return []
+    keys = keys or [os.getenv("COMET_API_KEY", "")]
+    urls = urls or [os.getenv("COMET_BASE_URL", "https://api.cometapi.com")]
+    return [(key, url, f"{url} {_mask(key)}") for url in urls for key in keys]
+
+
+@lru_cache(maxsize=8)
+def _cached_pool(config: Tuple[Tuple[str, str, str], ...], strategy: str) -> ProviderPool:
+    members = [PoolMember(CometProvider(api_key=key, base_url=url), name) for key, url, name in config]
+    logger.info(f"Пул провайдеров: {len(members)} участников, стратегия {strategy}")
+    return ProviderPool(members, strategy=strategy)
+
+
+def provider_from_env() -> Provider:
+    """
+    Провайдер по настройкам окружения: пул, если настроено несколько
+    ключей или base URL, иначе одиночный CometProvider.
+
+    Пул общий для процесса, чтобы статистика и вывод из ротации
+    сохранялись между перезапусками страниц Streamlit.
+    """
+    config = tuple(_pool_config())
+    if len(config) <= 1:
+        if config:
+            return CometProvider(api_key=config[0][0], base_url=config[0][1])
+        return CometProvider()
+    return _cached_pool(config, os.getenv("LLM_RUNNER_POOL_STRATEGY", "least_outstanding"))
@@ -0,0 +1,135 @@
+"""
+Рейтинг моделей по парным сравнениям: Elo и Bradley–Terry
+
+Elo обновляется онлайн, по одному сравнению, и хранится в базе. Модель
+Bradley–Terry подгоняется по всем сравнениям сразу: сравнения сжимаются
+в матрицу побед модели × модели (ничья — по половине победы каждой
+стороне), а сила моделей находится MM-итерациями (Hunter, 2004).
+Бутстреп не пересэмплирует сравнения по одному: выборка с возвращением
+из n сравнений — это мультиномиальные веса уникальных исходов, поэтому
+все B повторов считаются одним тензором B × модели × модели.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+ELO_INITIAL = 1000.0
+ELO_K = 32.0
+# Шкала вывода Bradley–Terry: как у Elo, 400 пунктов — 10-кратное превосходство
+BT_SCALE = 400.0 / np.log(10.0)
+
+
+def elo_expected(rating_a: float, rating_b: float) -> float:
+    """Ожидаемый счет A против B"""
+    return 1.0 / (1.0 + 10 ** ((rating_b - rating_a) / 400.0))
+
+
+def elo_update(rating_a: float, rating_b: float, score_a: float, k: float = ELO_K) -> Tuple[float, float]:
+    """Новые рейтинги после сравнения; score_a — 1 (победа A), 0.5 (ничья) или 0"""
+    delta = k * (score_a - elo_expected(rating_a, rating_b))
+    return rating_a + delta, rating_b - delta
+
+
+@dataclass
+class RankedModel:
+    """Строка рейтинга Bradley–Terry"""
+    model: str
+    score: float
+    ci_low: float
+    ci_high: float
+    comparisons: int
+    win_rate: float
+
+
+def _fit(wins: np.ndarray, iterations: int = 200, tol: float = 1e-8) -> np.ndarray:
+    """
+    MM-итерации Bradley–Terry для пачки матриц побед shape (B, M, M).
+
+    Возвращает логарифмы сил shape (B, M), центрированные по моделям.
+    """
+    games = wins + np.swapaxes(wins, 1, 2)
+    total_wins = wins.sum(axis=2)
+    # Слабая априорная ничья с виртуальным соперником: модели без побед
+    # или без поражений не уходят в бесконечность
+    prior = 0.5
+    strength = np.ones(wins.shape[:2])
+    for _ in range(iterations):
+        pair_sum = strength[:, :, None] + strength[:, None, :]
+        denominator = (games / pair_sum).sum(axis=2) + 2 * prior / (strength + 1.0)
+        updated = (total_wins + prior) / denominator
+        updated /= np.exp(np.log(updated).mean(axis=1, keepdims=True))
+        converged = np.max(np.abs(updated - strength)) < tol
+        strength = updated
+        if converged:
+            break
+    log_strength = np.log(strength)
+    return log_strength - log_strength.mean(axis=1, keepdims=True)
+
+
+def bradley_terry(
+    model_a: Sequence[str],
+    model_b: Sequence[str],
+    outcome: Sequence[float],
+    counts: Optional[Sequence[int]] = None,
+    bootstrap: int = 200,
+    confidence: float = 0.95,
+    seed: Optional[int] = 0
+) -> List[RankedModel]:
+    """
+    Рейтинг по сравнениям: outcome[i] — счет model_a[i] против model_b[i]
+    (1, 0.5 или 0), counts[i] — сколько раз встретился такой исход (по
+    умолчанию 1, можно передавать уже сгруппированные в SQL строки).
+    Результат отсортирован по убыванию силы, шкала — Elo-подобная.
+    """
+    models = sorted(set(model_a) | set(model_b))
+    if not models:
+        return []
+    index = {model: i for i, model in enumerate(models)}
+    a = np.fromiter((index[m] for m in model_a), dtype=np.int64, count=len(model_a))
+    b = np.fromiter((index[m] for m in model_b), dtype=np.int64, count=len(model_b))
+    score = np.asarray(outcome, dtype=np.float64)
+    weight = np.ones(len(score)) if counts is None else np.asarray(counts, dtype=np.float64)
+    m = len(models)
+
+    # Уникальные исходы (a, b, счет) и их количества
+    keys = (a * m + b) * 3 + np.rint(score * 2).astype(np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=weight)
+    pair, half_points = np.divmod(unique, 3)
+    ua, ub = np.divmod(pair, m)
+    points = half_points / 2.0
+
+    def wins_matrix(weights: np.ndarray) -> np.ndarray:
+        """weights shape (B, G) -> матрицы побед shape (B, M, M)"""
+        wins = np.zeros((weights.shape[0], m * m))
+        np.add.at(wins, (slice(None), ua * m + ub), weights * points)
+        np.add.at(wins, (slice(None), ub * m + ua), weights * (1 - points))
+        return wins.reshape(-1, m, m)
+
+    point = _fit(wins_matrix(counts[None, :]))[0] * BT_SCALE
+    if bootstrap > 0:
+        rng = np.random.default_rng(seed)
+        samples = rng.multinomial(int(counts.sum()), counts / counts.sum(), size=bootstrap).astype(np.float64)
+        resampled = _fit(wins_matrix(samples)) * BT_SCALE
+        alpha = (1 - confidence) / 2
+        low, high = np.quantile(resampled, [alpha, 1 - alpha], axis=0)
+    else:
+        low, high = point, point
+
+    comparisons = np.bincount(a, weights=weight, minlength=m) + np.bincount(b, weights=weight, minlength=m)
+    won = np.bincount(a, weights=weight * score, minlength=m) + np.bincount(b, weights=weight * (1 - score), minlength=m)
+    ranked = [
+        RankedModel(
+            model=model,
+            score=float(point[i]) + ELO_INITIAL,
+            ci_low=float(low[i]) + ELO_INITIAL,
+            ci_high=float(high[i]) + ELO_INITIAL,
+            comparisons=int(comparisons[i]),
+            win_rate=float(won[i] / comparisons[i]) if comparisons[i] else 0.0
+        )
+        for i, model in enumerate(models)
+    ]
+    return sorted(ranked, key=lambda r: r.score, reverse=True)
+
@@ -0,0 +1,171 @@
+"""
+Ограничение скорости запросов к провайдеру
+
+Два ведра токенов на модель: запросы в минуту и токены в минуту. Токены
+списываются по локальной оценке до отправки (core.tokens) и уточняются по
+фактическому usage после ответа. Ожидающие квоту обслуживаются по классам
+приоритета и весам потоков (core.scheduler). Лимиты задаются переменными
+LLM_RUNNER_RPM и LLM_RUNNER_TPM на один ключ API (0 или пусто — без
+ограничения). Ограничитель свой для каждого провайдера и модели; у пула
+провайдеров лимиты умножаются на число участников в ротации.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .scheduler import BATCH, FairQueue, flow_weights
+
+
+class _Bucket:
+    """Ведро с равномерным пополнением capacity единиц в минуту"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def resize(self, per_minute: float) -> None:
+        """Меняет лимит, сохраняя накопленный уровень (не выше новой емкости)"""
+        self.refill(time.monotonic())
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = min(self.level, self.capacity)
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # Запрос больше емкости ведра пропускается, когда ведро полное
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов и токенов в минуту, безопасен для потоков.
+
+    Ожидающие запросы обслуживаются в порядке FairQueue: interactive раньше
+    batch, внутри класса — взвешенное справедливое деление по потокам.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self._queue = FairQueue(flow_weights())
+        self._base_limits = (requests_per_minute, tokens_per_minute)
+        self.scale = 1
+
+    @property
+    def enabled(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    @property
+    def waiting(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def set_scale(self, scale: int) -> None:
+        """Умножает исходные лимиты на scale (число ключей, между которыми делятся запросы)"""
+        scale = max(1, scale)
+        if scale == self.scale:
+            return
+        with self._lock:
+            self.scale = scale
+            for bucket, per_minute in zip((self._requests, self._tokens), self._base_limits):
+                if bucket is not None:
+                    bucket.resize(per_minute * scale)
+            self._changed.notify_all()
+
+    def set_flow_weight(self, flow: str, weight: float) -> None:
+        with self._lock:
+            self._queue.set_weight(flow, weight)
+
+    def _wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+    def acquire(
+        self,
+        tokens: int = 0,
+        timeout: Optional[float] = None,
+        priority: str = BATCH,
+        flow: str = "default"
+    ) -> bool:
+        """
+        Ждет своей очереди и запаса на один запрос и tokens токенов.
+
+        Возвращает False, если за timeout секунд квота не досталась.
+        """
+        if not self.enabled:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            waiter = self._queue.push(priority, flow, cost=tokens or 1)
+            try:
+                while True:
+                    wait = self._wait_time(tokens)
+                    if self._queue.head() is waiter and wait == 0.0:
+                        if self._requests is not None:
+                            self._requests.level -= 1
+                        if self._tokens is not None:
+                            self._tokens.level -= min(tokens, self._tokens.capacity)
+                        self._queue.grant(waiter)
+                        return True
+                    # Не первый в очереди — ждем, пока нас разбудит обслуживание головы
+                    if self._queue.head() is not waiter:
+                        wait = 1.0
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or (wait > remaining and self._queue.head() is waiter):
+                            return False
+                        wait = min(wait, remaining)
+                    self._changed.wait(min(wait, 1.0))
+            finally:
+                self._queue.remove(waiter)
+                self._changed.notify_all()
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Поправляет ведро токенов на разницу между оценкой и фактом"""
+        if self._tokens is None:
+            return
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            # Переплата возвращается, недоплата уводит уровень в минус до следующих пополнений
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + estimated_tokens - actual_tokens)
+            self._changed.notify_all()
+
+
+_limiters: Dict[Tuple[Optional[str], str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str, provider: Any = None) -> RateLimiter:
+    """
+    Общий для процесса ограничитель модели у провайдера (по его base_url).
+
+    Для пула (provider.healthy_count) лимиты на ключ умножаются на число
+    участников в ротации при каждом вызове.
+    """
+    key = (getattr(provider, "base_url", None), model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(
+                requests_per_minute=float(os.getenv("LLM_RUNNER_RPM", "0") or 0),
+                tokens_per_minute=float(os.getenv("LLM_RUNNER_TPM", "0") or 0)
+            )
+            _limiters[key] = limiter
+    healthy_count = getattr(provider, "healthy_count", None)
+    if callable(healthy_count) and limiter.enabled:
+        limiter.set_scale(healthy_count())
+    return limiter
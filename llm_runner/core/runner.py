@@ -0,0 +1,345 @@
+"""
+Параллельный запуск одного промпта на нескольких моделях и профилях параметров
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+
+from .budget import BatchBudget, BudgetExceeded, budgets_configured, get_budget_manager
+from .circuit import circuit_enabled, get_circuit_breaker, is_failure
+from .coalesce import coalescing_enabled, is_deterministic, request_key, single_flight
+from .hedging import get_hedge_policy, get_latency_tracker, hedged_call, hedging_enabled
+from .metrics import get_metrics
+from .cost import estimate_cost
+from .providers.base import Provider, ProviderResult
+from .ratelimit import get_rate_limiter
+from .scheduler import BATCH
+from .tokens import ContextOverflowError, RequestEstimate, preflight
+
+
+# error_kind запросов, которые не отправлялись и не сохраняются как запуски
+DEFERRED_KINDS = ("budget", "circuit_open")
+
+
+@dataclass
+class RunJob:
+    """Один запрос веера: модель и профиль параметров"""
+    model: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    profile: str = "default"
+    priority: str = BATCH     # класс приоритета в очереди ограничителя скорости
+    flow: str = "default"     # поток для справедливого деления квоты (пользователь, батч)
+
+    @property
+    def label(self) -> str:
+        """Подпись для UI"""
+        return self.model if self.profile == "default" else f"{self.model} · {self.profile}"
+
+
+def _split_evenly(total: int, weights: List[float]) -> List[int]:
+    """Делит целое total пропорционально весам (метод наибольших остатков)"""
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        weights, weight_sum = [1.0] * len(weights), float(len(weights))
+    exact = [total * w / weight_sum for w in weights]
+    shares = [int(x) for x in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True)
+    for i in by_remainder[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def apportion_usage(usage: Dict[str, int], texts: List[Optional[str]]) -> List[Dict[str, int]]:
+    """
+    Распределяет usage одного запроса с n сэмплами по сэмплам.
+
+    Промпт оплачен один раз и делится поровну, completion токены —
+    пропорционально длине текста сэмпла. Суммы по сэмплам равны исходным.
+    """
+    count = len(texts)
+    prompt_shares = _split_evenly(usage.get("prompt_tokens", 0) or 0, [1.0] * count)
+    completion_shares = _split_evenly(usage.get("completion_tokens", 0) or 0, [float(len(t or "")) for t in texts])
+    return [
+        {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion
+        }
+        for prompt, completion in zip(prompt_shares, completion_shares)
+    ]
+
+
+def result_to_runs(
+    task_id: str,
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    messages: List[Dict[str, str]],
+    result: ProviderResult
+) -> List[Dict[str, Any]]:
+    """
+    Аргументы create_run/submit_run для результата: по одному запуску на сэмпл.
+
+    Сэмплы одного запроса связаны общим sample_group_id, а в response_json
+    каждого сохраняется только его собственный choice.
+    """
+    base = dict(
+        task_id=task_id,
+        provider=provider,
+        model=model,
+        params=params,
+        messages=messages,
+        error=result.error,
+        latency_ms=result.latency_ms
+    )
+    if result.error or len(result.choices) <= 1:
+        return [dict(
+            base,
+            response_text=result.text,
+            response_json=result.raw,
+            usage=result.usage,
+            finish_reason=result.finish_reason
+        )]
+
+    group_id = str(uuid.uuid4())
+    raw_choices = result.raw.get("choices") or []
+    usages = apportion_usage(result.usage, [c["text"] for c in result.choices])
+    runs = []
+    for position, (choice, usage) in enumerate(zip(result.choices, usages)):
+        raw_choice = raw_choices[position] if position < len(raw_choices) else {}
+        runs.append(dict(
+            base,
+            response_text=choice["text"],
+            response_json={**result.raw, "choices": [raw_choice], "usage": usage},
+            usage=usage,
+            finish_reason=choice["finish_reason"],
+            sample_group_id=group_id,
+            sample_index=choice["index"]
+        ))
+    return runs
+
+
+def build_jobs(
+    models: List[str],
+    profiles: Dict[str, Dict[str, Any]],
+    priority: str = BATCH,
+    flow: str = "default"
+) -> List[RunJob]:
+    """Декартово произведение моделей и профилей параметров"""
+    return [
+        RunJob(model=model, params=dict(params), profile=profile, priority=priority, flow=flow)
+        for model in models
+        for profile, params in profiles.items()
+    ]
+
+
+def _rejected(error: str, error_kind: str) -> ProviderResult:
+    """Результат запроса, не отправленного в API"""
+    return ProviderResult(
+        text=None,
+        usage={},
+        finish_reason=None,
+        raw={},
+        latency_ms=0,
+        error=error,
+        error_kind=error_kind
+    )
+
+
+def _dispatch(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    job: RunJob,
+    estimate: RequestEstimate,
+    budget: Optional[BatchBudget] = None
+) -> ProviderResult:
+    """Отправляет запрос через выключатель и ограничитель скорости модели, при необходимости с хеджем"""
+    breaker = get_circuit_breaker(getattr(provider, "base_url", None), job.model) if circuit_enabled() else None
+    if breaker is not None and not breaker.allow():
+        return _rejected(
+            f"Модель {job.model} временно отключена после серии сбоев, повтор через {breaker.retry_in():.0f} с",
+            "circuit_open"
+        )
+
+    limiter = get_rate_limiter(job.model, provider)
+    limiter.acquire(estimate.total_tokens, priority=job.priority, flow=job.flow)
+    tracker = get_latency_tracker(job.model)
+    delay_s = get_hedge_policy().delay_s(tracker) if hedging_enabled() and not job.params.get("stream") else None
+    try:
+        if delay_s is None:
+            result = provider.generate(messages, job.model, **job.params)
+        else:
+            result = _generate_hedged(provider, messages, job, estimate, budget, delay_s)
+    except Exception:
+        if breaker is not None:
+            breaker.record(True)
+        raise
+    limiter.reconcile(estimate.total_tokens, result.usage.get("total_tokens", 0) or 0)
+    if breaker is not None:
+        breaker.record(is_failure(result))
+    if not result.error:
+        tracker.record(result.latency_ms)
+    return result
+
+
+def _generate_hedged(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    job: RunJob,
+    estimate: RequestEstimate,
+    budget: Optional[BatchBudget],
+    delay_s: float
+) -> ProviderResult:
+    """Запрос с дублем после delay_s; проигравшая попытка учитывается в лимитах и бюджете"""
+    limiter = get_rate_limiter(job.model, provider)
+    hedge_reservation = []
+
+    def start_hedge() -> bool:
+        # Дубль не должен ждать лимитов или бюджета: тогда он уже бесполезен
+        if not get_hedge_policy().try_hedge():
+            return False
+        if not limiter.acquire(estimate.total_tokens, timeout=0, priority=job.priority, flow=job.flow):
+            return False
+        if budgets_configured(budget):
+            try:
+                hedge_reservation.append(get_budget_manager().reserve(
+                    job.model,
+                    estimate.total_tokens,
+                    budget,
+                    cost_usd=estimate_cost(job.model, estimate.prompt_tokens, estimate.completion_tokens, fallback=True),
+                    wait_s=0
+                ))
+            except BudgetExceeded:
+                limiter.reconcile(estimate.total_tokens, 0)
+                return False
+        get_metrics().inc("provider_hedges_total", model=job.model)
+        return True
+
+    def on_abandoned(loser: ProviderResult) -> None:
+        # Лимиты и бюджет под вторую попытку сверяются с расходом проигравшей
+        usage = loser.usage or {}
+        limiter.reconcile(estimate.total_tokens, usage.get("total_tokens", 0) or 0)
+        if hedge_reservation:
+            get_budget_manager().settle(hedge_reservation[0], usage)
+        if usage.get("total_tokens"):
+            get_metrics().inc("provider_hedge_wasted_tokens_total", usage["total_tokens"], model=job.model)
+
+    started: List[float] = []
+
+    def call() -> ProviderResult:
+        # Дубль стартует только после первой попытки, поэтому первая отметка — ее
+        if not started:
+            started.append(time.perf_counter())
+        return provider.generate(messages, job.model, **job.params)
+
+    result, hedged = hedged_call(call, delay_s, start_hedge, on_abandoned)
+    if hedged:
+        # Латентность запроса — от старта первой попытки, а не от старта выигравшего дубля
+        result.latency_ms = int((time.perf_counter() - started[0]) * 1000)
+        result.raw = {**result.raw, "hedged": True}
+    return result
+
+
+def is_deferred(result: ProviderResult) -> bool:
+    """Запрос не отправлялся (бюджет или разомкнутая цепь) — его можно повторить позже"""
+    return result.error_kind in DEFERRED_KINDS
+
+
+def generate_safely(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    job: RunJob,
+    budget: Optional[BatchBudget] = None
+) -> ProviderResult:
+    """
+    Вызывает провайдер, превращая исключение в ProviderResult с ошибкой.
+
+    Перед отправкой запрос проверяется локально: не влезающий в контекст
+    промпт отклоняется (или обрезается) без сетевого вызова, оценка
+    резервируется в дневном бюджете и бюджете батча, а токены списываются
+    в ограничителе скорости модели. Одинаковые одновременные
+    детерминированные запросы объединяются в один вызов, медленные
+    (при LLM_RUNNER_HEDGE=1) дублируются.
+    """
+    started = time.perf_counter()
+    try:
+        messages, estimate = preflight(messages, job.model, job.params)
+    except ContextOverflowError as e:
+        logger.warning(f"Запрос {job.label} отклонен до отправки: {e}")
+        return _rejected(str(e), "context_length")
+
+    reservation = None
+    if budgets_configured(budget):
+        try:
+            reservation = get_budget_manager().reserve(
+                job.model,
+                estimate.total_tokens,
+                budget,
+                cost_usd=estimate_cost(job.model, estimate.prompt_tokens, estimate.completion_tokens, fallback=True)
+            )
+        except BudgetExceeded as e:
+            logger.warning(f"Запрос {job.label} отложен: {e}")
+            return _rejected(str(e), "budget")
+        except SQLAlchemyError as e:
+            # База бюджетов заблокирована или недоступна: запрос откладывается, веер продолжается
+            logger.error(f"Запрос {job.label} отложен, бюджет недоступен: {e}")
+            return _rejected(f"Бюджет недоступен: {e}", "budget")
+
+    result = None
+    try:
+        if coalescing_enabled() and is_deterministic(job.params):
+            key = request_key(provider, job.model, messages, job.params)
+            result, shared = single_flight.do(key, lambda: _dispatch(provider, messages, job, estimate, budget))
+            if shared:
+                get_metrics().inc("provider_coalesced_total", model=job.model)
+                result.coalesced = True
+            return result
+        result = _dispatch(provider, messages, job, estimate, budget)
+        return result
+    except Exception as e:
+        logger.error(f"Ошибка запуска {job.label}: {e}")
+        return ProviderResult(
+            text=None,
+            usage={},
+            finish_reason=None,
+            raw={},
+            latency_ms=int((time.perf_counter() - started) * 1000),
+            error=f"Неожиданная ошибка: {str(e)}",
+            error_kind="unexpected"
+        )
+    finally:
+        if reservation is not None:
+            # Объединенный запрос оплачен ведущим вызовом
+            spent = result.usage if result is not None and not result.coalesced else {}
+            try:
+                get_budget_manager().settle(reservation, spent)
+            except SQLAlchemyError as e:
+                # Резерв не списан: его освободит LLM_RUNNER_BUDGET_STALE
+                logger.error(f"Не удалось списать бюджет запроса {job.label}: {e}")
+
+
+def fan_out(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    jobs: List[RunJob],
+    max_workers: int = 16,
+    budget: Optional[BatchBudget] = None
+) -> Iterator[Tuple[RunJob, ProviderResult]]:
+    """
+    Отправляет все запросы одновременно и отдает результаты по мере готовности.
+
+    Общее время равно времени самой медленной модели, а не сумме всех.
+    Запросы, не поместившиеся в бюджет или к модели с разомкнутой цепью,
+    возвращаются сразу без обращения к API (см. is_deferred).
+    """
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)), thread_name_prefix="llm-runner-fanout") as executor:
+        futures = {executor.submit(generate_safely, provider, messages, job, budget): job for job in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,117 @@
+"""
+Очередь ожидающих общий лимит: классы приоритета и справедливое деление
+
+Когда ограничитель скорости исчерпан, запросы ждут в этой очереди. Сначала
+обслуживается класс interactive (человек ждет один ответ в Runs или
+Settings), затем batch. Внутри класса потоки (пользователи, батчи)
+делят квоту пропорционально весам: у каждого потока есть виртуальное
+время, которое растет на стоимость обслуженного запроса / вес, и
+следующим обслуживается поток с наименьшим временем. Внутри потока — FIFO.
+"""
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+
+@dataclass
+class Waiter:
+    """Запрос, ожидающий квоту"""
+    priority: str
+    flow: str
+    cost: float
+    seq: int
+
+
+@dataclass
+class _Flow:
+    weight: float = 1.0
+    vtime: float = 0.0
+    waiting: List[Waiter] = field(default_factory=list)
+
+
+class FairQueue:
+    """
+    Очередь с приоритетами и взвешенным справедливым делением.
+
+    Не потокобезопасна сама по себе: вызывающий держит свою блокировку
+    (ограничитель скорости использует ее под своим Condition).
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(weights or {})
+        self._flows: Dict[Tuple[str, str], _Flow] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(len(flow.waiting) for flow in self._flows.values())
+
+    def push(self, priority: str = BATCH, flow: str = "default", cost: float = 1.0) -> Waiter:
+        """Ставит запрос в очередь"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Неизвестный класс приоритета: {priority}")
+        key = (priority, flow)
+        state = self._flows.get(key)
+        if state is None:
+            state = self._flows[key] = _Flow(weight=self.weights.get(flow, 1.0))
+        if not state.waiting:
+            # Вернувшийся поток не получает кредит за время простоя
+            active = [f.vtime for k, f in self._flows.items() if k[0] == priority and f.waiting]
+            state.vtime = max(state.vtime, min(active)) if active else state.vtime
+        waiter = Waiter(priority=priority, flow=flow, cost=max(cost, 1.0), seq=next(self._seq))
+        state.waiting.append(waiter)
+        return waiter
+
+    def head(self) -> Optional[Waiter]:
+        """Кто обслуживается следующим"""
+        for priority in PRIORITY_CLASSES:
+            candidates = [f for k, f in self._flows.items() if k[0] == priority and f.waiting]
+            if candidates:
+                best = min(candidates, key=lambda f: (f.vtime, f.waiting[0].seq))
+                return best.waiting[0]
+        return None
+
+    def grant(self, waiter: Waiter) -> None:
+        """Снимает обслуженный запрос и продвигает виртуальное время его потока"""
+        state = self._flows[(waiter.priority, waiter.flow)]
+        state.waiting.remove(waiter)
+        state.vtime += waiter.cost / state.weight
+
+    def remove(self, waiter: Waiter) -> None:
+        """Снимает запрос без обслуживания (таймаут)"""
+        state = self._flows.get((waiter.priority, waiter.flow))
+        if state is not None and waiter in state.waiting:
+            state.waiting.remove(waiter)
+
+    def set_weight(self, flow: str, weight: float) -> None:
+        """Вес потока во всех классах"""
+        self.weights[flow] = weight
+        for (_, name), state in self._flows.items():
+            if name == flow:
+                state.weight = weight
+
+
+_lock = threading.Lock()
+_flow_weights: Dict[str, float] = {}
+
+
+def set_flow_weight(flow: str, weight: float) -> None:
+    """Задает вес потока для всех ограничителей процесса"""
+    from .ratelimit import _limiters, _limiters_lock
+
+    with _lock:
+        _flow_weights[flow] = weight
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        limiter.set_flow_weight(flow, weight)
+
+
+def flow_weights() -> Dict[str, float]:
+    with _lock:
+        return dict(_flow_weights)
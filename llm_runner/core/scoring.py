@@ -0,0 +1,139 @@
+"""
+Автоматические метрики ответа относительно эталона
+
+exact match, token F1, ROUGE-L и BLEU считаются за один проход по паре:
+текст токенизируется один раз, счетчики n-грамм общие для F1 и BLEU,
+LCS для ROUGE-L — битово-параллельным алгоритмом (Hyyrö) на целых Python,
+то есть за O(n·m/w) вместо таблицы n×m. В пачке одинаковые пары считаются
+один раз, большие пачки делятся на куски и считаются в пуле процессов,
+результат — матрица numpy (пары × метрики).
+"""
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+METRICS = ("exact_match", "token_f1", "rouge_l", "bleu")
+BLEU_MAX_N = 4
+
+# Меньше этого пары считаются в текущем процессе: запуск пула дороже
+PARALLEL_MIN_PAIRS = 2000
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Нормализованные токены: нижний регистр, только буквы и цифры"""
+    return _WORD.findall((text or "").lower())
+
+
+def _ngrams(tokens: List[str], n: int) -> Counter:
+    return Counter(zip(*(tokens[i:] for i in range(n))))
+
+
+def _overlap(predicted: Counter, reference: Counter) -> int:
+    """Число совпавших n-грамм с отсечением по эталону"""
+    if len(predicted) > len(reference):
+        predicted, reference = reference, predicted
+    return sum(min(count, reference[gram]) for gram, count in predicted.items() if gram in reference)
+
+
+def lcs_length(a: List[str], b: List[str]) -> int:
+    """Длина наибольшей общей подпоследовательности (битово-параллельно)"""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return 0
+    # Маска позиций каждого токена в b; b короче, поэтому маски уже
+    masks: Dict[str, int] = {}
+    for i, token in enumerate(b):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    v = full
+    for token in a:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(b) - bin(v).count("1")
+
+
+def _f1(overlap: float, predicted: int, reference: int) -> float:
+    if overlap == 0 or predicted == 0 or reference == 0:
+        return 0.0
+    precision, recall = overlap / predicted, overlap / reference
+    return 2 * precision * recall / (precision + recall)
+
+
+def _bleu(prediction: List[str], reference: List[str], unigrams: Tuple[Counter, Counter]) -> float:
+    """Sentence BLEU до 4-грамм со сглаживанием +1 для n > 1 (Lin & Och, 2004)"""
+    if not prediction or not reference:
+        return 0.0
+    log_precision = 0.0
+    for n in range(1, BLEU_MAX_N + 1):
+        pred_counts, ref_counts = unigrams if n == 1 else (_ngrams(prediction, n), _ngrams(reference, n))
+        total = max(len(prediction) - n + 1, 0)
+        matched = _overlap(pred_counts, ref_counts)
+        if n == 1:
+            if matched == 0:
+                return 0.0
+            log_precision += math.log(matched / total)
+        else:
+            log_precision += math.log((matched + 1) / (total + 1))
+    brevity = 1.0 if len(prediction) > len(reference) else math.exp(1 - len(reference) / len(prediction))
+    return brevity * math.exp(log_precision / BLEU_MAX_N)
+
+
+def score_pair(prediction: str, reference: str) -> Tuple[float, float, float, float]:
+    """(exact_match, token_f1, rouge_l, bleu) ответа prediction относительно reference"""
+    pred, ref = tokenize(prediction), tokenize(reference)
+    exact = 1.0 if pred == ref else 0.0
+    unigrams = (Counter(pred), Counter(ref))
+    f1 = _f1(_overlap(*unigrams), len(pred), len(ref))
+    rouge_l = _f1(lcs_length(pred, ref), len(pred), len(ref))
+    return exact, f1, rouge_l, _bleu(pred, ref, unigrams)
+
+
+def _score_chunk(pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+    return np.array([score_pair(prediction, reference) for prediction, reference in pairs], dtype=np.float64).reshape(-1, len(METRICS))
+
+
+def score_batch(
+    predictions: Sequence[str],
+    references: Sequence[str],
+    max_workers: Optional[int] = None,
+    chunk_size: int = 500
+) -> np.ndarray:
+    """
+    Метрики для пачки пар: матрица shape (len(predictions), len(METRICS))
+    в порядке METRICS. Большие пачки считаются в пуле процессов.
+    """
+    if len(predictions) != len(references):
+        raise ValueError("Число ответов и эталонов не совпадает")
+    if not predictions:
+        return np.zeros((0, len(METRICS)))
+    # Одинаковые пары (сэмплы, повторы) считаются один раз и раздаются по индексу
+    unique: Dict[Tuple[str, str], int] = {}
+    index = np.fromiter(
+        (unique.setdefault((p or "", r or ""), len(unique)) for p, r in zip(predictions, references)),
+        dtype=np.int64, count=len(predictions)
+    )
+    pairs = list(unique)
+    workers = max_workers or os.cpu_count() or 1
+    if workers <= 1 or len(pairs) < PARALLEL_MIN_PAIRS:
+        return _score_chunk(pairs)[index]
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    # spawn: fork процесса со Streamlit и потоками писателя небезопасен
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=get_context("spawn")) as pool:
+        return np.vstack(list(pool.map(_score_chunk, chunks)))[index]
+
+
+def summarize(scores: np.ndarray) -> Dict[str, float]:
+    """Средние значения метрик по пачке"""
+    if len(scores) == 0:
+        return {metric: 0.0 for metric in METRICS}
+    return dict(zip(METRICS, scores.mean(axis=0).tolist()))
@@ -0,0 +1,244 @@
+"""
+Перебор параметров генерации с ранней остановкой (successive halving)
+
+Пространство задается сеткой или случайными диапазонами для параметров,
+которые принимает run_task (temperature, top_p, max_tokens, ...). Все
+конфигурации ("руки") получают немного запросов, худшая часть по среднему
+скору отбрасывается, выжившие получают в eta раз больше запросов — и так
+до одной руки или до исчерпания бюджета токенов/стоимости.
+"""
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .budget import BatchBudget
+from .providers.base import Provider, ProviderResult
+from .runner import RunJob, generate_safely, is_deferred
+from .scheduler import BATCH
+
+
+# score_fn(индекс промпта, результат) -> скор (больше — лучше) или None, если оценить нельзя
+ScoreFn = Callable[[int, ProviderResult], Optional[float]]
+# cost_fn(модель, usage) -> стоимость в USD или None, если цена неизвестна
+CostFn = Callable[[str, Dict[str, int]], Optional[float]]
+
+
+@dataclass
+class ParamRange:
+    """Диапазон одного параметра: явный список значений или [low, high]"""
+    name: str
+    values: Optional[Sequence[Any]] = None
+    low: Optional[float] = None
+    high: Optional[float] = None
+    steps: int = 3            # точек на отрезке при переборе сеткой
+    integer: bool = False
+
+    def grid_values(self) -> List[Any]:
+        if self.values is not None:
+            return list(self.values)
+        if self.steps <= 1 or self.low == self.high:
+            return [self._cast(self.low)]
+        step = (self.high - self.low) / (self.steps - 1)
+        return list(dict.fromkeys(self._cast(self.low + i * step) for i in range(self.steps)))
+
+    def sample(self, rng: random.Random) -> Any:
+        if self.values is not None:
+            return rng.choice(list(self.values))
+        return self._cast(rng.uniform(self.low, self.high))
+
+    def _cast(self, value: float) -> Any:
+        return int(round(value)) if self.integer else round(value, 3)
+
+
+@dataclass
+class SweepSpace:
+    """Пространство параметров поверх базовых параметров запроса"""
+    ranges: List[ParamRange]
+    base_params: Dict[str, Any] = field(default_factory=dict)
+
+    def grid(self) -> List[Dict[str, Any]]:
+        """Все комбинации сетки"""
+        names = [r.name for r in self.ranges]
+        return [
+            {**self.base_params, **dict(zip(names, combination))}
+            for combination in itertools.product(*(r.grid_values() for r in self.ranges))
+        ]
+
+    def sample(self, count: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """count случайных конфигураций"""
+        rng = random.Random(seed)
+        return [{**self.base_params, **{r.name: r.sample(rng) for r in self.ranges}} for _ in range(count)]
+
+
+@dataclass
+class Arm:
+    """Одна конфигурация параметров и ее результаты"""
+    params: Dict[str, Any]
+    scores: List[float] = field(default_factory=list)
+    calls: int = 0
+    tokens: int = 0
+    cost_usd: float = 0.0
+    errors: int = 0
+    stopped_round: Optional[int] = None   # None — дожила до конца
+
+    @property
+    def mean_score(self) -> float:
+        return sum(self.scores) / len(self.scores) if self.scores else float("-inf")
+
+
+@dataclass
+class SweepResult:
+    """Итог перебора для одной модели"""
+    model: str
+    arms: List[Arm]
+    rounds: int
+    tokens_used: int
+    cost_usd: float
+    budget_exhausted: bool
+
+    @property
+    def best(self) -> Optional[Arm]:
+        scored = [arm for arm in self.arms if arm.scores]
+        return max(scored, key=lambda arm: (arm.stopped_round is None, arm.mean_score)) if scored else None
+
+
+def keyword_score(keywords: Sequence[str]) -> ScoreFn:
+    """Скор — доля ключевых слов, встречающихся в ответе (без учета регистра)"""
+    needles = [k.lower() for k in keywords if k.strip()]
+
+    def score(prompt_index: int, result: ProviderResult) -> Optional[float]:
+        if not needles:
+            return None
+        text = (result.text or "").lower()
+        return sum(1 for k in needles if k in text) / len(needles)
+
+    return score
+
+
+def successive_halving(
+    provider: Provider,
+    model: str,
+    prompts: Sequence[List[Dict[str, str]]],
+    configs: List[Dict[str, Any]],
+    score_fn: ScoreFn,
+    eta: int = 2,
+    initial_samples: int = 1,
+    max_tokens_budget: Optional[int] = None,
+    max_cost_usd: Optional[float] = None,
+    cost_fn: Optional[CostFn] = None,
+    max_workers: int = 8,
+    budget: Optional[BatchBudget] = None,
+    flow: str = "sweep",
+    on_result: Optional[Callable[[Arm, List[Dict[str, str]], ProviderResult], None]] = None,
+    on_round: Optional[Callable[[int, List[Arm]], None]] = None
+) -> SweepResult:
+    """
+    Перебирает конфигурации configs на модели model.
+
+    prompts — набор сообщений для оценки, руки проходят его по кругу.
+    Ошибка запроса дает скор 0. Запрос, не поместившийся в budget (или
+    дневной бюджет), не отправляется и останавливает перебор; запросы к
+    модели с разомкнутой цепью пропускаются. on_result вызывается для каждого ответа
+    (например, чтобы сохранить запуск), on_round — после каждого раунда.
+
+    Без budget лимиты max_tokens_budget и max_cost_usd становятся бюджетом
+    батча: каждый запрос резервирует свою оценку до отправки, поэтому уже
+    первый раунд не выходит за лимит.
+    """
+    if budget is None and (max_tokens_budget is not None or max_cost_usd is not None):
+        budget = BatchBudget(max_tokens=max_tokens_budget, max_cost_usd=max_cost_usd)
+    arms = [Arm(params=dict(params)) for params in configs]
+    alive = list(arms)
+    tokens_used, cost_used = 0, 0.0
+    budget_exhausted = False
+    round_index = 0
+    samples_target = initial_samples
+
+    def remaining_calls() -> Optional[int]:
+        """Сколько еще запросов помещается в бюджет по средней цене запроса"""
+        calls = sum(arm.calls for arm in arms)
+        if calls == 0:
+            return None
+        limits = []
+        if max_tokens_budget is not None:
+            limits.append(int((max_tokens_budget - tokens_used) / max(tokens_used / calls, 1)))
+        if max_cost_usd is not None and cost_used > 0:
+            limits.append(int((max_cost_usd - cost_used) / (cost_used / calls)))
+        return min(limits) if limits else None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-runner-sweep") as executor:
+        while alive:
+            # Добираем каждой живой руке запросы до samples_target
+            plan: List[Tuple[Arm, int]] = [
+                (arm, arm.calls + i) for arm in alive for i in range(max(samples_target - arm.calls, 0))
+            ]
+            allowed = remaining_calls()
+            if allowed is not None and allowed < len(plan):
+                plan = plan[:max(allowed, 0)]
+                budget_exhausted = True
+
+            futures = []
+            for arm, sample_number in plan:
+                prompt_index = sample_number % len(prompts)
+                job = RunJob(model=model, params=arm.params, priority=BATCH, flow=flow)
+                futures.append((arm, prompt_index, executor.submit(generate_safely, provider, prompts[prompt_index], job, budget)))
+
+            for arm, prompt_index, future in futures:
+                result = future.result()
+                if is_deferred(result):
+                    # Запрос не отправлялся: бюджет исчерпан или модель временно отключена
+                    budget_exhausted = budget_exhausted or result.error_kind == "budget"
+                    continue
+                arm.calls += 1
+                tokens = result.usage.get("total_tokens", 0) or 0
+                arm.tokens += tokens
+                tokens_used += tokens
+                cost = cost_fn(model, result.usage) if cost_fn else None
+                if cost:
+                    arm.cost_usd += cost
+                    cost_used += cost
+                if result.error:
+                    arm.errors += 1
+                    arm.scores.append(0.0)
+                else:
+                    score = score_fn(prompt_index, result)
+                    if score is not None:
+                        arm.scores.append(score)
+                if on_result:
+                    on_result(arm, prompts[prompt_index], result)
+
+            if on_round:
+                on_round(round_index, alive)
+
+            if budget_exhausted or len(alive) <= 1:
+                break
+            if (max_tokens_budget is not None and tokens_used >= max_tokens_budget) or \
+                    (max_cost_usd is not None and cost_used >= max_cost_usd):
+                budget_exhausted = True
+                break
+
+            # Оставляем лучшую 1/eta часть рук
+            keep = max(1, len(alive) // eta)
+            ranked = sorted(alive, key=lambda arm: arm.mean_score, reverse=True)
+            for arm in ranked[keep:]:
+                arm.stopped_round = round_index
+            alive = ranked[:keep]
+            round_index += 1
+            samples_target *= eta
+
+    logger.info(
+        f"Sweep {model}: {len(arms)} конфигураций, {round_index + 1} раундов, "
+        f"{tokens_used} токенов{' (бюджет исчерпан)' if budget_exhausted else ''}"
+    )
+    return SweepResult(
+        model=model,
+        arms=arms,
+        rounds=round_index + 1,
+        tokens_used=tokens_used,
+        cost_usd=cost_used,
+        budget_exhausted=budget_exhausted
+    )
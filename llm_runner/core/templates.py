@@ -0,0 +1,175 @@
+"""
+Шаблоны промптов: компиляция, подстановка переменных и сетки переменных
+
+Шаблон разбирается один раз (кэш по тексту шаблона) в список литералов
+и полей; рендер — это только склейка строк. Синтаксис как у str.format:
+{var}, {var:>10}, {var!r}, экранирование {{ и }}. Отсутствующие
+переменные по умолчанию остаются в тексте как есть.
+
+Задачи часто содержат код и JSON, поэтому шаблон, который str.format не
+разбирает (одиночная { или }) или в котором есть поле не с именем
+переменной ({"answer": ...}, {x!z}), не ошибка: текст остается как есть, и
+подставляются только поля вида {имя}. Шаблон без полей — обычный
+текст, {{ и }} в нем не схлопываются.
+"""
+import itertools
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from . import codec
+
+
+_formatter = Formatter()
+
+# Поле {имя} в шаблоне не в синтаксисе str.format (без спецификаций:
+# в коде {a: 1} — это объект, а не поле)
+_LOOSE_FIELD = re.compile(r"\{(\w+)\}")
+
+_CONVERSIONS = (None, "r", "s", "a")
+
+
+@dataclass(frozen=True)
+class _Field:
+    name: str
+    spec: str
+    conversion: Optional[str]
+    source: str  # исходный текст плэйсхолдера, если переменной нет
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Разобранный шаблон: чередование литералов и полей"""
+    literals: Tuple[str, ...]
+    fields: Tuple[Optional[_Field], ...]
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        """Имена переменных в порядке первого появления"""
+        return tuple(dict.fromkeys(f.name for f in self.fields if f is not None))
+
+    def render(self, variables: Mapping[str, Any], strict: bool = False) -> str:
+        """Подставляет переменные; strict=True — KeyError для отсутствующих"""
+        out = []
+        for literal, field in zip(self.literals, self.fields):
+            out.append(literal)
+            if field is None:
+                continue
+            if field.name not in variables:
+                if strict:
+                    raise KeyError(field.name)
+                out.append(field.source)
+                continue
+            value = variables[field.name]
+            if field.conversion == "r":
+                value = repr(value)
+            elif field.conversion == "a":
+                value = ascii(value)
+            elif field.conversion == "s":
+                value = str(value)
+            try:
+                out.append(format(value, field.spec) if field.spec else str(value))
+            except (TypeError, ValueError):
+                # Спецификация не подходит значению ({x: 1} в коде) — поле остается текстом
+                out.append(field.source)
+        return "".join(out)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template: str) -> CompiledTemplate:
+    """Разбирает шаблон (результат кэшируется по тексту шаблона)"""
+    try:
+        parsed = list(_formatter.parse(template))
+    except ValueError:
+        return _compile_loose(template)
+    if all(name is None for _, name, _, _ in parsed):
+        return CompiledTemplate(literals=(template,), fields=(None,))
+    if any(
+        name is not None and (not name.isidentifier() or conversion not in _CONVERSIONS)
+        for _, name, _, conversion in parsed
+    ):
+        # JSON ({"answer": "{x}"}), a.b, a[0] или неизвестное преобразование — не поле шаблона
+        return _compile_loose(template)
+    literals: List[str] = []
+    fields: List[Optional[_Field]] = []
+    for literal, name, spec, conversion in parsed:
+        literals.append(literal)
+        if name is None:
+            fields.append(None)
+            continue
+        source = "{" + name + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"
+        fields.append(_Field(name=name, spec=spec or "", conversion=conversion, source=source))
+    return CompiledTemplate(literals=tuple(literals), fields=tuple(fields))
+
+
+def _compile_loose(template: str) -> CompiledTemplate:
+    """Шаблон не в синтаксисе str.format: текст как есть, поля — только {имя}"""
+    literals: List[str] = []
+    fields: List[Optional[_Field]] = []
+    position = 0
+    for match in _LOOSE_FIELD.finditer(template):
+        literals.append(template[position:match.start()])
+        fields.append(_Field(name=match.group(1), spec="", conversion=None, source=match.group(0)))
+        position = match.end()
+    literals.append(template[position:])
+    fields.append(None)
+    return CompiledTemplate(literals=tuple(literals), fields=tuple(fields))
+
+
+def render(template: str, variables: Mapping[str, Any], strict: bool = False) -> str:
+    """Рендерит шаблон с переменными"""
+    return compile_template(template).render(variables, strict=strict)
+
+
+@lru_cache(maxsize=4096)
+def _parse_vars(vars_json: str) -> Dict[str, Any]:
+    return codec.loads(vars_json)
+
+
+def task_variables(task) -> Dict[str, Any]:
+    """Переменные задачи из vars_json (разбор кэшируется по строке)"""
+    vars_json = getattr(task, "vars_json", None)
+    if not vars_json:
+        return {}
+    return dict(_parse_vars(vars_json))
+
+
+def build_prompt(task, variables: Optional[Mapping[str, Any]] = None) -> str:
+    """Финальный промпт задачи: шаблон и входной текст с подставленными переменными"""
+    merged = task_variables(task)
+    if variables:
+        merged.update(variables)
+    prompt = render(task.prompt_template, merged)
+    if task.input_text:
+        prompt += "\n\n" + render(task.input_text, merged)
+    return prompt
+
+
+def grid_size(tasks: Sequence, grid: Mapping[str, Sequence[Any]]) -> int:
+    """Количество промптов, которое даст expand_grid"""
+    size = len(tasks)
+    for values in grid.values():
+        size *= len(values)
+    return size
+
+
+def expand_grid(tasks: Iterable, grid: Mapping[str, Sequence[Any]]) -> Iterator[Tuple[Any, Dict[str, Any], str]]:
+    """
+    Лениво разворачивает задачи × сетку переменных в промпты.
+
+    Отдает (задача, переменные, промпт) по одному, ничего не накапливая:
+    значения сетки перекрывают vars_json задачи.
+    """
+    names = list(grid.keys())
+    for task in tasks:
+        base = task_variables(task)
+        template = compile_template(task.prompt_template)
+        input_template = compile_template(task.input_text) if task.input_text else None
+        for combination in itertools.product(*(grid[name] for name in names)):
+            variables = {**base, **dict(zip(names, combination))}
+            prompt = template.render(variables)
+            if input_template is not None:
+                prompt += "\n\n" + input_template.render(variables)
+            yield task, variables, prompt
@@ -0,0 +1,295 @@
+"""
+Локальный подсчет токенов и предварительная проверка запросов
+
+Токены считаются до отправки запроса: это позволяет отклонить или обрезать
+промпт, не влезающий в контекст модели, заранее оценить токены и стоимость
+батча и передать оценку ограничителю скорости. Токенизатор подключаемый:
+tiktoken, если установлен и его словари доступны, иначе быстрая эвристика,
+которая работает офлайн. Выбор — переменная LLM_RUNNER_TOKENIZER
+(auto | heuristic | tiktoken).
+"""
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Sequence, Set, Tuple
+
+from loguru import logger
+
+
+# Служебные токены чата: на каждое сообщение и на начало ответа (как у OpenAI)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Длина ответа, если max_tokens не задан
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# Размер контекста по префиксу имени модели (самый длинный префикс побеждает)
+CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "o1": 200000,
+    "o3": 200000,
+    "claude": 200000,
+    "gemini": 1048576,
+    "comet-7b": 4096,
+    "comet-13b": 4096,
+    "comet-70b": 8192,
+}
+# Модели без известного контекста (предупреждение пишется один раз)
+_unknown_windows: Set[str] = set()
+
+
+class Tokenizer(Protocol):
+    """Интерфейс токенизатора"""
+    name: str
+
+    def count(self, text: str) -> int:
+        ...
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ...
+
+
+class HeuristicTokenizer:
+    """
+    Оценка без словаря: ~4 символа ASCII на токен, ~2.5 символа для
+    остального текста (кириллица, CJK). Обычно ошибается не больше чем на 15%
+    и в большую сторону для русского текста.
+    """
+    name = "heuristic"
+
+    def __init__(self, ascii_chars_per_token: float = 4.0, other_chars_per_token: float = 2.5):
+        self.ascii_chars_per_token = ascii_chars_per_token
+        self.other_chars_per_token = other_chars_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        chars = len(text)
+        if text.isascii():
+            return int(chars / self.ascii_chars_per_token) + 1
+        # Каждый не-ASCII символ дает в UTF-8 хотя бы один лишний байт
+        other = min(len(text.encode("utf-8", "surrogatepass")) - chars, chars)
+        return int((chars - other) / self.ascii_chars_per_token + other / self.other_chars_per_token) + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        # Бинарный поиск длины префикса, укладывающегося в max_tokens
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+
+class TiktokenTokenizer:
+    """Точный подсчет через tiktoken (опциональная зависимость)"""
+
+    def __init__(self, encoding):
+        self._encoding = encoding
+        self.name = f"tiktoken:{encoding.name}"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens])
+
+
+def _load_tiktoken(model: str) -> Optional[TiktokenTokenizer]:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base" if model.startswith(("gpt-4o", "gpt-4.1", "o1", "o3")) else "cl100k_base")
+        return TiktokenTokenizer(encoding)
+    except Exception as e:
+        # Словари tiktoken скачиваются при первом использовании — офлайн их может не быть
+        logger.warning(f"tiktoken недоступен для {model}, используется эвристика: {e}")
+        return None
+
+
+@lru_cache(maxsize=256)
+def get_tokenizer(model: str) -> Tokenizer:
+    """Токенизатор для модели (по LLM_RUNNER_TOKENIZER, по умолчанию auto)"""
+    mode = os.getenv("LLM_RUNNER_TOKENIZER", "auto").lower()
+    if mode in ("auto", "tiktoken"):
+        tokenizer = _load_tiktoken(model)
+        if tokenizer is not None:
+            return tokenizer
+        if mode == "tiktoken":
+            logger.warning("LLM_RUNNER_TOKENIZER=tiktoken, но tiktoken не установлен")
+    return HeuristicTokenizer()
+
+
+def context_window(model: str) -> Optional[int]:
+    """
+    Размер контекста модели в токенах или None, если модель неизвестна
+    (тогда переполнение не проверяется: контекст решает сам API)
+    """
+    best = None
+    for prefix in CONTEXT_WINDOWS:
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best is None:
+        if model not in _unknown_windows:
+            _unknown_windows.add(model)
+            logger.warning(f"Размер контекста {model} неизвестен, запросы к ней не проверяются на переполнение")
+        return None
+    return CONTEXT_WINDOWS[best]
+
+
+def count_message_tokens(messages: Sequence[Dict[str, str]], model: str) -> int:
+    """Токены промпта для списка сообщений чата"""
+    tokenizer = get_tokenizer(model)
+    tokens = TOKENS_PER_REPLY
+    for message in messages:
+        tokens += TOKENS_PER_MESSAGE + tokenizer.count(message.get("content") or "")
+    return tokens
+
+
+def reply_budget(params: Dict[str, Any]) -> int:
+    """Максимум токенов одного ответа"""
+    return int(params.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def completion_budget(params: Dict[str, Any]) -> int:
+    """Максимум токенов ответа с учетом n сэмплов"""
+    return reply_budget(params) * int(params.get("n") or 1)
+
+
+@dataclass
+class RequestEstimate:
+    """Оценка одного запроса до отправки"""
+    model: str
+    prompt_tokens: int
+    completion_tokens: int    # верхняя граница: max_tokens × n
+    reply_tokens: int         # max_tokens одного сэмпла
+    context_window: Optional[int]   # None — контекст модели неизвестен
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def overflow(self) -> int:
+        """На сколько токенов промпт с max_tokens превышает контекст (каждый сэмпл — в своем контексте)"""
+        if self.context_window is None:
+            return 0
+        return max(0, self.prompt_tokens + self.reply_tokens - self.context_window)
+
+
+def estimate_request(messages: Sequence[Dict[str, str]], model: str, params: Optional[Dict[str, Any]] = None) -> RequestEstimate:
+    """Оценивает токены запроса"""
+    params = params or {}
+    return RequestEstimate(
+        model=model,
+        prompt_tokens=count_message_tokens(messages, model),
+        completion_tokens=completion_budget(params),
+        reply_tokens=reply_budget(params),
+        context_window=context_window(model)
+    )
+
+
+class ContextOverflowError(ValueError):
+    """Промпт не помещается в контекст модели"""
+
+
+def preflight(
+    messages: List[Dict[str, str]],
+    model: str,
+    params: Optional[Dict[str, Any]] = None,
+    on_overflow: Optional[str] = None
+) -> Tuple[List[Dict[str, str]], RequestEstimate]:
+    """
+    Проверяет запрос до отправки.
+
+    Если промпт с max_tokens не помещается в контекст: on_overflow="reject"
+    поднимает ContextOverflowError, "truncate" обрезает конец последнего
+    сообщения пользователя. По умолчанию — LLM_RUNNER_ON_OVERFLOW или reject.
+    Для моделей с неизвестным контекстом проверки нет.
+    """
+    params = params or {}
+    on_overflow = on_overflow or os.getenv("LLM_RUNNER_ON_OVERFLOW", "reject")
+    estimate = estimate_request(messages, model, params)
+    overflow = estimate.overflow
+    if overflow == 0:
+        return messages, estimate
+
+    if on_overflow != "truncate":
+        raise ContextOverflowError(
+            f"Промпт ({estimate.prompt_tokens} токенов) и max_tokens ({estimate.reply_tokens}) "
+            f"не помещаются в контекст {model} ({estimate.context_window} токенов)"
+        )
+
+    user_positions = [i for i, m in enumerate(messages) if m.get("role") == "user"]
+    if not user_positions:
+        raise ContextOverflowError(f"Промпт не помещается в контекст {model}, и обрезать нечего")
+    position = user_positions[-1]
+    tokenizer = get_tokenizer(model)
+    content = messages[position].get("content") or ""
+    keep = tokenizer.count(content) - overflow
+    if keep <= 0:
+        raise ContextOverflowError(f"Промпт не помещается в контекст {model} даже после обрезки")
+
+    truncated = list(messages)
+    truncated[position] = {**messages[position], "content": tokenizer.truncate(content, keep)}
+    logger.warning(f"Промпт для {model} обрезан на ~{overflow} токенов до размера контекста")
+    return truncated, estimate_request(truncated, model, params)
+
+
+@dataclass
+class BatchEstimate:
+    """Прогноз токенов и стоимости батча"""
+    model: str
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    over_context: List[int] = field(default_factory=list)  # индексы промптов, не влезающих в контекст
+    cost_usd: Optional[float] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def estimate_batch(prompts: Iterable[str], model: str, params: Optional[Dict[str, Any]] = None) -> BatchEstimate:
+    """
+    Оценивает батч промптов (по одному сообщению пользователя на промпт).
+
+    Только подсчет длины строк, без сети — 100k промптов за секунды.
+    """
+    from .cost import estimate_cost
+
+    params = params or {}
+    count = get_tokenizer(model).count
+    window = context_window(model)
+    reply_tokens = reply_budget(params)
+    overhead = TOKENS_PER_MESSAGE + TOKENS_PER_REPLY
+    batch = BatchEstimate(model=model)
+    for index, prompt in enumerate(prompts):
+        tokens = count(prompt) + overhead
+        batch.requests += 1
+        batch.prompt_tokens += tokens
+        if window is not None and tokens + reply_tokens > window:
+            batch.over_context.append(index)
+    batch.completion_tokens = batch.requests * completion_budget(params)
+    batch.cost_usd = estimate_cost(model, batch.prompt_tokens, batch.completion_tokens)
+    return batch
@@ -0,0 +1,329 @@
+"""
+Асинхронный доступ к базе для asyncio (SQLAlchemy asyncio поверх aiosqlite)
+
+AsyncTaskRepository, AsyncRunRepository и AsyncEvaluationRepository — те же
+методы, что у репозиториев db.repo, но корутины: метод синхронного
+репозитория выполняется через AsyncSession.run_sync, поэтому запросы, кэш,
+метрики и индекс дублей общие, а ввод-вывод SQLite идет в потоке aiosqlite
+и не блокирует цикл событий.
+
+AsyncDatabaseWriter — асинхронный DatabaseWriter: корутины батча ставят
+запуски в очередь и сразу отправляют следующий запрос, а фоновая задача
+коммитит пачкой всё, что накопилось за время предыдущего коммита.
+
+AsyncDatabaseManager.in_memory() — отдельная база в памяти для быстрых тестов.
+Нужен aiosqlite (pip install aiosqlite).
+"""
+import asyncio
+import functools
+import os
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+from .models import Run, _set_sqlite_pragmas, create_schema
+from .repo import EvaluationRepository, RunRepository, TaskRepository, build_evaluation, build_run
+from ..core.metrics import get_metrics
+
+try:
+    import aiosqlite  # noqa: F401 - драйвер sqlite+aiosqlite
+    import greenlet  # noqa: F401 - нужен SQLAlchemy asyncio
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:  # pragma: no cover - асинхронный путь необязателен
+    create_async_engine = None
+
+# База в памяти вместо файла: LLM_RUNNER_DB=:memory: или AsyncDatabaseManager.in_memory()
+MEMORY = ":memory:"
+_MEMORY_URL = "sqlite+aiosqlite://"
+
+# Маркер остановки задачи-писателя
+_STOP = object()
+
+
+def async_available() -> bool:
+    """Установлены ли aiosqlite и greenlet"""
+    return create_async_engine is not None
+
+
+def get_async_database_url(db_path: Optional[str] = None) -> str:
+    """URL базы для aiosqlite (по умолчанию — та же LLM_RUNNER_DB, что у синхронного пути)"""
+    db_path = db_path or os.getenv("LLM_RUNNER_DB", "./llm_runner.db")
+    if db_path == MEMORY:
+        return _MEMORY_URL
+    return f"sqlite+aiosqlite:///{db_path}"
+
+
+def create_async_engine_and_session(database_url: Optional[str] = None):
+    """Асинхронный движок и фабрика сессий (движок привязан к циклу событий, не кэшируется)"""
+    if create_async_engine is None:
+        raise ImportError("Для асинхронного доступа к базе нужен aiosqlite: pip install aiosqlite")
+    database_url = database_url or get_async_database_url()
+    if database_url == _MEMORY_URL:
+        # Одно соединение на всё время жизни: у каждого нового была бы своя пустая база
+        engine = create_async_engine(database_url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        engine = create_async_engine(database_url, connect_args={"timeout": 30})
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    # Без expire_on_commit: ленивая догрузка атрибутов после коммита в asyncio невозможна
+    return engine, async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+
+def _delegate(method: Callable) -> Callable:
+    """Корутина, выполняющая метод синхронного репозитория через run_sync"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        return await self.session.run_sync(lambda session: method(self.sync_repository(session), *args, **kwargs))
+    return wrapper
+
+
+class AsyncTaskRepository:
+    """Асинхронный TaskRepository"""
+
+    sync_repository = TaskRepository
+
+    def __init__(self, session: "AsyncSession"):
+        self.session = session
+
+    create_task = _delegate(TaskRepository.create_task)
+    update_reference = _delegate(TaskRepository.update_reference)
+    get_all_tasks = _delegate(TaskRepository.get_all_tasks)
+    get_task_by_id = _delegate(TaskRepository.get_task_by_id)
+    search_tasks = _delegate(TaskRepository.search_tasks)
+    delete_task = _delegate(TaskRepository.delete_task)
+
+
+class AsyncRunRepository:
+    """Асинхронный RunRepository"""
+
+    sync_repository = RunRepository
+
+    def __init__(self, session: "AsyncSession"):
+        self.session = session
+
+    create_run = _delegate(RunRepository.create_run)
+    get_runs_by_task = _delegate(RunRepository.get_runs_by_task)
+    get_all_runs = _delegate(RunRepository.get_all_runs)
+    search_runs = _delegate(RunRepository.search_runs)
+    count_search_runs = _delegate(RunRepository.count_search_runs)
+    get_cluster_runs = _delegate(RunRepository.get_cluster_runs)
+    get_duplicate_clusters = _delegate(RunRepository.get_duplicate_clusters)
+    find_similar_runs = _delegate(RunRepository.find_similar_runs)
+    get_run_by_id = _delegate(RunRepository.get_run_by_id)
+
+
+class AsyncEvaluationRepository:
+    """Асинхронный EvaluationRepository"""
+
+    sync_repository = EvaluationRepository
+
+    def __init__(self, session: "AsyncSession"):
+        self.session = session
+
+    create_evaluation = _delegate(EvaluationRepository.create_evaluation)
+    evaluate_cluster = _delegate(EvaluationRepository.evaluate_cluster)
+    update_evaluation = _delegate(EvaluationRepository.update_evaluation)
+    get_unevaluated_runs = _delegate(EvaluationRepository.get_unevaluated_runs)
+    count_unevaluated_by_cluster = _delegate(EvaluationRepository.count_unevaluated_by_cluster)
+    get_stats = _delegate(EvaluationRepository.get_stats)
+    get_evaluated_runs = _delegate(EvaluationRepository.get_evaluated_runs)
+    get_evaluation_by_run_id = _delegate(EvaluationRepository.get_evaluation_by_run_id)
+
+
+def _resolve(future: "asyncio.Future", result: Any = None, error: Optional[BaseException] = None) -> None:
+    # Ожидающий мог отменить Future — результат тогда просто не нужен
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class AsyncDatabaseWriter:
+    """
+    Фоновая задача asyncio, которая пишет в базу групповыми коммитами.
+
+    Пока идет коммит (в потоке aiosqlite), корутины продолжают работу и
+    кладут новые объекты в очередь; следующий коммит забирает их все
+    (до max_batch). Ждать отдельного интервала сбора пачки не нужно.
+    """
+
+    def __init__(self, session_factory: "async_sessionmaker", max_batch: int = 256, max_queue: int = 10000):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "AsyncDatabaseWriter":
+        """Запускает задачу-писатель в текущем цикле событий (повторный вызов ничего не делает)"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._loop(), name="llm-runner-async-db-writer")
+        return self
+
+    async def submit(self, obj: Any) -> "asyncio.Future":
+        """
+        Ставит ORM объект в очередь (ждет, только если очередь полна) и
+        возвращает Future с сохраненным объектом.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((obj, future, time.perf_counter()))
+        return future
+
+    async def submit_run(self, **kwargs) -> "asyncio.Future":
+        """Ставит в очередь новый запуск (аргументы как у RunRepository.create_run)"""
+        return await self.submit(build_run(**kwargs))
+
+    async def submit_evaluation(self, run_id: str, rating: int, comment: str = None) -> "asyncio.Future":
+        """Ставит в очередь новую оценку"""
+        return await self.submit(build_evaluation(run_id, rating, comment))
+
+    async def flush(self) -> None:
+        """Ждет, пока будет закоммичено всё, что было поставлено в очередь до вызова"""
+        await (await self.submit(None))
+
+    async def close(self) -> None:
+        """Дописывает очередь и останавливает задачу"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            await self._queue.put(_STOP)
+            await task
+
+    @property
+    def pending(self) -> int:
+        """Количество объектов, ожидающих записи"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _loop(self) -> None:
+        """Основной цикл: забирает всё накопившееся и коммитит одной пачкой"""
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._commit_batch(batch)
+            if stop:
+                return
+
+    async def _commit_batch(self, batch: List[Tuple[Any, "asyncio.Future", float]]) -> None:
+        """Сохраняет пачку одним коммитом, при ошибке — по одному объекту"""
+        objects = [(obj, future) for obj, future, _ in batch if obj is not None]
+
+        metrics = get_metrics()
+        if metrics.enabled:
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                metrics.observe("db_writer_queue_wait_seconds", started - enqueued_at)
+            metrics.observe("db_writer_batch_size", len(objects))
+
+        if objects:
+            async with self.session_factory() as session:
+                # Кластер dedup из откаченной пачки назначается заново (как в DatabaseWriter)
+                clusters = [obj.cluster_id if isinstance(obj, Run) else None for obj, _ in objects]
+                try:
+                    commit_started = time.perf_counter()
+                    session.add_all([obj for obj, _ in objects])
+                    await session.commit()
+                    metrics.observe("db_write_seconds", time.perf_counter() - commit_started, path="async_writer")
+                    session.expunge_all()
+                    for obj, future in objects:
+                        _resolve(future, obj)
+                except Exception as e:
+                    await session.rollback()
+                    for (obj, _), cluster_id in zip(objects, clusters):
+                        if isinstance(obj, Run):
+                            obj.cluster_id = cluster_id
+                    logger.warning(f"Ошибка группового коммита ({len(objects)} объектов): {e}, сохраняем по одному")
+                    await self._commit_one_by_one(session, objects)
+
+        # Маркеры flush() завершаются после записи всего, что стояло перед ними
+        for obj, future, _ in batch:
+            if obj is None:
+                _resolve(future)
+
+    async def _commit_one_by_one(self, session: "AsyncSession", objects: List[Tuple[Any, "asyncio.Future"]]) -> None:
+        """Сохраняет объекты по одному, чтобы одна плохая запись не роняла всю пачку"""
+        for obj, future in objects:
+            try:
+                session.add(obj)
+                await session.commit()
+                session.expunge(obj)
+                _resolve(future, obj)
+            except Exception as e:
+                await session.rollback()
+                _resolve(future, error=e)
+
+
+class AsyncDatabaseManager:
+    """Менеджер асинхронной работы с базой данных"""
+
+    def __init__(self, database_url: Optional[str] = None):
+        self.engine, self.SessionLocal = create_async_engine_and_session(database_url)
+        self._initialized = False
+        self._writer: Optional[AsyncDatabaseWriter] = None
+
+    @classmethod
+    def in_memory(cls) -> "AsyncDatabaseManager":
+        """Новая пустая база в памяти (для тестов)"""
+        return cls(get_async_database_url(MEMORY))
+
+    async def init_database(self) -> None:
+        """Создает схему, как models.init_database (один раз на менеджер)"""
+        if not self._initialized:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(create_schema)
+            self._initialized = True
+
+    def get_session(self) -> "AsyncSession":
+        """Получает новую сессию"""
+        return self.SessionLocal()
+
+    def get_task_repo(self, session: "AsyncSession" = None) -> AsyncTaskRepository:
+        """Получает репозиторий задач"""
+        if session is None:
+            session = self.get_session()
+        return AsyncTaskRepository(session)
+
+    def get_run_repo(self, session: "AsyncSession" = None) -> AsyncRunRepository:
+        """Получает репозиторий запусков"""
+        if session is None:
+            session = self.get_session()
+        return AsyncRunRepository(session)
+
+    def get_evaluation_repo(self, session: "AsyncSession" = None) -> AsyncEvaluationRepository:
+        """Получает репозиторий оценок"""
+        if session is None:
+            session = self.get_session()
+        return AsyncEvaluationRepository(session)
+
+    def get_writer(self) -> AsyncDatabaseWriter:
+        """Получает писатель менеджера для конкурентной записи из корутин"""
+        if self._writer is None:
+            self._writer = AsyncDatabaseWriter(self.SessionLocal)
+        return self._writer
+
+    async def close(self) -> None:
+        """Дописывает очередь писателя и закрывает соединения"""
+        if self._writer is not None:
+            await self._writer.close()
+        await self.engine.dispose()
+
+    async def __aenter__(self) -> "AsyncDatabaseManager":
+        await self.init_database()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
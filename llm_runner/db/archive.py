@@ -0,0 +1,313 @@
+"""
+Архив старых запусков в Parquet
+
+Запуски старше LLM_RUNNER_ARCHIVE_DAYS дней (по started_at) вместе с оценками
+и автоматическими метриками переносятся из SQLite в файлы Parquet (zstd),
+разбитые по месяцам: <LLM_RUNNER_ARCHIVE_DIR>/year=YYYY/month=MM/part-<id>.parquet.
+Файл пишется до удаления строк из базы и называется по первому запуску
+пачки в месяце, поэтому повтор после сбоя перезаписывает тот же файл, а не
+дублирует строки. Задачи, сравнения A/B и кластеры дублей остаются в базе.
+
+Репозитории читают архив по запросу (include_archived=True), export_runs()
+выгружает горячие и архивные запуски в один Parquet для анализа. Нужен
+pyarrow (pip install pyarrow); без него архив не пишется и не читается.
+"""
+import argparse
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import DateTime, Float, Integer, delete, select, text
+from sqlalchemy.orm import Session, configure_mappers
+
+from .models import Evaluation, Run, RunScore
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow необязателен
+    pa = None
+
+# Ограничение числа параметров SQL запроса
+_IN_CHUNK = 500
+
+# Колонки архива: запуск, его оценка и метрики (одна строка на запуск)
+_COLUMNS = [column.label(column.name) for column in Run.__table__.columns] + [
+    Evaluation.id.label("evaluation_id"),
+    Evaluation.rating.label("rating"),
+    Evaluation.comment.label("evaluation_comment"),
+    Evaluation.created_at.label("evaluated_at"),
+    RunScore.exact_match.label("exact_match"),
+    RunScore.token_f1.label("token_f1"),
+    RunScore.rouge_l.label("rouge_l"),
+    RunScore.bleu.label("bleu"),
+]
+RUN_COLUMNS = [column.name for column in Run.__table__.columns]
+SCORE_COLUMNS = ("exact_match", "token_f1", "rouge_l", "bleu")
+
+
+def archive_days() -> int:
+    return int(os.getenv("LLM_RUNNER_ARCHIVE_DAYS", "90"))
+
+
+def archive_dir() -> str:
+    return os.getenv("LLM_RUNNER_ARCHIVE_DIR", "./llm_runner_archive")
+
+
+def archive_available() -> bool:
+    """Установлен ли pyarrow"""
+    return pa is not None
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Для архива запусков нужен pyarrow: pip install pyarrow")
+
+
+def _arrow_type(column):
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    return pa.string()
+
+
+def archive_schema():
+    """Схема файлов архива (без колонок разбиения year/month)"""
+    _require_pyarrow()
+    return pa.schema([(column.name, _arrow_type(column)) for column in _COLUMNS])
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("year", pa.int32()), ("month", pa.int32())]), flavor="hive")
+
+
+def _rows_query():
+    """Запуски с оценками и метриками одной выборкой"""
+    return select(*_COLUMNS).select_from(Run).outerjoin(
+        Evaluation, Evaluation.run_id == Run.id
+    ).outerjoin(RunScore, RunScore.run_id == Run.id)
+
+
+def _to_table(rows) -> "pa.Table":
+    schema = archive_schema()
+    return pa.Table.from_pylist([dict(row._mapping) for row in rows], schema=schema)
+
+
+def _write_partition(root: str, year: int, month: int, table: "pa.Table") -> str:
+    """Пишет пачку одного месяца; файл появляется целиком (через переименование)"""
+    directory = os.path.join(root, f"year={year}", f"month={month:02d}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{table['id'][0].as_py()}.parquet")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _chunks(items: List, size: int = _IN_CHUNK) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def archive_runs(
+    session: Session,
+    before: Optional[datetime] = None,
+    batch_size: int = 20000,
+    root: Optional[str] = None
+) -> int:
+    """
+    Переносит запуски, начатые раньше before (по умолчанию — старше
+    archive_days() дней), в архив пачками по batch_size. Возвращает их число.
+    """
+    _require_pyarrow()
+    before = before or datetime.utcnow() - timedelta(days=archive_days())
+    root = root or archive_dir()
+    archived = 0
+    while True:
+        rows = session.execute(
+            _rows_query().where(Run.started_at < before).order_by(Run.started_at, Run.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        table = _to_table(rows)
+        started = table["started_at"]
+        keys = pc.add(pc.multiply(pc.year(started), 100), pc.month(started))
+        for key in pc.unique(keys).to_pylist():
+            _write_partition(root, key // 100, key % 100, table.filter(pc.equal(keys, key)))
+
+        # Строки удаляются только после того, как все файлы пачки записаны
+        run_ids = table["id"].to_pylist()
+        for chunk in _chunks(run_ids):
+            session.execute(delete(Evaluation).where(Evaluation.run_id.in_(chunk)), execution_options={"synchronize_session": False})
+            session.execute(delete(RunScore).where(RunScore.run_id.in_(chunk)), execution_options={"synchronize_session": False})
+            session.execute(delete(Run).where(Run.id.in_(chunk)), execution_options={"synchronize_session": False})
+        session.commit()
+        session.expunge_all()
+        archived += len(run_ids)
+        logger.info(f"Архив: перенесено {archived} запусков")
+    return archived
+
+
+def has_archive(root: Optional[str] = None) -> bool:
+    """Есть ли в архиве хотя бы один файл"""
+    root = root or archive_dir()
+    for _, _, files in os.walk(root):
+        if any(name.endswith(".parquet") for name in files):
+            return True
+    return False
+
+
+def read_archive(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    task_id: Optional[str] = None,
+    run_ids: Optional[List[str]] = None,
+    evaluated: bool = False,
+    root: Optional[str] = None
+) -> "pa.Table":
+    """
+    Архивные запуски по фильтрам (started_at в [since, until)) таблицей
+    pyarrow. Месяцы вне диапазона дат не читаются.
+    """
+    _require_pyarrow()
+    root = root or archive_dir()
+    if not has_archive(root):
+        return archive_schema().empty_table()
+    partitioning = _partitioning()
+    schema = pa.unify_schemas([archive_schema(), partitioning.schema])
+    dataset = ds.dataset(root, format="parquet", schema=schema, partitioning=partitioning)
+
+    conditions = []
+    if since is not None:
+        conditions.append(ds.field("year") * 100 + ds.field("month") >= since.year * 100 + since.month)
+        conditions.append(ds.field("started_at") >= pa.scalar(since, pa.timestamp("us")))
+    if until is not None:
+        conditions.append(ds.field("year") * 100 + ds.field("month") <= until.year * 100 + until.month)
+        conditions.append(ds.field("started_at") < pa.scalar(until, pa.timestamp("us")))
+    if task_id is not None:
+        conditions.append(ds.field("task_id") == task_id)
+    if run_ids is not None:
+        conditions.append(ds.field("id").isin(list(run_ids)))
+    if evaluated:
+        conditions.append(ds.field("evaluation_id").is_valid())
+    condition = None
+    for item in conditions:
+        condition = item if condition is None else condition & item
+    return dataset.to_table(columns=archive_schema().names, filter=condition)
+
+
+def _instance(model, values: Dict):
+    """
+    Объект модели без истории изменений: значения кладутся в __dict__, как
+    при загрузке из базы (конструктор с событиями атрибутов в разы медленнее)
+    """
+    obj = model.__mapper__.class_manager.new_instance()
+    obj.__dict__.update(values)
+    return obj
+
+
+def to_runs(table: "pa.Table") -> List[Run]:
+    """Строки архива как несвязанные с сессией Run с evaluation и score"""
+    configure_mappers()
+    runs = []
+    for row in table.to_pylist():
+        run = _instance(Run, {name: row[name] for name in RUN_COLUMNS})
+        run.__dict__["archived"] = True
+        run.__dict__["evaluation"] = None if row["evaluation_id"] is None else _instance(Evaluation, {
+            "id": row["evaluation_id"], "run_id": row["id"], "rating": row["rating"],
+            "comment": row["evaluation_comment"], "created_at": row["evaluated_at"]
+        })
+        has_score = any(row[name] is not None for name in SCORE_COLUMNS)
+        run.__dict__["score"] = _instance(
+            RunScore, {"run_id": row["id"], **{name: row[name] for name in SCORE_COLUMNS}}
+        ) if has_score else None
+        runs.append(run)
+    return runs
+
+
+def load_runs(exclude_ids: Iterable[str] = (), **filters) -> List[Run]:
+    """
+    Архивные запуски (read_archive(**filters)) от новых к старым. Пустой
+    список, если архива нет. exclude_ids — запуски, найденные в базе: после
+    сбоя между записью файла и удалением строк запуск есть в обоих местах.
+    """
+    if not has_archive(filters.get("root")):
+        return []
+    exclude = set(exclude_ids)
+    runs = [run for run in to_runs(read_archive(**filters)) if run.id not in exclude]
+    return sorted(runs, key=lambda run: run.started_at or datetime.min, reverse=True)
+
+
+def export_runs(
+    session: Session,
+    path: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_archived: bool = True
+) -> int:
+    """Выгружает запуски с оценками и метриками в один файл Parquet; возвращает число строк"""
+    _require_pyarrow()
+    query = _rows_query()
+    if since is not None:
+        query = query.where(Run.started_at >= since)
+    if until is not None:
+        query = query.where(Run.started_at < until)
+    table = _to_table(session.execute(query.order_by(Run.started_at)).all())
+    if include_archived and has_archive():
+        cold = read_archive(since=since, until=until)
+        cold = cold.filter(pc.invert(pc.is_in(cold["id"], value_set=table["id"])))
+        table = pa.concat_tables([cold, table])
+    pq.write_table(table, path, compression="zstd")
+    return table.num_rows
+
+
+def vacuum(session: Session) -> None:
+    """Сжимает файл базы после архивации и перестраивает FTS (VACUUM может сменить rowid)"""
+    from .models import rebuild_search_index
+
+    session.commit()
+    engine = session.get_bind()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+    rebuild_search_index(engine)
+
+
+def stats(root: Optional[str] = None) -> Dict[str, int]:
+    """Число файлов и их суммарный размер в байтах"""
+    root = root or archive_dir()
+    files, size = 0, 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(".parquet"):
+                files += 1
+                size += os.path.getsize(os.path.join(directory, name))
+    return {"files": files, "bytes": size}
+
+
+if __name__ == "__main__":
+    from .models import create_engine_and_session, init_database
+
+    parser = argparse.ArgumentParser(description="Архив старых запусков в Parquet")
+    parser.add_argument("--days", type=int, default=None, help="Архивировать запуски старше N дней (LLM_RUNNER_ARCHIVE_DAYS)")
+    parser.add_argument("--vacuum", action="store_true", help="Сжать файл базы после архивации")
+    parser.add_argument("--export", metavar="PATH", help="Вместо архивации выгрузить все запуски в Parquet")
+    args = parser.parse_args()
+
+    init_database()
+    _, SessionLocal = create_engine_and_session()
+    with SessionLocal() as session:
+        if args.export:
+            logger.info(f"Выгружено запусков: {export_runs(session, args.export)}")
+        else:
+            days = archive_days() if args.days is None else args.days
+            count = archive_runs(session, before=datetime.utcnow() - timedelta(days=days))
+            logger.info(f"Перенесено в архив: {count}, файлов в архиве: {stats()['files']}")
+            if args.vacuum and count:
+                vacuum(session)
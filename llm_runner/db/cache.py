@@ -0,0 +1,172 @@
+"""
+Кэш результатов запросов репозиториев с инвалидацией по записи
+
+Каждой таблице соответствует счетчик поколений. Запись в таблицу
+(коммит сессии с новыми/измененными/удаленными объектами или DML запрос)
+увеличивает счетчик, и все закэшированные результаты, зависящие от
+таблицы, становятся недействительными. Кэш общий для процесса, поэтому
+его разделяют все сессии Streamlit.
+
+Отключается переменной окружения LLM_RUNNER_QUERY_CACHE=0.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+_DIRTY_TABLES_KEY = "llm_runner_dirty_tables"
+
+
+class QueryCache:
+    """LRU кэш результатов с поколениями по таблицам"""
+
+    def __init__(self, max_entries: int = 10000, ttl_s: Optional[float] = 60.0):
+        self.max_entries = max_entries
+        # TTL страхует от записей из других процессов, которых этот процесс не видит
+        self.ttl_s = ttl_s
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def generations(self, db_url: str, tables: Iterable[str]) -> Tuple[int, ...]:
+        """Текущие поколения таблиц"""
+        with self._lock:
+            return tuple(self._generations.get((db_url, table), 0) for table in tables)
+
+    def bump(self, db_url: str, tables: Iterable[str]) -> None:
+        """Отмечает запись в таблицы"""
+        with self._lock:
+            for table in tables:
+                key = (db_url, table)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def get_or_load(self, key: Hashable, db_url: str, tables: Tuple[str, ...], loader: Callable[[], Any]) -> Any:
+        """Возвращает результат из кэша или выполняет loader"""
+        # Поколения читаются до запроса: запись во время загрузки даст промах, а не устаревшие данные
+        generations = self.generations(db_url, tables)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generations, loaded_at, value = entry
+                if entry_generations == generations and (self.ttl_s is None or now - loaded_at < self.ttl_s):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+
+        value = loader()
+
+        with self._lock:
+            self._entries[key] = (generations, now, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        """Очищает все записи"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _cache_from_env() -> QueryCache:
+    cache = QueryCache(
+        max_entries=int(os.getenv("LLM_RUNNER_QUERY_CACHE_SIZE", "10000")),
+        ttl_s=float(os.getenv("LLM_RUNNER_QUERY_CACHE_TTL", "60")) or None
+    )
+    cache.enabled = os.getenv("LLM_RUNNER_QUERY_CACHE", "1") != "0"
+    return cache
+
+
+query_cache = _cache_from_env()
+
+
+def _session_db_url(session: Session) -> str:
+    # Без драйвера: sqlite+aiosqlite (db.aio) и sqlite — одна база и одни поколения
+    bind = session.get_bind()
+    url = bind.url
+    db_url = str(url.set(drivername=url.get_backend_name()))
+    if url.database in (None, "", ":memory:"):
+        # У каждой базы в памяти свои данные, а URL у всех одинаковый
+        db_url += f"#{id(bind)}"
+    return db_url
+
+
+def _detach(session: Session, value: Any) -> Any:
+    """Отвязывает ORM объекты от сессии, чтобы их можно было отдавать другим сессиям"""
+    objects = value if isinstance(value, list) else [value]
+    for obj in objects:
+        if obj is not None and obj in session:
+            session.expunge(obj)
+    return value
+
+
+def cached_query(*tables: str) -> Callable:
+    """
+    Декоратор метода репозитория: кэширует результат по (метод, аргументы)
+    до следующей записи в любую из таблиц tables.
+
+    Возвращаемые ORM объекты отвязаны от сессии и общие для всех вызывающих,
+    их нельзя изменять или передавать в session.delete().
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if not query_cache.enabled:
+                return fn(self, *args, **kwargs)
+            db_url = _session_db_url(self.session)
+            key = (db_url, fn.__qualname__, args, tuple(sorted(kwargs.items())))
+            value = query_cache.get_or_load(
+                key, db_url, tables, lambda: _detach(self.session, fn(self, *args, **kwargs))
+            )
+            return list(value) if isinstance(value, list) else value
+        return wrapper
+    return decorator
+
+
+def _mark_dirty(session: Session, tables: Set[str]) -> None:
+    session.info.setdefault(_DIRTY_TABLES_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session: Session, flush_context) -> None:
+    """Запоминает таблицы, затронутые flush (включая каскадные удаления)"""
+    tables = {
+        obj.__table__.name
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    if tables:
+        _mark_dirty(session, tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_dml_tables(orm_execute_state) -> None:
+    """Запоминает таблицы, затронутые insert/update/delete запросами через сессию"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _mark_dirty(orm_execute_state.session, {table.name})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    """После коммита увеличивает поколения затронутых таблиц"""
+    tables = session.info.pop(_DIRTY_TABLES_KEY, None)
+    if tables:
+        query_cache.bump(_session_db_url(session), tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_TABLES_KEY, None)
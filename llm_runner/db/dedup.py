@@ -0,0 +1,159 @@
+"""
+Индекс почти одинаковых ответов (MinHash + LSH) поверх runs.response_text
+
+Индекс поддерживается инкрементально: перед flush сессии новым запускам с
+ответом назначается cluster_id. Подпись ответа сравнивается только с
+кластерами из совпавших LSH бакетов (поиск по индексу, а не перебор), и
+ответ, похожий на кластер не меньше чем на порог, попадает в него. Иначе
+запуск открывает новый кластер, и в бакеты пишется только его подпись —
+поэтому размер индекса растет с числом разных ответов, а не запусков.
+
+Порог — LLM_RUNNER_DEDUP_THRESHOLD (оценка Жаккара, по умолчанию 0.8);
+LLM_RUNNER_DEDUP=0 отключает индексацию. Запуски, сохраненные до
+появления индекса, индексируются backfill().
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import event, literal_column, select
+from sqlalchemy.orm import Session
+
+from .models import DedupBucket, DedupCluster, Run
+
+# Ограничение числа параметров SQL запроса
+_IN_CHUNK = 500
+
+
+def dedup_enabled() -> bool:
+    return os.getenv("LLM_RUNNER_DEDUP", "1") != "0"
+
+
+def dedup_threshold() -> float:
+    return float(os.getenv("LLM_RUNNER_DEDUP_THRESHOLD", "0.8"))
+
+
+def _chunks(items: List, size: int = _IN_CHUNK) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _load_candidates(session: Session, keys: List[int]) -> Tuple[Dict[int, Set[str]], Dict[str, object]]:
+    """Кластеры из бакетов с ключами keys и их подписи"""
+    from ..core import minhash
+
+    buckets: Dict[int, Set[str]] = {}
+    for chunk in _chunks(keys):
+        for key, cluster_id in session.execute(
+            select(DedupBucket.key, DedupBucket.cluster_id).where(DedupBucket.key.in_(chunk))
+        ):
+            buckets.setdefault(key, set()).add(cluster_id)
+    cluster_ids = sorted({cid for ids in buckets.values() for cid in ids})
+    signatures = {}
+    for chunk in _chunks(cluster_ids):
+        for cluster_id, data in session.execute(
+            select(DedupCluster.id, DedupCluster.signature).where(DedupCluster.id.in_(chunk))
+        ):
+            signatures[cluster_id] = minhash.from_bytes(data)
+    return buckets, signatures
+
+
+def assign_clusters(session: Session, runs: List[Run], threshold: Optional[float] = None) -> int:
+    """
+    Назначает cluster_id запускам (объекты добавляются в session).
+
+    Возвращает число открытых кластеров.
+    """
+    # numpy загружается при первой индексации, а не при импорте модуля
+    from ..core import minhash
+
+    threshold = dedup_threshold() if threshold is None else threshold
+    pending = []
+    for run in runs:
+        sig = minhash.signature(run.response_text) if run.response_text else None
+        if sig is not None:
+            pending.append((run, sig, minhash.band_keys(sig)))
+    if not pending:
+        return 0
+
+    with session.no_autoflush:
+        buckets, signatures = _load_candidates(session, sorted({key for _, _, keys in pending for key in keys}))
+
+    created = 0
+    for run, sig, keys in pending:
+        candidates = set()
+        for key in keys:
+            candidates.update(buckets.get(key, ()))
+        best_id, best = None, threshold
+        for cluster_id in candidates:
+            score = minhash.similarity(sig, signatures[cluster_id])
+            if score >= best:
+                best_id, best = cluster_id, score
+        if best_id is not None:
+            run.cluster_id = best_id
+            continue
+
+        # Новый кластер видят и следующие запуски той же пачки
+        run.cluster_id = run.id
+        signatures[run.id] = sig
+        session.add(DedupCluster(id=run.id, signature=minhash.to_bytes(sig)))
+        for key in set(keys):
+            buckets.setdefault(key, set()).add(run.id)
+            session.add(DedupBucket(key=key, cluster_id=run.id))
+        created += 1
+    return created
+
+
+def find_cluster(session: Session, text: str, threshold: Optional[float] = None) -> Optional[Tuple[str, float]]:
+    """Ближайший кластер для текста: (cluster_id, оценка сходства) или None"""
+    from ..core import minhash
+
+    sig = minhash.signature(text)
+    if sig is None:
+        return None
+    buckets, signatures = _load_candidates(session, minhash.band_keys(sig))
+    threshold = dedup_threshold() if threshold is None else threshold
+    scored = [(cluster_id, minhash.similarity(sig, signatures[cluster_id])) for cluster_id in signatures]
+    scored = [item for item in scored if item[1] >= threshold]
+    return max(scored, key=lambda item: item[1]) if scored else None
+
+
+def backfill(session: Session, batch_size: int = 1000, limit: Optional[int] = None) -> int:
+    """Индексирует запуски без cluster_id пачками по batch_size; возвращает их число"""
+    rowid = literal_column("runs.rowid")
+    last_rowid, indexed = 0, 0
+    while limit is None or indexed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - indexed)
+        # Проход по rowid: ответы, пустые после нормализации, не выбираются повторно
+        rows = session.query(Run, rowid).filter(
+            rowid > last_rowid, Run.cluster_id.is_(None), Run.response_text.isnot(None)
+        ).order_by(rowid).limit(size).all()
+        if not rows:
+            break
+        assign_clusters(session, [run for run, _ in rows])
+        session.commit()
+        session.expunge_all()
+        last_rowid = rows[-1][1]
+        indexed += len(rows)
+        logger.info(f"Индекс дублей: проиндексировано {indexed} запусков")
+    return indexed
+
+
+@event.listens_for(Session, "before_flush")
+def _index_new_runs(session: Session, flush_context, instances) -> None:
+    """Назначает кластеры новым запускам перед их вставкой"""
+    # cluster_id == id остается от отката пачки писателя: строки кластера откатились вместе с ней
+    if not dedup_enabled():
+        return
+    runs = [obj for obj in session.new if isinstance(obj, Run) and obj.cluster_id in (None, obj.id) and obj.response_text]
+    if runs:
+        assign_clusters(session, runs)
+
+
+if __name__ == "__main__":
+    from .models import create_engine_and_session, init_database
+
+    init_database()
+    _, SessionLocal = create_engine_and_session()
+    with SessionLocal() as session:
+        logger.info(f"Проиндексировано запусков: {backfill(session)}")
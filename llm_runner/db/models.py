@@ -1,11 +1,16 @@
 """
 Модели данных для MVP
 """
-from sqlalchemy import create_engine, Column, String, Integer, Float, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, inspect, text, Column, String, Integer, BigInteger, Float, Text, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+from typing import Dict, Set, Tuple
 import os
+import threading
+
+from ..core.codec import JsonField
 
 Base = declarative_base()
 
@@ -18,8 +23,13 @@ class Task(Base):
     name = Column(String, nullable=False)
     prompt_template = Column(Text, nullable=False)
     input_text = Column(Text)
+    vars_json = Column(Text)  # JSON с переменными шаблона
+    reference = Column(Text)  # Эталонный ответ для автоматических метрик
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Разобранный vars_json (лениво, core.codec)
+    variables = JsonField("vars_json", {})
+    
     # Связь с запусками
     runs = relationship("Run", back_populates="task", cascade="all, delete-orphan")
 
@@ -29,12 +39,12 @@ class Run(Base):
     __tablename__ = 'runs'
     
     id = Column(String, primary_key=True)
-    task_id = Column(String, ForeignKey('tasks.id'), nullable=False)
+    task_id = Column(String, ForeignKey('tasks.id'), nullable=False, index=True)
     provider = Column(String, nullable=False)  # 'comet', 'openai', etc.
     model = Column(String, nullable=False)
     params_json = Column(Text)  # JSON с параметрами
     messages_json = Column(Text)  # JSON с сообщениями
-    started_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, default=datetime.utcnow, index=True)
     ended_at = Column(DateTime)
     latency_ms = Column(Integer)
     prompt_tokens = Column(Integer)
@@ -45,10 +55,24 @@ class Run(Base):
     response_text = Column(Text)
     response_json = Column(Text)  # Полный JSON ответ
     error = Column(Text)  # Ошибка если была
+    sample_group_id = Column(String, index=True)  # Общий ID сэмплов одного запроса с n > 1
+    sample_index = Column(Integer)  # Номер сэмпла в группе
+    cluster_id = Column(String, index=True)  # Кластер почти одинаковых ответов (db.dedup)
+    
+    # Разобранные JSON колонки (лениво, core.codec)
+    params = JsonField("params_json", {})
+    messages = JsonField("messages_json", [])
+    response = JsonField("response_json")
+    
+    # True у запусков, прочитанных из Parquet архива (db.archive)
+    archived = False
     
     # Связи
     task = relationship("Task", back_populates="runs")
     evaluation = relationship("Evaluation", back_populates="run", uselist=False, cascade="all, delete-orphan")
+    score = relationship("RunScore", back_populates="run", uselist=False, cascade="all, delete-orphan")
+    pairwise_as_a = relationship("Pairwise", foreign_keys="Pairwise.run_a", cascade="all, delete-orphan")
+    pairwise_as_b = relationship("Pairwise", foreign_keys="Pairwise.run_b", cascade="all, delete-orphan")
 
 
 class Evaluation(Base):
@@ -56,7 +80,7 @@ class Evaluation(Base):
     __tablename__ = 'evaluations'
     
     id = Column(String, primary_key=True)
-    run_id = Column(String, ForeignKey('runs.id'), nullable=False)
+    run_id = Column(String, ForeignKey('runs.id'), nullable=False, index=True)
     rating = Column(Integer)  # 1-5
     comment = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -65,22 +89,190 @@ class Evaluation(Base):
     run = relationship("Run", back_populates="evaluation")
 
 
+class RunScore(Base):
+    """Автоматические метрики ответа относительно эталона задачи (core.scoring)"""
+    __tablename__ = 'run_scores'
+    
+    run_id = Column(String, ForeignKey('runs.id'), primary_key=True)
+    exact_match = Column(Float)
+    token_f1 = Column(Float)
+    rouge_l = Column(Float)
+    bleu = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Связь
+    run = relationship("Run", back_populates="score")
+
+
+class Pairwise(Base):
+    """Парное сравнение (A/B) двух ответов на одну задачу"""
+    __tablename__ = 'pairwise'
+    
+    id = Column(String, primary_key=True)
+    run_a = Column(String, ForeignKey('runs.id'), nullable=False, index=True)
+    run_b = Column(String, ForeignKey('runs.id'), nullable=False, index=True)
+    winner_run = Column(String, nullable=False)  # run_a | run_b | 'draw'
+    model_a = Column(String, nullable=False)  # Модели копируются для агрегатов без join
+    model_b = Column(String, nullable=False)
+    comment = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EloRating(Base):
+    """Онлайн рейтинг Elo модели, обновляется с каждым сравнением"""
+    __tablename__ = 'elo_ratings'
+    
+    model = Column(String, primary_key=True)
+    rating = Column(Float, nullable=False)
+    comparisons = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BudgetUsage(Base):
+    """Расход токенов и USD в рамках бюджета (день или батч)"""
+    __tablename__ = 'budget_usage'
+    
+    scope = Column(String, primary_key=True)  # day:YYYY-MM-DD | batch:<id>
+    tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    in_flight = Column(Integer, nullable=False, default=0)  # резервы, еще не сверенные с usage
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DedupCluster(Base):
+    """Кластер почти одинаковых ответов: MinHash подпись первого ответа"""
+    __tablename__ = 'dedup_clusters'
+    
+    id = Column(String, primary_key=True)  # ID первого запуска кластера
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DedupBucket(Base):
+    """LSH бакет: ключ полосы подписи -> кластер"""
+    __tablename__ = 'dedup_buckets'
+    
+    key = Column(BigInteger, primary_key=True)
+    cluster_id = Column(String, primary_key=True)
+
+
 def get_database_url():
     """Получает URL базы данных из переменных окружения"""
     db_path = os.getenv("LLM_RUNNER_DB", "./llm_runner.db")
     return f"sqlite:///{db_path}"
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настраивает соединение SQLite для конкурентной работы читателей и писателя"""
+    cursor = dbapi_connection.cursor()
+    # WAL позволяет читать параллельно с записью, NORMAL убирает fsync на каждый коммит
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+# Движки и фабрики сессий переиспользуются в пределах процесса (по URL базы)
+_engines: Dict[str, Tuple[object, sessionmaker]] = {}
+_initialized_urls: Set[str] = set()
+_engines_lock = threading.Lock()
+
+
 def create_engine_and_session():
-    """Создает движок БД и сессию"""
+    """Создает движок БД и сессию (один раз на URL базы в процессе)"""
     database_url = get_database_url()
-    engine = create_engine(database_url, echo=False)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return engine, SessionLocal
+    with _engines_lock:
+        cached = _engines.get(database_url)
+        if cached is None:
+            engine = create_engine(database_url, echo=False, connect_args={"timeout": 30})
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+            SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            cached = _engines[database_url] = (engine, SessionLocal)
+    return cached
+
+
+def _migrate_schema(conn):
+    """Добавляет в существующие таблицы колонки, появившиеся после их создания"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+# Полнотекстовый поиск: FTS5 таблицы с внешним содержимым поверх runs и tasks,
+# синхронизируются триггерами (rowid исходной строки = rowid в индексе)
+_SEARCH_INDEXES = {
+    "runs_fts": ("runs", ("response_text",)),
+    "tasks_fts": ("tasks", ("prompt_template", "input_text")),
+}
+
+
+def _create_search_index(conn):
+    """Создает FTS5 индексы и триггеры; при первом создании индексирует существующие строки"""
+    for fts_table, (table, columns) in _SEARCH_INDEXES.items():
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts_table}
+        ).first()
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{c}" for c in columns)
+        old_values = ", ".join(f"old.{c}" for c in columns)
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); "
+            f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+        ))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def rebuild_search_index(engine=None):
+    """Переиндексирует FTS таблицы целиком (нужно после VACUUM: он может сменить rowid)"""
+    if engine is None:
+        engine, _ = create_engine_and_session()
+    with engine.begin() as conn:
+        for fts_table in _SEARCH_INDEXES:
+            conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def create_schema(conn):
+    """Таблицы, новые колонки и индексы, FTS — на соединении conn (в том числе из run_sync)"""
+    Base.metadata.create_all(bind=conn)
+    _migrate_schema(conn)
+    _create_search_index(conn)
 
 
 def init_database():
-    """Инициализирует базу данных"""
+    """Инициализирует базу данных (DDL выполняется один раз на процесс)"""
     engine, _ = create_engine_and_session()
-    Base.metadata.create_all(bind=engine)
+    database_url = str(engine.url)
+    if database_url not in _initialized_urls:
+        for attempt in range(5):
+            try:
+                with engine.begin() as conn:
+                    create_schema(conn)
+                break
+            except OperationalError:
+                # Другой процесс создал таблицу между проверкой и CREATE TABLE
+                if attempt == 4:
+                    raise
+        _initialized_urls.add(database_url)
     return engine
\ No newline at end of file
@@ -1,14 +1,115 @@
 """
 Репозиторий для работы с базой данных
 """
-import json
+import re
+import threading
 import uuid
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import case, delete, desc, func, insert, literal_column, select, text, update
 
-from .models import Task, Run, Evaluation, create_engine_and_session
+from .models import Task, Run, Evaluation, RunScore, Pairwise, EloRating, create_engine_and_session
+from .cache import cached_query
+# dedup регистрирует обработчик before_flush; numpy (minhash) и pyarrow (archive)
+# импортируются только при первом использовании, не при открытии страницы
+from . import dedup
+from ..core import codec
+from ..core.metrics import traced
+
+
+def build_run(
+    task_id: str,
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    messages: List[Dict[str, str]],
+    response_text: str = None,
+    response_json: Dict[str, Any] = None,
+    error: str = None,
+    latency_ms: int = None,
+    usage: Dict[str, int] = None,
+    finish_reason: str = None,
+    sample_group_id: str = None,
+    sample_index: int = None
+) -> Run:
+    """Собирает объект запуска без сохранения в БД"""
+    run = Run(
+        id=str(uuid.uuid4()),
+        task_id=task_id,
+        provider=provider,
+        model=model,
+        params_json=codec.dumps(params),
+        messages_json=codec.dumps(messages),
+        response_text=response_text,
+        response_json=codec.dumps(response_json) if response_json else None,
+        error=error,
+        latency_ms=latency_ms,
+        finish_reason=finish_reason,
+        sample_group_id=sample_group_id,
+        sample_index=sample_index
+    )
+    
+    # Заполняем usage если есть
+    if usage:
+        run.prompt_tokens = usage.get('prompt_tokens', 0)
+        run.completion_tokens = usage.get('completion_tokens', 0)
+        run.total_tokens = usage.get('total_tokens', 0)
+    
+    # Завершаем запуск
+    run.ended_at = datetime.utcnow()
+    return run
+
+
+def build_evaluation(run_id: str, rating: int, comment: str = None) -> Evaluation:
+    """Собирает объект оценки без сохранения в БД"""
+    return Evaluation(id=str(uuid.uuid4()), run_id=run_id, rating=rating, comment=comment)
+
+
+@dataclass
+class SearchHit:
+    """Результат полнотекстового поиска: объект, релевантность (меньше — лучше) и фрагмент"""
+    item: Any
+    rank: float
+    snippet: str
+
+
+def to_fts_query(query: str) -> str:
+    """
+    Превращает пользовательский ввод в запрос FTS5: все слова обязательны,
+    последнее ищется как префикс. Спецсимволы синтаксиса FTS5 отбрасываются.
+    """
+    words = re.findall(r"\w+", query or "")
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+_SNIPPET = "'**', '**', '…', 16"
+
+# Больше совпадений bm25 не сортирует: ранжирование всех строк стоит сотни
+# миллисекунд, а у настолько частого запроса релевантность мало что значит,
+# поэтому такие результаты идут от новых к старым
+RANK_MAX_MATCHES = 10000
+
+
+def _merge_archived(runs: List[Run], archived: List[Run]) -> List[Run]:
+    """Запуски из базы и архива вместе, от новых к старым"""
+    if not archived:
+        return runs
+    return sorted(runs + archived, key=lambda run: run.started_at or datetime.min, reverse=True)
+
+
+def _load_in_order(session: Session, model, rows) -> List[SearchHit]:
+    """Загружает объекты по id из строк (id, rank, snippet), сохраняя порядок ранжирования"""
+    ids = [row[0] for row in rows]
+    if not ids:
+        return []
+    objects = {obj.id: obj for obj in session.query(model).filter(model.id.in_(ids)).all()}
+    return [SearchHit(item=objects[row[0]], rank=row[1], snippet=row[2]) for row in rows if row[0] in objects]
 
 
 class TaskRepository:
@@ -17,29 +118,70 @@ class TaskRepository:
     def __init__(self, session: Session):
         self.session = session
     
-    def create_task(self, name: str, prompt_template: str, input_text: str = None) -> Task:
+    @traced("db.task.create_task")
+    def create_task(
+        self,
+        name: str,
+        prompt_template: str,
+        input_text: str = None,
+        vars: Dict[str, Any] = None,
+        reference: str = None
+    ) -> Task:
         """Создает новую задачу"""
         task = Task(
             id=str(uuid.uuid4()),
             name=name,
             prompt_template=prompt_template,
-            input_text=input_text
+            input_text=input_text,
+            vars_json=codec.dumps(vars) if vars else None,
+            reference=reference or None
         )
         self.session.add(task)
         self.session.commit()
         return task
     
+    @traced("db.task.update_reference")
+    def update_reference(self, task_id: str, reference: Optional[str]) -> bool:
+        """Меняет эталонный ответ задачи; метрики ее запусков пересчитываются заново"""
+        task = self.session.query(Task).filter(Task.id == task_id).first()
+        if task is None:
+            return False
+        task.reference = reference or None
+        run_ids = self.session.query(Run.id).filter(Run.task_id == task_id)
+        self.session.execute(delete(RunScore).where(RunScore.run_id.in_(run_ids.scalar_subquery())))
+        self.session.commit()
+        return True
+    
+    @traced("db.task.get_all_tasks")
+    @cached_query("tasks")
     def get_all_tasks(self) -> List[Task]:
         """Получает все задачи"""
         return self.session.query(Task).order_by(desc(Task.created_at)).all()
     
+    @traced("db.task.get_task_by_id")
+    @cached_query("tasks")
     def get_task_by_id(self, task_id: str) -> Optional[Task]:
         """Получает задачу по ID"""
         return self.session.query(Task).filter(Task.id == task_id).first()
     
+    @traced("db.task.search_tasks")
+    def search_tasks(self, query: str, limit: int = 20, offset: int = 0) -> List[SearchHit]:
+        """Ищет задачи по шаблону промпта и входному тексту (FTS5, по релевантности)"""
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return []
+        rows = self.session.execute(text(
+            f"SELECT tasks.id, bm25(tasks_fts), snippet(tasks_fts, -1, {_SNIPPET}) "
+            "FROM tasks_fts JOIN tasks ON tasks.rowid = tasks_fts.rowid "
+            "WHERE tasks_fts MATCH :query ORDER BY bm25(tasks_fts) LIMIT :limit OFFSET :offset"
+        ), {"query": fts_query, "limit": limit, "offset": offset}).all()
+        return _load_in_order(self.session, Task, rows)
+    
+    @traced("db.task.delete_task")
     def delete_task(self, task_id: str) -> bool:
         """Удаляет задачу"""
-        task = self.get_task_by_id(task_id)
+        # Запрашиваем напрямую: объекты из кэша отвязаны от сессии
+        task = self.session.query(Task).filter(Task.id == task_id).first()
         if task:
             self.session.delete(task)
             self.session.commit()
@@ -53,6 +195,7 @@ class RunRepository:
     def __init__(self, session: Session):
         self.session = session
     
+    @traced("db.run.create_run")
     def create_run(
         self,
         task_id: str,
@@ -65,48 +208,134 @@ class RunRepository:
         error: str = None,
         latency_ms: int = None,
         usage: Dict[str, int] = None,
-        finish_reason: str = None
+        finish_reason: str = None,
+        sample_group_id: str = None,
+        sample_index: int = None
     ) -> Run:
         """Создает новый запуск"""
-        
-        run = Run(
-            id=str(uuid.uuid4()),
+        run = build_run(
             task_id=task_id,
             provider=provider,
             model=model,
-            params_json=json.dumps(params),
-            messages_json=json.dumps(messages),
+            params=params,
+            messages=messages,
             response_text=response_text,
-            response_json=json.dumps(response_json) if response_json else None,
+            response_json=response_json,
             error=error,
             latency_ms=latency_ms,
-            finish_reason=finish_reason
+            usage=usage,
+            finish_reason=finish_reason,
+            sample_group_id=sample_group_id,
+            sample_index=sample_index
         )
         
-        # Заполняем usage если есть
-        if usage:
-            run.prompt_tokens = usage.get('prompt_tokens', 0)
-            run.completion_tokens = usage.get('completion_tokens', 0)
-            run.total_tokens = usage.get('total_tokens', 0)
-        
-        # Завершаем запуск
-        run.ended_at = datetime.utcnow()
-        
         self.session.add(run)
         self.session.commit()
         return run
     
-    def get_runs_by_task(self, task_id: str) -> List[Run]:
-        """Получает все запуски для задачи"""
-        return self.session.query(Run).filter(Run.task_id == task_id).order_by(desc(Run.started_at)).all()
+    @traced("db.run.get_runs_by_task")
+    @cached_query("runs")
+    def get_runs_by_task(self, task_id: str, include_archived: bool = False) -> List[Run]:
+        """Получает все запуски для задачи (include_archived — и из архива db.archive)"""
+        runs = self.session.query(Run).filter(Run.task_id == task_id).order_by(desc(Run.started_at)).all()
+        if include_archived:
+            from . import archive
+            runs = _merge_archived(runs, archive.load_runs(exclude_ids=[run.id for run in runs], task_id=task_id))
+        return runs
     
-    def get_all_runs(self) -> List[Run]:
-        """Получает все запуски"""
-        return self.session.query(Run).order_by(desc(Run.started_at)).all()
+    @traced("db.run.get_all_runs")
+    @cached_query("runs")
+    def get_all_runs(self, include_archived: bool = False) -> List[Run]:
+        """Получает все запуски (include_archived — и из архива db.archive)"""
+        runs = self.session.query(Run).order_by(desc(Run.started_at)).all()
+        if include_archived:
+            from . import archive
+            runs = _merge_archived(runs, archive.load_runs(exclude_ids=[run.id for run in runs]))
+        return runs
     
-    def get_run_by_id(self, run_id: str) -> Optional[Run]:
-        """Получает запуск по ID"""
-        return self.session.query(Run).filter(Run.id == run_id).first()
+    @traced("db.run.search_runs")
+    def search_runs(self, query: str, limit: int = 20, offset: int = 0, in_tasks: bool = False) -> List[SearchHit]:
+        """
+        Ищет запуски по тексту ответа (FTS5, по релевантности, постранично).
+        Если совпадений больше RANK_MAX_MATCHES, они идут от новых к старым.
+
+        in_tasks=True ищет по шаблону промпта и входному тексту задачи и
+        возвращает запуски найденных задач.
+        """
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return []
+        if in_tasks:
+            sql = (
+                f"SELECT runs.id, bm25(tasks_fts), snippet(tasks_fts, -1, {_SNIPPET}) "
+                "FROM tasks_fts JOIN tasks ON tasks.rowid = tasks_fts.rowid JOIN runs ON runs.task_id = tasks.id "
+                "WHERE tasks_fts MATCH :query ORDER BY bm25(tasks_fts), runs.started_at DESC LIMIT :limit OFFSET :offset"
+            )
+        else:
+            frequent = self.session.execute(text(
+                "SELECT count(*) FROM (SELECT 1 FROM runs_fts WHERE runs_fts MATCH :query LIMIT :cap)"
+            ), {"query": fts_query, "cap": RANK_MAX_MATCHES + 1}).scalar() > RANK_MAX_MATCHES
+            order = "runs_fts.rowid DESC" if frequent else "rank"
+            sql = (
+                f"SELECT runs.id, runs_fts.rank, snippet(runs_fts, 0, {_SNIPPET}) "
+                "FROM runs_fts JOIN runs ON runs.rowid = runs_fts.rowid "
+                f"WHERE runs_fts MATCH :query ORDER BY {order} LIMIT :limit OFFSET :offset"
+            )
+        rows = self.session.execute(text(sql), {"query": fts_query, "limit": limit, "offset": offset}).all()
+        return _load_in_order(self.session, Run, rows)
+    
+    @traced("db.run.count_search_runs")
+    def count_search_runs(self, query: str, in_tasks: bool = False) -> int:
+        """Количество запусков, найденных search_runs"""
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return 0
+        if in_tasks:
+            sql = (
+                "SELECT count(*) FROM tasks_fts JOIN tasks ON tasks.rowid = tasks_fts.rowid "
+                "JOIN runs ON runs.task_id = tasks.id WHERE tasks_fts MATCH :query"
+            )
+        else:
+            sql = "SELECT count(*) FROM runs_fts WHERE runs_fts MATCH :query"
+        return self.session.execute(text(sql), {"query": fts_query}).scalar()
+    
+    @traced("db.run.get_cluster_runs")
+    @cached_query("runs")
+    def get_cluster_runs(self, cluster_id: str) -> List[Run]:
+        """Запуски с почти одинаковыми ответами (один кластер db.dedup)"""
+        return self.session.query(Run).filter(Run.cluster_id == cluster_id).order_by(Run.started_at).all()
+    
+    @traced("db.run.get_duplicate_clusters")
+    def get_duplicate_clusters(self, min_size: int = 2, limit: int = 50) -> List[Dict[str, Any]]:
+        """Самые крупные кластеры почти одинаковых ответов: cluster_id, size, models"""
+        rows = self.session.query(
+            Run.cluster_id, func.count(Run.id), func.group_concat(Run.model.distinct())
+        ).filter(Run.cluster_id.isnot(None)).group_by(Run.cluster_id).having(
+            func.count(Run.id) >= min_size
+        ).order_by(desc(func.count(Run.id))).limit(limit).all()
+        return [
+            {"cluster_id": cluster_id, "size": size, "models": sorted((models or "").split(","))}
+            for cluster_id, size, models in rows
+        ]
+    
+    @traced("db.run.find_similar_runs")
+    def find_similar_runs(self, text: str, limit: int = 20) -> List[Run]:
+        """Запуски с ответом, почти одинаковым с text (через LSH индекс)"""
+        found = dedup.find_cluster(self.session, text)
+        if found is None:
+            return []
+        return self.session.query(Run).filter(Run.cluster_id == found[0]).order_by(desc(Run.started_at)).limit(limit).all()
+    
+    @traced("db.run.get_run_by_id")
+    @cached_query("runs")
+    def get_run_by_id(self, run_id: str, include_archived: bool = False) -> Optional[Run]:
+        """Получает запуск по ID (include_archived — и из архива db.archive)"""
+        run = self.session.query(Run).filter(Run.id == run_id).first()
+        if run is None and include_archived:
+            from . import archive
+            found = archive.load_runs(run_ids=[run_id])
+            run = found[0] if found else None
+        return run
 
 
 class EvaluationRepository:
@@ -115,18 +344,35 @@ class EvaluationRepository:
     def __init__(self, session: Session):
         self.session = session
     
+    @traced("db.evaluation.create_evaluation")
     def create_evaluation(self, run_id: str, rating: int, comment: str = None) -> Evaluation:
         """Создает новую оценку"""
-        evaluation = Evaluation(
-            id=str(uuid.uuid4()),
-            run_id=run_id,
-            rating=rating,
-            comment=comment
-        )
+        evaluation = build_evaluation(run_id, rating, comment)
         self.session.add(evaluation)
         self.session.commit()
         return evaluation
     
+    @traced("db.evaluation.evaluate_cluster")
+    def evaluate_cluster(self, run_id: str, rating: int, comment: str = None) -> int:
+        """
+        Оценивает запуск и все еще не оцененные запуски его кластера
+        почти одинаковых ответов. Возвращает число созданных оценок.
+        """
+        run = self.session.query(Run).filter(Run.id == run_id).first()
+        if run is None:
+            return 0
+        run_ids = [run_id]
+        if run.cluster_id:
+            run_ids += [
+                rid for (rid,) in self.session.query(Run.id).outerjoin(Evaluation, Evaluation.run_id == Run.id).filter(
+                    Run.cluster_id == run.cluster_id, Run.id != run_id, Run.error.is_(None), Evaluation.id.is_(None)
+                ).all()
+            ]
+        self.session.add_all([build_evaluation(rid, rating, comment) for rid in run_ids])
+        self.session.commit()
+        return len(run_ids)
+    
+    @traced("db.evaluation.update_evaluation")
     def update_evaluation(self, run_id: str, rating: int, comment: str = None) -> Optional[Evaluation]:
         """Обновляет существующую оценку"""
         evaluation = self.session.query(Evaluation).filter(Evaluation.run_id == run_id).first()
@@ -137,11 +383,262 @@ class EvaluationRepository:
             return evaluation
         return None
     
+    @traced("db.evaluation.get_unevaluated_runs")
+    def get_unevaluated_runs(self, limit: int = 20, exclude_ids: List[str] = None) -> List[Run]:
+        """
+        Следующие успешные запуски без оценки, от новых к старым: один запрос
+        с анти-join по evaluations вместо перебора всех запусков.
+
+        exclude_ids — запуски, уже взятые в работу (пропущенные или с оценкой,
+        которая еще не записана).
+        """
+        query = self.session.query(Run).outerjoin(Evaluation, Evaluation.run_id == Run.id).filter(
+            Evaluation.id.is_(None), Run.error.is_(None)
+        )
+        if exclude_ids:
+            query = query.filter(Run.id.notin_(list(exclude_ids)))
+        return query.order_by(desc(Run.started_at)).limit(limit).all()
+    
+    @traced("db.evaluation.count_unevaluated_by_cluster")
+    def count_unevaluated_by_cluster(self, cluster_ids: List[str]) -> Dict[str, int]:
+        """Сколько успешных запусков без оценки в каждом из кластеров"""
+        if not cluster_ids:
+            return {}
+        rows = self.session.query(Run.cluster_id, func.count(Run.id)).outerjoin(
+            Evaluation, Evaluation.run_id == Run.id
+        ).filter(
+            Run.cluster_id.in_(cluster_ids), Evaluation.id.is_(None), Run.error.is_(None)
+        ).group_by(Run.cluster_id).all()
+        return dict(rows)
+    
+    @traced("db.evaluation.get_stats")
+    def get_stats(self) -> Dict[str, int]:
+        """Успешные запуски и сколько из них оценено — одним запросом"""
+        total, evaluated = self.session.query(
+            func.count(Run.id), func.count(Evaluation.id)
+        ).select_from(Run).outerjoin(Evaluation, Evaluation.run_id == Run.id).filter(Run.error.is_(None)).one()
+        return {"total": total, "evaluated": evaluated, "remaining": total - evaluated}
+    
+    @traced("db.evaluation.get_evaluated_runs")
+    def get_evaluated_runs(self, limit: int = 200, include_archived: bool = False) -> List[Tuple[Run, Evaluation]]:
+        """Последние оценки вместе с запусками (один join; include_archived — и из архива)"""
+        pairs = [
+            (run, evaluation) for run, evaluation in self.session.query(Run, Evaluation).join(
+                Evaluation, Evaluation.run_id == Run.id
+            ).order_by(desc(Evaluation.created_at)).limit(limit).all()
+        ]
+        if include_archived:
+            from . import archive
+            hot_ids = {run.id for run, _ in pairs}
+            archived = [(run, run.evaluation) for run in archive.load_runs(evaluated=True) if run.id not in hot_ids]
+            pairs = sorted(pairs + archived, key=lambda pair: pair[1].created_at or datetime.min, reverse=True)[:limit]
+        return pairs
+    
+    @traced("db.evaluation.get_evaluation_by_run_id")
+    @cached_query("evaluations")
     def get_evaluation_by_run_id(self, run_id: str) -> Optional[Evaluation]:
         """Получает оценку по ID запуска"""
         return self.session.query(Evaluation).filter(Evaluation.run_id == run_id).first()
 
 
+class ScoreRepository:
+    """Репозиторий автоматических метрик относительно эталонов задач"""
+    
+    def __init__(self, session: Session):
+        self.session = session
+    
+    def _pending_query(self, *columns):
+        return self.session.query(*columns).select_from(Run).join(Task, Task.id == Run.task_id).outerjoin(
+            RunScore, RunScore.run_id == Run.id
+        ).filter(
+            Task.reference.isnot(None), Run.error.is_(None), Run.response_text.isnot(None), RunScore.run_id.is_(None)
+        )
+    
+    @traced("db.score.count_pending")
+    def count_pending(self) -> int:
+        """Количество успешных запусков задач с эталоном, еще не получивших метрики"""
+        return self._pending_query(func.count(Run.id)).scalar()
+    
+    @traced("db.score.score_pending")
+    def score_pending(self, batch_size: int = 5000, max_workers: Optional[int] = None, limit: Optional[int] = None) -> int:
+        """
+        Считает метрики для запусков без них пачками по batch_size
+        (каждая пачка — одна вставка и один коммит). Возвращает число оцененных.
+        """
+        from ..core.scoring import METRICS, score_batch
+        
+        scored = 0
+        while limit is None or scored < limit:
+            size = batch_size if limit is None else min(batch_size, limit - scored)
+            rows = self._pending_query(Run.id, Run.response_text, Task.reference).limit(size).all()
+            if not rows:
+                break
+            scores = score_batch([row[1] for row in rows], [row[2] for row in rows], max_workers=max_workers)
+            now = datetime.utcnow()
+            self.session.execute(insert(RunScore), [
+                {"run_id": row[0], "created_at": now, **dict(zip(METRICS, values))}
+                for row, values in zip(rows, scores.tolist())
+            ])
+            self.session.commit()
+            scored += len(rows)
+            if len(rows) < size:
+                break
+        return scored
+    
+    @traced("db.score.get_scores_by_run_ids")
+    def get_scores_by_run_ids(self, run_ids: List[str]) -> Dict[str, RunScore]:
+        """Метрики запусков по их ID"""
+        scores = {}
+        for i in range(0, len(run_ids), 500):
+            for score in self.session.query(RunScore).filter(RunScore.run_id.in_(run_ids[i:i + 500])).all():
+                scores[score.run_id] = score
+        return scores
+    
+    @traced("db.score.get_model_scores")
+    def get_model_scores(self, task_id: str = None) -> List[Dict[str, Any]]:
+        """Средние метрики по моделям (по всем задачам или по одной)"""
+        query = self.session.query(
+            Run.model, func.count(RunScore.run_id), func.avg(RunScore.exact_match), func.avg(RunScore.token_f1),
+            func.avg(RunScore.rouge_l), func.avg(RunScore.bleu)
+        ).join(RunScore, RunScore.run_id == Run.id)
+        if task_id:
+            query = query.filter(Run.task_id == task_id)
+        rows = query.group_by(Run.model).order_by(desc(func.avg(RunScore.token_f1))).all()
+        return [
+            {"model": model, "runs": count, "exact_match": em, "token_f1": f1, "rouge_l": rouge_l, "bleu": bleu}
+            for model, count, em, f1, rouge_l, bleu in rows
+        ]
+
+
+# Рейтинги Bradley–Terry по базам: (отпечаток таблицы pairwise, результат)
+_leaderboards: Dict[Tuple[str, int], Tuple[Tuple[int, int], list]] = {}
+_leaderboards_lock = threading.Lock()
+
+
+class PairwiseRepository:
+    """Репозиторий парных сравнений и рейтингов моделей"""
+    
+    WINNERS = ("a", "b", "draw")
+    
+    def __init__(self, session: Session):
+        self.session = session
+    
+    @traced("db.pairwise.create_judgment")
+    def create_judgment(self, run_a_id: str, run_b_id: str, winner: str, comment: str = None) -> Pairwise:
+        """
+        Сохраняет сравнение (winner — 'a', 'b' или 'draw') и в той же
+        транзакции обновляет рейтинги Elo обеих моделей.
+        """
+        from ..core.ranking import ELO_INITIAL, elo_update
+        
+        if winner not in self.WINNERS:
+            raise ValueError(f"Неизвестный исход сравнения: {winner}")
+        runs = {run.id: run for run in self.session.query(Run).filter(Run.id.in_([run_a_id, run_b_id])).all()}
+        if run_a_id not in runs or run_b_id not in runs:
+            raise ValueError("Запуск для сравнения не найден")
+        run_a, run_b = runs[run_a_id], runs[run_b_id]
+        judgment = Pairwise(
+            id=str(uuid.uuid4()),
+            run_a=run_a_id,
+            run_b=run_b_id,
+            winner_run={"a": run_a_id, "b": run_b_id, "draw": "draw"}[winner],
+            model_a=run_a.model,
+            model_b=run_b.model,
+            comment=comment
+        )
+        self.session.add(judgment)
+        
+        if run_a.model != run_b.model:
+            models = [run_a.model, run_b.model]
+            now = datetime.utcnow()
+            # INSERT берет блокировку записи SQLite до коммита: рейтинги читаются и
+            # меняются без гонки с другими сравнениями, а изменение — приращением,
+            # а не записью прочитанного значения
+            self.session.execute(
+                insert(EloRating.__table__).prefix_with("OR IGNORE"),
+                [{"model": model, "rating": ELO_INITIAL, "comparisons": 0, "updated_at": now} for model in models]
+            )
+            ratings = dict(self.session.execute(
+                select(EloRating.model, EloRating.rating).where(EloRating.model.in_(models))
+            ).all())
+            new_a, _ = elo_update(ratings[run_a.model], ratings[run_b.model], {"a": 1.0, "b": 0.0, "draw": 0.5}[winner])
+            delta = new_a - ratings[run_a.model]
+            for model, change in ((run_a.model, delta), (run_b.model, -delta)):
+                self.session.execute(
+                    update(EloRating.__table__).where(EloRating.model == model).values(
+                        rating=EloRating.rating + change, comparisons=EloRating.comparisons + 1, updated_at=now
+                    )
+                )
+        self.session.commit()
+        return judgment
+    
+    @traced("db.pairwise.next_pair")
+    def next_pair(self, task_id: str = None) -> Optional[Tuple[Run, Run]]:
+        """
+        Случайная пара успешных ответов разных моделей на одну задачу.
+        Первый ответ выбирается по случайному rowid, без сортировки всей таблицы.
+        """
+        rowid = literal_column("runs.rowid")
+        query = self.session.query(Run).filter(Run.error.is_(None), Run.response_text.isnot(None))
+        if task_id:
+            query = query.filter(Run.task_id == task_id)
+        for _ in range(5):
+            if task_id:
+                first = query.order_by(func.random()).first()
+            else:
+                max_rowid = self.session.query(func.max(rowid)).select_from(Run).scalar()
+                if not max_rowid:
+                    return None
+                first = query.filter(rowid >= func.abs(func.random()) % max_rowid).order_by(rowid).first()
+            if first is None:
+                continue
+            second = self.session.query(Run).filter(
+                Run.task_id == first.task_id, Run.model != first.model, Run.error.is_(None), Run.response_text.isnot(None)
+            ).order_by(func.random()).first()
+            if second is not None:
+                return (first, second) if uuid.uuid4().int % 2 else (second, first)
+        return None
+    
+    @traced("db.pairwise.count_judgments")
+    def count_judgments(self) -> int:
+        """Количество сравнений"""
+        return self.session.query(func.count(Pairwise.id)).scalar()
+    
+    @traced("db.pairwise.get_elo_ratings")
+    def get_elo_ratings(self) -> List[EloRating]:
+        """Онлайн рейтинги Elo по убыванию"""
+        return self.session.query(EloRating).order_by(desc(EloRating.rating)).all()
+    
+    @traced("db.pairwise.get_leaderboard")
+    def get_leaderboard(self, bootstrap: int = 200) -> list:
+        """
+        Рейтинг Bradley–Terry с бутстреп-интервалами (core.ranking.RankedModel).
+
+        Пересчитывается, только когда в pairwise появились новые строки
+        или часть удалена; иначе возвращается закэшированный результат.
+        """
+        from ..core.ranking import bradley_terry
+        
+        fingerprint = tuple(self.session.query(func.count(Pairwise.id), func.max(literal_column("pairwise.rowid"))).one())
+        key = (str(self.session.get_bind().url), bootstrap)
+        with _leaderboards_lock:
+            cached = _leaderboards.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        
+        # Сравнения группируются в SQL: в Python приходят только уникальные исходы
+        score_a = case((Pairwise.winner_run == Pairwise.run_a, 1.0), (Pairwise.winner_run == "draw", 0.5), else_=0.0)
+        rows = self.session.query(Pairwise.model_a, Pairwise.model_b, score_a, func.count(Pairwise.id)).filter(
+            Pairwise.model_a != Pairwise.model_b
+        ).group_by(Pairwise.model_a, Pairwise.model_b, score_a).all()
+        leaderboard = bradley_terry(
+            [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], counts=[r[3] for r in rows], bootstrap=bootstrap
+        ) if rows else []
+        with _leaderboards_lock:
+            _leaderboards[key] = (fingerprint, leaderboard)
+        return leaderboard
+
+
 class DatabaseManager:
     """Менеджер для работы с базой данных"""
     
@@ -168,4 +665,21 @@ class DatabaseManager:
         """Получает репозиторий оценок"""
         if session is None:
             session = self.get_session()
-        return EvaluationRepository(session)
\ No newline at end of file
+        return EvaluationRepository(session)
+    
+    def get_score_repo(self, session: Session = None) -> ScoreRepository:
+        """Получает репозиторий автоматических метрик"""
+        if session is None:
+            session = self.get_session()
+        return ScoreRepository(session)
+    
+    def get_pairwise_repo(self, session: Session = None) -> PairwiseRepository:
+        """Получает репозиторий парных сравнений"""
+        if session is None:
+            session = self.get_session()
+        return PairwiseRepository(session)
+    
+    def get_writer(self):
+        """Получает общий писатель для конкурентной записи из воркеров"""
+        from .writer import get_database_writer
+        return get_database_writer()
\ No newline at end of file
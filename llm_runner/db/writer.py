@@ -0,0 +1,189 @@
+"""
+Единственный писатель в SQLite с групповыми коммитами
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import sessionmaker
+
+from .models import Run, create_engine_and_session, get_database_url
+from .repo import build_evaluation, build_run
+from ..core.metrics import get_metrics
+
+
+# Маркер остановки потока-писателя
+_STOP = object()
+
+
+class DatabaseWriter:
+    """
+    Фоновый поток, который владеет единственным соединением на запись.
+
+    Воркеры не открывают сессий на запись: они кладут готовые ORM объекты
+    в очередь и получают Future. Писатель забирает из очереди всё, что
+    накопилось (до max_batch объектов или flush_interval секунд),
+    и сохраняет пачку одним коммитом — один fsync вместо сотни.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[sessionmaker] = None,
+        max_batch: int = 256,
+        flush_interval: float = 0.05,
+        max_queue: int = 10000
+    ):
+        if session_factory is None:
+            _, session_factory = create_engine_and_session()
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "DatabaseWriter":
+        """Запускает поток-писатель (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="llm-runner-db-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, obj: Any) -> Future:
+        """Ставит ORM объект в очередь на запись, Future вернет сохраненный объект"""
+        self.start()
+        future: Future = Future()
+        self._queue.put((obj, future, time.perf_counter()))
+        return future
+
+    def submit_run(self, **kwargs) -> Future:
+        """Ставит в очередь новый запуск (аргументы как у RunRepository.create_run)"""
+        return self.submit(build_run(**kwargs))
+
+    def submit_evaluation(self, run_id: str, rating: int, comment: str = None) -> Future:
+        """Ставит в очередь новую оценку (запись в фоне, UI не ждет коммита)"""
+        return self.submit(build_evaluation(run_id, rating, comment))
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Ждет, пока будет закоммичено всё, что было поставлено в очередь до вызова"""
+        self.submit(None).result(timeout=timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Дописывает очередь и останавливает поток"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout=timeout)
+
+    @property
+    def pending(self) -> int:
+        """Количество объектов, ожидающих записи"""
+        return self._queue.qsize()
+
+    def _loop(self) -> None:
+        """Основной цикл: собирает пачку и коммитит ее"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(batch)
+            if stop:
+                return
+
+    def _commit_batch(self, batch: List[Tuple[Any, Future, float]]) -> None:
+        """Сохраняет пачку одним коммитом, при ошибке — по одному объекту"""
+        objects = [(obj, future) for obj, future, _ in batch if obj is not None]
+
+        metrics = get_metrics()
+        if metrics.enabled:
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                metrics.observe("db_writer_queue_wait_seconds", started - enqueued_at)
+            metrics.observe("db_writer_batch_size", len(objects))
+
+        if objects:
+            session = self.session_factory(expire_on_commit=False)
+            # cluster_id, назначенный dedup перед flush, может указывать на кластер
+            # из этой же пачки — при откате он должен назначаться заново
+            clusters = [obj.cluster_id if isinstance(obj, Run) else None for obj, _ in objects]
+            try:
+                commit_started = time.perf_counter()
+                session.add_all([obj for obj, _ in objects])
+                session.commit()
+                metrics.observe("db_write_seconds", time.perf_counter() - commit_started, path="writer")
+                session.expunge_all()
+                for obj, future in objects:
+                    future.set_result(obj)
+            except Exception as e:
+                session.rollback()
+                for (obj, _), cluster_id in zip(objects, clusters):
+                    if isinstance(obj, Run):
+                        obj.cluster_id = cluster_id
+                logger.warning(f"Ошибка группового коммита ({len(objects)} объектов): {e}, сохраняем по одному")
+                self._commit_one_by_one(session, objects)
+            finally:
+                session.close()
+
+        # Маркеры flush() завершаются после записи всего, что стояло перед ними
+        for obj, future, _ in batch:
+            if obj is None:
+                future.set_result(None)
+
+    def _commit_one_by_one(self, session, objects: List[Tuple[Any, Future]]) -> None:
+        """Сохраняет объекты по одному, чтобы одна плохая запись не роняла всю пачку"""
+        for obj, future in objects:
+            try:
+                session.add(obj)
+                session.commit()
+                session.expunge(obj)
+                future.set_result(obj)
+            except Exception as e:
+                session.rollback()
+                future.set_exception(e)
+
+
+_writers: Dict[str, DatabaseWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_database_writer() -> DatabaseWriter:
+    """Возвращает общий для процесса писатель текущей базы данных"""
+    database_url = get_database_url()
+    with _writers_lock:
+        writer = _writers.get(database_url)
+        if writer is None:
+            writer = DatabaseWriter().start()
+            _writers[database_url] = writer
+    return writer
+
+
+@atexit.register
+def _close_writers() -> None:
+    """Дописывает очереди всех писателей при завершении процесса"""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,114 @@
+"""
+Страница парного сравнения ответов (A/B) и рейтинга моделей
+"""
+import streamlit as st
+
+from llm_runner.db.models import init_database
+from llm_runner.db.repo import DatabaseManager
+
+
+def main():
+    st.header("⚖️ Сравнение A/B")
+
+    # Инициализируем БД
+    init_database()
+    db_manager = DatabaseManager()
+
+    tab1, tab2 = st.tabs(["⚖️ Сравнить", "🏆 Рейтинг"])
+
+    with tab1:
+        show_compare_form(db_manager)
+
+    with tab2:
+        show_leaderboard(db_manager)
+
+
+def show_compare_form(db_manager: DatabaseManager):
+    """Показывает два ответа на одну задачу без названий моделей"""
+    with db_manager.get_session() as session:
+        tasks = db_manager.get_task_repo(session).get_all_tasks()
+
+    task_options = {"Любая задача": None, **{f"{task.name} ({task.id[:8]})": task.id for task in tasks}}
+    task_id = task_options[st.selectbox("Задача:", list(task_options.keys()))]
+
+    # Пара хранится в сессии, чтобы не меняться при каждом перерендере
+    pair_key = f"ab_pair_{task_id}"
+    if pair_key not in st.session_state:
+        with db_manager.get_session() as session:
+            pair = db_manager.get_pairwise_repo(session).next_pair(task_id)
+            if pair:
+                session.expunge_all()
+        st.session_state[pair_key] = pair
+    pair = st.session_state[pair_key]
+
+    if not pair:
+        st.info("📊 Нет задач с успешными ответами хотя бы двух разных моделей")
+        return
+    run_a, run_b = pair
+
+    with st.expander("📝 Промпт", expanded=False):
+        for msg in run_a.messages:
+            st.markdown(f"**{msg['role']}:** {msg['content']}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### 🅰️ Ответ A")
+        st.markdown(run_a.response_text)
+    with col2:
+        st.markdown("### 🅱️ Ответ B")
+        st.markdown(run_b.response_text)
+
+    comment = st.text_input("Комментарий (опционально):", key=f"ab_comment_{run_a.id}_{run_b.id}")
+
+    col1, col2, col3, col4 = st.columns(4)
+    winner = None
+    with col1:
+        if st.button("🅰️ A лучше", type="primary", use_container_width=True):
+            winner = "a"
+    with col2:
+        if st.button("🟰 Ничья", use_container_width=True):
+            winner = "draw"
+    with col3:
+        if st.button("🅱️ B лучше", type="primary", use_container_width=True):
+            winner = "b"
+    with col4:
+        if st.button("⏭️ Пропустить", use_container_width=True):
+            del st.session_state[pair_key]
+            st.rerun()
+
+    if winner:
+        with db_manager.get_session() as session:
+            db_manager.get_pairwise_repo(session).create_judgment(run_a.id, run_b.id, winner, comment or None)
+        st.success(f"✅ Сохранено: A — {run_a.model}, B — {run_b.model}")
+        del st.session_state[pair_key]
+        st.rerun()
+
+
+def show_leaderboard(db_manager: DatabaseManager):
+    """Показывает рейтинги Bradley–Terry и Elo"""
+    with db_manager.get_session() as session:
+        pairwise_repo = db_manager.get_pairwise_repo(session)
+        total = pairwise_repo.count_judgments()
+        leaderboard = pairwise_repo.get_leaderboard()
+        elo = {rating.model: rating.rating for rating in pairwise_repo.get_elo_ratings()}
+
+    st.metric("Сравнений", total)
+    if not leaderboard:
+        st.info("📊 Сравнений между разными моделями пока нет")
+        return
+
+    st.markdown("**Bradley–Terry** с 95% бутстреп-интервалами и онлайн **Elo**")
+    st.dataframe(
+        [
+            {
+                "Модель": row.model,
+                "Bradley–Terry": round(row.score),
+                "95% ДИ": f"{row.ci_low:.0f} – {row.ci_high:.0f}",
+                "Elo": round(elo[row.model]) if row.model in elo else None,
+                "Сравнений": row.comparisons,
+                "Доля побед": f"{row.win_rate:.0%}"
+            }
+            for row in leaderboard
+        ],
+        use_container_width=True
+    )
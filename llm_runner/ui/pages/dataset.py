@@ -2,11 +2,7 @@
 Страница управления датасетом задач
 """
 import streamlit as st
-import sys
-import os
-
-# Добавляем путь к корню проекта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+import json
 
 from llm_runner.db.models import init_database
 from llm_runner.db.repo import DatabaseManager
@@ -56,6 +52,21 @@ def show_tasks_list(db_manager: DatabaseManager):
                 
                 st.markdown("**Шаблон промпта:**")
                 st.code(task.prompt_template, language="text")
+                
+                if task.vars_json:
+                    st.markdown("**Переменные:**")
+                    st.json(task.variables)
+                
+                reference = st.text_area(
+                    "Эталонный ответ (для автоматических метрик)",
+                    value=task.reference or "",
+                    key=f"reference_{task.id}"
+                )
+                if reference != (task.reference or "") and st.button("💾 Сохранить эталон", key=f"save_reference_{task.id}"):
+                    with db_manager.get_session() as session:
+                        db_manager.get_task_repo(session).update_reference(task.id, reference.strip())
+                    st.success("✅ Эталон сохранен, метрики запусков будут пересчитаны")
+                    st.rerun()
             
             with col2:
                 # Кнопка удаления
@@ -88,16 +99,53 @@ def show_add_task_form(db_manager: DatabaseManager):
             height=100
         )
         
-        submitted = st.form_submit_button("➕ Добавить задачу", type="primary")
+        vars_json = st.text_area(
+            "Переменные (JSON, опционально)",
+            placeholder='{"question": "О чем текст?", "text": "..."}',
+            height=100
+        )
+        
+        reference = st.text_area(
+            "Эталонный ответ (опционально)",
+            placeholder="Ожидаемый ответ: с ним сравниваются ответы моделей (exact match, F1, ROUGE-L, BLEU)",
+            height=100
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            submitted = st.form_submit_button("➕ Добавить задачу", type="primary")
+        with col2:
+            preview = st.form_submit_button("👁️ Превью подстановки")
+        
+        try:
+            variables = json.loads(vars_json) if vars_json.strip() else {}
+            vars_error = None if isinstance(variables, dict) else "ожидается JSON объект"
+        except json.JSONDecodeError as e:
+            variables, vars_error = {}, str(e)
+        
+        if preview:
+            if vars_error:
+                st.error(f"❌ Неверный JSON переменных: {vars_error}")
+            else:
+                from llm_runner.core.templates import build_prompt, compile_template
+                from llm_runner.db.models import Task
+                
+                draft = Task(prompt_template=prompt_template, input_text=input_text)
+                missing = [v for v in compile_template(prompt_template + "\n" + (input_text or "")).variables if v not in variables]
+                st.code(build_prompt(draft, variables), language="text")
+                if missing:
+                    st.warning(f"⚠️ Нет значений для переменных: {', '.join(missing)}")
         
         if submitted:
             if not name or not prompt_template:
                 st.error("❌ Заполните название и шаблон промпта")
+            elif vars_error:
+                st.error(f"❌ Неверный JSON переменных: {vars_error}")
             else:
                 try:
                     with db_manager.get_session() as session:
                         task_repo = db_manager.get_task_repo(session)
-                        task = task_repo.create_task(name, prompt_template, input_text)
+                        task = task_repo.create_task(name, prompt_template, input_text, variables, reference.strip())
                         st.success(f"✅ Задача '{task.name}' создана с ID: `{task.id}`")
                         st.rerun()
                 except Exception as e:
@@ -110,4 +158,5 @@ def show_add_task_form(db_manager: DatabaseManager):
 Название: Тест на понимание контекста
 Шаблон: Проанализируй следующий текст и ответь на вопрос: {question}
 Входной текст: Текст для анализа: {text}
+Переменные: {"question": "О чем этот текст?", "text": "..."}
 """, language="text")
\ No newline at end of file
@@ -1,17 +1,24 @@
 """
 Страница оценки результатов
 """
-import streamlit as st
-import sys
-import os
+from typing import Any, Dict
 
-# Добавляем путь к корню проекта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+import streamlit as st
 
 from llm_runner.db.models import init_database
 from llm_runner.db.repo import DatabaseManager
 
 
+QUEUE_KEY = "evaluation_queue"
+# Сколько запусков держать в очереди и когда дозагружать
+PREFETCH_SIZE = 20
+PREFETCH_REFILL_AT = 5
+EVALUATIONS_LIMIT = 200
+# Сколько пропущенных запусков исключать из дозагрузки: NOT IN не растет
+# всю сессию, самые старые пропущенные возвращаются в очередь
+SKIPPED_LIMIT = 100
+
+
 def main():
     st.header("⭐ Оценка результатов")
     
@@ -24,62 +31,141 @@ def main():
 
 def show_evaluation_interface(db_manager: DatabaseManager):
     """Показывает интерфейс для оценки результатов"""
+    queue = get_queue(db_manager)
+    stats = queue["stats"]
     
-    with db_manager.get_session() as session:
-        run_repo = db_manager.get_run_repo(session)
-        eval_repo = db_manager.get_evaluation_repo(session)
-        
-        # Получаем все запуски без ошибок
-        all_runs = run_repo.get_all_runs()
-        successful_runs = [r for r in all_runs if not r.error]
-        
-        # Получаем уже оцененные запуски
-        evaluated_run_ids = set()
-        for run in successful_runs:
-            eval_obj = eval_repo.get_evaluation_by_run_id(run.id)
-            if eval_obj:
-                evaluated_run_ids.add(run.id)
-        
-        # Фильтруем неоцененные
-        unevaluated_runs = [r for r in successful_runs if r.id not in evaluated_run_ids]
-    
-    if not successful_runs:
+    if not stats["total"]:
         st.info("📊 Нет успешных запусков для оценки")
         return
     
     # Статистика
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Всего запусков", len(successful_runs))
+        st.metric("Всего запусков", stats["total"])
     with col2:
-        st.metric("Оценено", len(evaluated_run_ids))
+        st.metric("Оценено", stats["evaluated"])
     with col3:
-        st.metric("Осталось", len(unevaluated_runs))
+        st.metric("Осталось", stats["remaining"])
     
     # Переключатель режима
     mode = st.radio(
         "Режим оценки:",
-        ["🎯 Оценить новые", "📊 Просмотреть все", "✏️ Редактировать оценки"],
+        ["🎯 Оценить новые", "📊 Просмотреть все", "✏️ Редактировать оценки", "🤖 Автоматические метрики"],
         horizontal=True
     )
     
     if mode == "🎯 Оценить новые":
-        show_unevaluated_runs(db_manager, unevaluated_runs)
+        show_unevaluated_runs(db_manager, queue)
     elif mode == "📊 Просмотреть все":
-        show_all_evaluations(db_manager, successful_runs)
+        show_all_evaluations(db_manager)
+    elif mode == "✏️ Редактировать оценки":
+        show_edit_evaluations(db_manager)
     else:
-        show_edit_evaluations(db_manager, successful_runs)
+        show_auto_scores(db_manager)
+
+
+def get_queue(db_manager: DatabaseManager) -> Dict[str, Any]:
+    """
+    Очередь оценки в session_state: предзагруженные запуски, счетчики и
+    оценки, отправленные писателю, но, возможно, еще не записанные
+    (run_id -> (запуск, Future)).
+    """
+    queue = st.session_state.get(QUEUE_KEY)
+    if queue is None:
+        with db_manager.get_session() as session:
+            stats = db_manager.get_evaluation_repo(session).get_stats()
+        queue = st.session_state[QUEUE_KEY] = {
+            "runs": [], "cluster_sizes": {}, "stats": stats, "skipped": {}, "pending": {}
+        }
+    
+    # Оценка, которую писатель не смог сохранить, возвращается в очередь
+    for run_id, (run, future) in list(queue["pending"].items()):
+        if future.done():
+            del queue["pending"][run_id]
+            if future.exception() is not None:
+                st.error(f"❌ Оценка не сохранена: {future.exception()}")
+                queue["runs"].insert(0, run)
+                if run.cluster_id in queue["cluster_sizes"]:
+                    queue["cluster_sizes"][run.cluster_id] += 1
+                queue["stats"]["evaluated"] -= 1
+                queue["stats"]["remaining"] += 1
+    
+    if len(queue["runs"]) < PREFETCH_REFILL_AT:
+        refill_queue(db_manager, queue)
+    return queue
+
 
+def refill_queue(db_manager: DatabaseManager, queue: Dict[str, Any]) -> None:
+    """
+    Дозагружает следующие PREFETCH_SIZE запусков одним запросом.
 
-def show_unevaluated_runs(db_manager: DatabaseManager, runs):
-    """Показывает неоцененные запуски"""
+    Оцененные запуски отсекает анти-join, исключать нужно только те, что
+    уже в работе: в очереди, с незаписанной оценкой и последние пропущенные.
+    """
+    exclude = set(queue["skipped"]) | set(queue["pending"]) | {run.id for run in queue["runs"]}
+    with db_manager.get_session() as session:
+        eval_repo = db_manager.get_evaluation_repo(session)
+        runs = eval_repo.get_unevaluated_runs(PREFETCH_SIZE - len(queue["runs"]), exclude_ids=list(exclude))
+        queue["runs"].extend(runs)
+        cluster_ids = list({run.cluster_id for run in queue["runs"] if run.cluster_id})
+        queue["cluster_sizes"] = eval_repo.count_unevaluated_by_cluster(cluster_ids)
+        session.expunge_all()
+
+
+def rate_run(db_manager: DatabaseManager, run_id: str, rating: int) -> None:
+    """
+    Оценивает текущий запуск (колбэк кнопок, выполняется до перерисовки).
+
+    Оценка уходит писателю в фоне, страница сразу показывает следующий
+    запуск из очереди; оценка кластера записывается синхронно.
+    """
+    queue = st.session_state[QUEUE_KEY]
+    comment = st.session_state.get(f"comment_{run_id}") or None
+    run = next((r for r in queue["runs"] if r.id == run_id), None)
+    if run is None:
+        return
+    writer = db_manager.get_writer()
+    
+    if run.cluster_id and st.session_state.get(f"cluster_{run_id}"):
+        # Анти-join кластера должен видеть оценки, отправленные раньше
+        writer.flush()
+        with db_manager.get_session() as session:
+            count = db_manager.get_evaluation_repo(session).evaluate_cluster(run_id, rating, comment)
+        queue["runs"] = [r for r in queue["runs"] if r.cluster_id != run.cluster_id]
+        queue["cluster_sizes"].pop(run.cluster_id, None)
+    else:
+        queue["pending"][run_id] = (run, writer.submit_evaluation(run_id, rating, comment))
+        queue["runs"] = [r for r in queue["runs"] if r.id != run_id]
+        if run.cluster_id in queue["cluster_sizes"]:
+            queue["cluster_sizes"][run.cluster_id] -= 1
+        count = 1
+    queue["stats"]["evaluated"] += count
+    queue["stats"]["remaining"] -= count
+
+
+def skip_run(run_id: str) -> None:
+    """Откладывает запуск (пока он среди последних SKIPPED_LIMIT пропущенных)"""
+    queue = st.session_state[QUEUE_KEY]
+    skipped = queue["skipped"]
+    skipped[run_id] = None
+    while len(skipped) > SKIPPED_LIMIT:
+        del skipped[next(iter(skipped))]
+    queue["runs"] = [r for r in queue["runs"] if r.id != run_id]
+
+
+def reset_queue() -> None:
+    st.session_state.pop(QUEUE_KEY, None)
+
+
+def show_unevaluated_runs(db_manager: DatabaseManager, queue: Dict[str, Any]):
+    """Показывает следующий неоцененный запуск из очереди"""
+    runs = queue["runs"]
     if not runs:
         st.success("🎉 Все запуски оценены!")
         return
     
-    st.subheader(f"Оценить новые ({len(runs)} запусков)")
+    st.subheader(f"Оценить новые ({queue['stats']['remaining']} запусков)")
     
-    # Показываем первый неоцененный запуск
     run = runs[0]
     
     with st.container():
@@ -93,94 +179,64 @@ def show_unevaluated_runs(db_manager: DatabaseManager, runs):
             st.markdown(f"**Токены:** {run.total_tokens or 0}")
             st.markdown(f"**Дата:** {run.started_at.strftime('%d.%m.%Y %H:%M')}")
         with col2:
-            st.markdown(f"**Прогресс:** {len(runs)} осталось")
+            st.markdown(f"**Прогресс:** {queue['stats']['remaining']} осталось")
+            if queue["pending"]:
+                st.caption(f"💾 Сохраняется: {len(queue['pending'])}")
+        
+        # Почти одинаковые неоцененные ответы (индекс дублей)
+        duplicates = queue["cluster_sizes"].get(run.cluster_id, 1) - 1 if run.cluster_id else 0
         
         # Показываем промпт
         with st.expander("📝 Промпт", expanded=False):
-            messages = eval(run.messages_json) if run.messages_json else []
-            for msg in messages:
+            for msg in run.messages:
                 st.markdown(f"**{msg['role']}:** {msg['content']}")
         
         # Показываем ответ
         st.markdown("### 📄 Ответ модели:")
         st.markdown(run.response_text)
         
-        # Форма оценки
+        # Оценка: кнопка сразу сохраняет и показывает следующий запуск
         st.markdown("---")
-        with st.form(f"evaluate_{run.id}"):
-            st.markdown("### ⭐ Оцените качество ответа:")
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                rating = st.selectbox(
-                    "Оценка (1-5):",
-                    [1, 2, 3, 4, 5],
-                    format_func=lambda x: f"{x} - {'Плохо' if x == 1 else 'Отлично' if x == 5 else 'Средне'}",
-                    key=f"rating_{run.id}"
-                )
-            
-            with col2:
-                # Быстрые кнопки
-                st.markdown("**Быстрая оценка:**")
-                if st.form_submit_button("1️⃣", help="Плохо"):
-                    rating = 1
-                if st.form_submit_button("2️⃣", help="Ниже среднего"):
-                    rating = 2
-                if st.form_submit_button("3️⃣", help="Средне"):
-                    rating = 3
-                if st.form_submit_button("4️⃣", help="Хорошо"):
-                    rating = 4
-                if st.form_submit_button("5️⃣", help="Отлично"):
-                    rating = 5
-            
-            comment = st.text_area(
-                "Комментарий (опционально):",
-                placeholder="Опишите, что понравилось или не понравилось в ответе...",
-                key=f"comment_{run.id}"
+        st.markdown("### ⭐ Оцените качество ответа:")
+        
+        st.text_area(
+            "Комментарий (опционально):",
+            placeholder="Опишите, что понравилось или не понравилось в ответе...",
+            key=f"comment_{run.id}"
+        )
+        
+        if duplicates > 0:
+            st.checkbox(
+                f"🔁 Применить оценку ко всем почти одинаковым ответам ({duplicates})",
+                value=True,
+                key=f"cluster_{run.id}"
             )
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                submit_eval = st.form_submit_button("💾 Сохранить оценку", type="primary")
-            with col2:
-                skip = st.form_submit_button("⏭️ Пропустить")
-            with col3:
-                if st.form_submit_button("🔄 Обновить"):
-                    st.rerun()
-            
-            if submit_eval:
-                with db_manager.get_session() as session:
-                    eval_repo = db_manager.get_evaluation_repo(session)
-                    eval_repo.create_evaluation(run.id, rating, comment)
-                    st.success("✅ Оценка сохранена!")
-                    st.rerun()
-            
-            if skip:
-                st.info("⏭️ Запуск пропущен")
-                st.rerun()
+        
+        labels = {1: "Плохо", 2: "Ниже среднего", 3: "Средне", 4: "Хорошо", 5: "Отлично"}
+        columns = st.columns(7)
+        for rating, column in zip(range(1, 6), columns):
+            with column:
+                st.button(
+                    f"{rating}️⃣", help=labels[rating], key=f"rate_{rating}_{run.id}",
+                    on_click=rate_run, args=(db_manager, run.id, rating), use_container_width=True
+                )
+        with columns[5]:
+            st.button("⏭️ Пропустить", key=f"skip_{run.id}", on_click=skip_run, args=(run.id,), use_container_width=True)
+        with columns[6]:
+            st.button("🔄 Обновить", key="refresh_queue", on_click=reset_queue, use_container_width=True)
 
 
-def show_all_evaluations(db_manager: DatabaseManager, runs):
-    """Показывает все оценки"""
-    st.subheader("Все оценки")
+def show_all_evaluations(db_manager: DatabaseManager):
+    """Показывает последние оценки"""
+    st.subheader(f"Последние оценки (до {EVALUATIONS_LIMIT})")
     
     with db_manager.get_session() as session:
-        eval_repo = db_manager.get_evaluation_repo(session)
-        
-        # Получаем оценки
-        evaluations = []
-        for run in runs:
-            eval_obj = eval_repo.get_evaluation_by_run_id(run.id)
-            if eval_obj:
-                evaluations.append((run, eval_obj))
+        evaluations = db_manager.get_evaluation_repo(session).get_evaluated_runs(EVALUATIONS_LIMIT)
     
     if not evaluations:
         st.info("📊 Оценок пока нет")
         return
     
-    # Сортируем по дате оценки
-    evaluations.sort(key=lambda x: x[1].created_at, reverse=True)
-    
     # Статистика
     ratings = [eval_obj.rating for _, eval_obj in evaluations]
     avg_rating = sum(ratings) / len(ratings) if ratings else 0
@@ -220,19 +276,12 @@ def show_all_evaluations(db_manager: DatabaseManager, runs):
                 st.markdown(f"**Дата оценки:** {eval_obj.created_at.strftime('%d.%m.%Y %H:%M')}")
 
 
-def show_edit_evaluations(db_manager: DatabaseManager, runs):
+def show_edit_evaluations(db_manager: DatabaseManager):
     """Показывает интерфейс редактирования оценок"""
     st.subheader("Редактировать оценки")
     
     with db_manager.get_session() as session:
-        eval_repo = db_manager.get_evaluation_repo(session)
-        
-        # Получаем оценки
-        evaluations = []
-        for run in runs:
-            eval_obj = eval_repo.get_evaluation_by_run_id(run.id)
-            if eval_obj:
-                evaluations.append((run, eval_obj))
+        evaluations = db_manager.get_evaluation_repo(session).get_evaluated_runs(EVALUATIONS_LIMIT)
     
     if not evaluations:
         st.info("📊 Оценок для редактирования нет")
@@ -263,4 +312,43 @@ def show_edit_evaluations(db_manager: DatabaseManager, runs):
                 eval_repo = db_manager.get_evaluation_repo(session)
                 eval_repo.update_evaluation(selected_run.id, new_rating, new_comment)
                 st.success("✅ Оценка обновлена!")
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+def show_auto_scores(db_manager: DatabaseManager):
+    """Показывает автоматические метрики относительно эталонов задач"""
+    st.subheader("Автоматические метрики")
+    
+    with db_manager.get_session() as session:
+        score_repo = db_manager.get_score_repo(session)
+        pending = score_repo.count_pending()
+        model_scores = score_repo.get_model_scores()
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown(f"**Ожидают подсчета:** {pending} запусков (задачи с эталонным ответом)")
+    with col2:
+        if st.button("🧮 Посчитать", disabled=pending == 0, type="primary"):
+            with st.spinner("Считаем метрики..."):
+                with db_manager.get_session() as session:
+                    scored = db_manager.get_score_repo(session).score_pending()
+            st.success(f"✅ Посчитано для {scored} запусков")
+            st.rerun()
+    
+    if not model_scores:
+        st.info("📊 Метрик пока нет. Добавьте эталонный ответ задаче на странице Dataset")
+        return
+    
+    st.dataframe(
+        [
+            {
+                "Модель": row["model"],
+                "Запусков": row["runs"],
+                "Exact match": round(row["exact_match"], 3),
+                "Token F1": round(row["token_f1"], 3),
+                "ROUGE-L": round(row["rouge_l"], 3),
+                "BLEU": round(row["bleu"], 3)
+            }
+            for row in model_scores
+        ],
+        use_container_width=True
+    )
@@ -2,17 +2,15 @@
 Страница истории запусков
 """
 import streamlit as st
-import sys
-import os
-import json
-
-# Добавляем путь к корню проекта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
+from llm_runner.db import archive
 from llm_runner.db.models import init_database
 from llm_runner.db.repo import DatabaseManager
 
 
+SEARCH_PAGE_SIZE = 50
+
+
 def main():
     st.header("📋 История запусков")
     
@@ -26,24 +24,54 @@ def main():
 def show_history_interface(db_manager: DatabaseManager):
     """Показывает интерфейс истории запусков"""
     
+    # Полнотекстовый поиск (FTS5) вместо прокрутки всех запусков
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search_query = st.text_input("🔎 Поиск", placeholder="Слова из ответа модели или промпта задачи")
+    with col2:
+        search_scope = st.selectbox("Искать в", ["Ответах", "Задачах"])
+    
+    snippets = {}
     with db_manager.get_session() as session:
         run_repo = db_manager.get_run_repo(session)
         eval_repo = db_manager.get_evaluation_repo(session)
         task_repo = db_manager.get_task_repo(session)
         
-        runs = run_repo.get_all_runs()
+        if search_query.strip():
+            in_tasks = search_scope == "Задачах"
+            total_found = run_repo.count_search_runs(search_query, in_tasks=in_tasks)
+            pages = max(1, (total_found + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE)
+            page = st.number_input(f"Страница (из {pages})", 1, pages, 1) if pages > 1 else 1
+            hits = run_repo.search_runs(
+                search_query, limit=SEARCH_PAGE_SIZE, offset=(page - 1) * SEARCH_PAGE_SIZE, in_tasks=in_tasks
+            )
+            runs = [hit.item for hit in hits]
+            snippets = {hit.item.id: hit.snippet for hit in hits}
+            st.caption(f"Найдено: {total_found}, по релевантности")
+            if not runs:
+                st.info("🔎 Ничего не найдено")
+                return
+        else:
+            include_archived = archive.has_archive() and st.checkbox(
+                "🗄️ Включая архив", help="Запуски, перенесенные в Parquet архив (python -m llm_runner.db.archive)"
+            )
+            runs = run_repo.get_all_runs(include_archived=include_archived)
     
     if not runs:
         st.info("📊 Запусков пока нет")
         return
     
+    def get_evaluation(run):
+        # Оценки архивных запусков читаются из архива вместе с ними
+        return run.evaluation if run.archived else eval_repo.get_evaluation_by_run_id(run.id)
+    
     # Статистика
     successful_runs = [r for r in runs if not r.error]
     failed_runs = [r for r in runs if r.error]
     evaluated_runs = 0
     
     for run in successful_runs:
-        if eval_repo.get_evaluation_by_run_id(run.id):
+        if get_evaluation(run):
             evaluated_runs += 1
     
     col1, col2, col3, col4 = st.columns(4)
@@ -82,9 +110,9 @@ def show_history_interface(db_manager: DatabaseManager):
     elif selected_status == "С ошибкой":
         filtered_runs = [r for r in filtered_runs if r.error]
     if selected_eval_status == "Оценено":
-        filtered_runs = [r for r in filtered_runs if not r.error and eval_repo.get_evaluation_by_run_id(r.id)]
+        filtered_runs = [r for r in filtered_runs if not r.error and get_evaluation(r)]
     elif selected_eval_status == "Не оценено":
-        filtered_runs = [r for r in filtered_runs if not r.error and not eval_repo.get_evaluation_by_run_id(r.id)]
+        filtered_runs = [r for r in filtered_runs if not r.error and not get_evaluation(r)]
     
     st.markdown(f"### 📊 Результаты ({len(filtered_runs)} из {len(runs)})")
     
@@ -95,7 +123,7 @@ def show_history_interface(db_manager: DatabaseManager):
         task_name = task.name if task else "Неизвестная задача"
         
         # Получаем оценку
-        evaluation = eval_repo.get_evaluation_by_run_id(run.id) if not run.error else None
+        evaluation = get_evaluation(run) if not run.error else None
         
         # Определяем цвет и иконку
         if run.error:
@@ -116,6 +144,8 @@ def show_history_interface(db_manager: DatabaseManager):
             col1, col2 = st.columns([2, 1])
             
             with col1:
+                if run.id in snippets:
+                    st.markdown(f"🔎 {snippets[run.id]}")
                 st.markdown(f"**Задача:** {task_name}")
                 st.markdown(f"**Модель:** {run.model}")
                 st.markdown(f"**Время:** {run.latency_ms}ms")
@@ -133,8 +163,10 @@ def show_history_interface(db_manager: DatabaseManager):
                     st.info("⏳ Ожидает оценки")
             
             with col2:
-                # Кнопки действий
-                if not run.error:
+                # Кнопки действий (архив только для чтения)
+                if run.archived:
+                    st.caption("🗄️ Из архива")
+                elif not run.error:
                     if not evaluation:
                         if st.button("⭐ Оценить", key=f"eval_{run.id}"):
                             st.session_state[f"evaluate_run_{run.id}"] = True
@@ -153,14 +185,12 @@ def show_history_interface(db_manager: DatabaseManager):
                 # Параметры
                 if run.params_json:
                     st.markdown("**Параметры:**")
-                    params = json.loads(run.params_json)
-                    st.json(params)
+                    st.json(run.params)
                 
                 # Сообщения
                 if run.messages_json:
                     st.markdown("**Сообщения:**")
-                    messages = json.loads(run.messages_json)
-                    for i, msg in enumerate(messages):
+                    for i, msg in enumerate(run.messages):
                         st.markdown(f"**{i+1}. {msg['role']}:**")
                         st.text(msg['content'])
                 
@@ -172,7 +202,7 @@ def show_history_interface(db_manager: DatabaseManager):
                 # Сырой JSON
                 if run.response_json:
                     st.markdown("**Сырой JSON ответ:**")
-                    st.json(json.loads(run.response_json))
+                    st.json(run.response)
             
             # Форма оценки
             if st.session_state.get(f"evaluate_run_{run.id}", False):
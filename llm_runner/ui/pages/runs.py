@@ -2,17 +2,17 @@
 Страница запуска задач на моделях
 """
 import streamlit as st
-import sys
 import os
 import json
+import time
 from datetime import datetime
 
-# Добавляем путь к корню проекта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
-
 from llm_runner.db.models import init_database
 from llm_runner.db.repo import DatabaseManager
-from llm_runner.core.providers.comet import CometProvider
+
+
+# Модели для быстрого выбора (любые другие можно ввести вручную)
+DEFAULT_MODELS = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo", "gpt-4o", "gpt-4o-mini"]
 
 
 def main():
@@ -29,12 +29,15 @@ def main():
         return
     
     # Создаем вкладки
-    tab1, tab2 = st.tabs(["🎯 Запустить задачу", "📊 Результаты"])
+    tab1, tab2, tab3 = st.tabs(["🎯 Запустить задачу", "🧪 Перебор параметров", "📊 Результаты"])
     
     with tab1:
         show_run_form(db_manager)
     
     with tab2:
+        show_sweep_form(db_manager)
+    
+    with tab3:
         show_results(db_manager)
 
 
@@ -71,50 +74,106 @@ def show_run_form(db_manager: DatabaseManager):
         
         col1, col2 = st.columns(2)
         with col1:
-            model = st.text_input("Модель", value="gpt-3.5-turbo", help="Название модели (gpt-3.5-turbo, gpt-4, etc.)")
+            selected_models = st.multiselect(
+                "Модели",
+                DEFAULT_MODELS,
+                default=["gpt-3.5-turbo"],
+                help="Несколько моделей запускаются параллельно и показываются рядом"
+            )
+            extra_models = st.text_input("Другие модели", placeholder="Разделите запятыми")
         with col2:
             temperature = st.slider("Temperature", 0.0, 2.0, 0.7, 0.1)
         
-        col3, col4 = st.columns(2)
+        col3, col4, col5 = st.columns(3)
         with col3:
             max_tokens = st.number_input("Max tokens", 1, 4000, 1000)
         with col4:
             top_p = st.slider("Top P", 0.0, 1.0, 0.9, 0.1)
+        with col5:
+            n = st.number_input("Сэмплов (n)", 1, 20, 1, help="Все сэмплы запрашиваются одним вызовом API и сохраняются отдельными запусками")
         
         # Дополнительные параметры
         with st.expander("⚙️ Дополнительные параметры"):
             stop = st.text_input("Stop sequences", placeholder="Разделите запятыми")
             seed = st.number_input("Seed (опционально)", value=None, min_value=1)
         
+        with st.expander("🧪 Профили параметров"):
+            profiles_json = st.text_area(
+                "Профили (JSON)",
+                placeholder='{"точный": {"temperature": 0.0}, "креативный": {"temperature": 1.2, "top_p": 1.0}}',
+                help="Каждый профиль переопределяет параметры выше и запускается на каждой выбранной модели"
+            )
+        
+        with st.expander("💰 Бюджет запуска"):
+            col1, col2 = st.columns(2)
+            with col1:
+                budget_tokens = st.number_input("Лимит токенов (0 — без лимита)", 0, 100_000_000, 0, 1000)
+            with col2:
+                budget_usd = st.number_input("Лимит USD (0 — без лимита)", 0.0, 10_000.0, 0.0, 0.5)
+            st.caption("Оценка резервируется до отправки и сверяется с фактическим usage; действует и дневной лимит из .env")
+        
         # Формирование промпта
         st.markdown("### 📝 Формирование промпта")
         
-        # Простая подстановка переменных
-        final_prompt = selected_task.prompt_template
-        if selected_task.input_text:
-            final_prompt += "\n\n" + selected_task.input_text
+        # Подстановка переменных задачи в шаблон и входной текст
+        from llm_runner.core.templates import build_prompt
+        final_prompt = build_prompt(selected_task)
         
         st.markdown("**Финальный промпт:**")
         st.code(final_prompt, language="text")
         
+        # Локальная оценка токенов и стоимости до отправки
+        from llm_runner.core.tokens import estimate_batch
+        for model in selected_models:
+            estimate = estimate_batch([final_prompt], model, {"max_tokens": max_tokens, "n": n})
+            cost = f", до ${estimate.cost_usd:.4f}" if estimate.cost_usd is not None else ""
+            warning = " ⚠️ не помещается в контекст" if estimate.over_context else ""
+            st.caption(f"{model}: ~{estimate.prompt_tokens} токенов промпта, до {estimate.completion_tokens} токенов ответа{cost}{warning}")
+        
         # Кнопка запуска
         submitted = st.form_submit_button("🚀 Запустить", type="primary")
         
         if submitted:
-            run_task(
-                db_manager, 
-                selected_task, 
-                model, 
-                final_prompt,
+            from llm_runner.core.runner import build_jobs
+            
+            models = list(dict.fromkeys(
+                selected_models + [m.strip() for m in extra_models.split(',') if m.strip()]
+            ))
+            params = dict(
                 temperature=temperature,
                 max_tokens=max_tokens,
                 top_p=top_p,
                 stop=stop.split(',') if stop else None,
                 seed=seed
             )
+            if n > 1:
+                params["n"] = int(n)
+            
+            try:
+                overrides = json.loads(profiles_json) if profiles_json.strip() else {}
+            except json.JSONDecodeError as e:
+                st.error(f"❌ Неверный JSON профилей: {e}")
+                return
+            if not isinstance(overrides, dict) or not all(isinstance(v, dict) for v in overrides.values()):
+                st.error('❌ Профили — JSON объект вида {"имя": {"temperature": 0.2}, ...}')
+                return
+            profiles = {name: {**params, **values} for name, values in overrides.items()} or {"default": params}
+            
+            from llm_runner.core.budget import BatchBudget
+            from llm_runner.core.scheduler import INTERACTIVE
+            budget = BatchBudget(max_tokens=budget_tokens or None, max_cost_usd=budget_usd or None)
+            
+            # Человек ждет ответа — запросы идут в очереди лимита раньше батчей
+            jobs = build_jobs(models, profiles, priority=INTERACTIVE, flow=f"ui:{budget.batch_id}")
+            if not jobs:
+                st.error("❌ Выберите хотя бы одну модель")
+            elif len(jobs) == 1:
+                run_task(db_manager, selected_task, jobs[0].model, final_prompt, budget=budget, **jobs[0].params)
+            else:
+                run_fanout(db_manager, selected_task, final_prompt, jobs, budget=budget)
 
 
-def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, **params):
+def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, budget=None, **params):
     """Запускает задачу на модели"""
     
     # Показываем прогресс
@@ -126,7 +185,9 @@ def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, **param
         status_text.text("🔧 Инициализация Comet API...")
         progress_bar.progress(20)
         
-        provider = CometProvider()
+        # httpx и провайдер импортируются только при первом запуске
+        from llm_runner.core.providers.pool import provider_from_env
+        provider = provider_from_env()
         
         # Проверяем модель
         status_text.text("🔍 Проверка доступности модели...")
@@ -136,14 +197,24 @@ def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, **param
             st.error(f"❌ Модель '{model}' недоступна или неверное название")
             return
         
+        from llm_runner.core.runner import RunJob, generate_safely, is_deferred, result_to_runs
+        from llm_runner.core.scheduler import INTERACTIVE
+        
         # Формируем сообщения
         messages = [{"role": "user", "content": prompt}]
         
-        # Запускаем генерацию
+        # Запускаем генерацию (с локальной проверкой размера контекста)
         status_text.text("🚀 Отправка запроса к модели...")
         progress_bar.progress(60)
         
-        result = provider.generate(messages, model, **params)
+        job = RunJob(model=model, params=params, priority=INTERACTIVE, flow="ui")
+        result = generate_safely(provider, messages, job, budget)
+        
+        if is_deferred(result):
+            progress_bar.empty()
+            status_text.empty()
+            st.warning(f"⏸️ Запрос не отправлен: {result.error}")
+            return
         
         progress_bar.progress(80)
         
@@ -152,19 +223,9 @@ def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, **param
         
         with db_manager.get_session() as session:
             run_repo = db_manager.get_run_repo(session)
-            run = run_repo.create_run(
-                task_id=task.id,
-                provider="comet",
-                model=model,
-                params=params,
-                messages=messages,
-                response_text=result.text,
-                response_json=result.raw,
-                error=result.error,
-                latency_ms=result.latency_ms,
-                usage=result.usage,
-                finish_reason=result.finish_reason
-            )
+            # При n > 1 каждый сэмпл сохраняется отдельным запуском
+            for run_kwargs in result_to_runs(task.id, "comet", model, params, messages, result):
+                run_repo.create_run(**run_kwargs)
         
         progress_bar.progress(100)
         status_text.text("✅ Готово!")
@@ -187,8 +248,14 @@ def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, **param
                 st.metric("Завершение", result.finish_reason or "N/A")
             
             # Показываем ответ
-            st.markdown("### 📄 Ответ модели:")
-            st.markdown(result.text)
+            if len(result.choices) > 1:
+                st.markdown(f"### 📄 Ответы модели ({len(result.choices)} сэмплов):")
+                for sample_tab, choice in zip(st.tabs([f"#{c['index'] + 1}" for c in result.choices]), result.choices):
+                    with sample_tab:
+                        st.markdown(choice["text"] or "")
+            else:
+                st.markdown("### 📄 Ответ модели:")
+                st.markdown(result.text)
             
             # Показываем сырой JSON
             with st.expander("🔍 Сырой JSON ответ"):
@@ -202,6 +269,211 @@ def run_task(db_manager: DatabaseManager, task, model: str, prompt: str, **param
         status_text.text("")
 
 
+def run_fanout(db_manager: DatabaseManager, task, prompt: str, jobs, budget=None):
+    """Запускает задачу на нескольких моделях параллельно и показывает ответы рядом"""
+    from llm_runner.core.providers.pool import provider_from_env
+    from llm_runner.core.runner import fan_out, is_deferred, result_to_runs
+    
+    try:
+        provider = provider_from_env()
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+    
+    writer = db_manager.get_writer()
+    messages = [{"role": "user", "content": prompt}]
+    
+    st.markdown("### ⚖️ Сравнение моделей")
+    
+    # Сетка карточек: ответы появляются по мере готовности
+    columns_per_row = min(len(jobs), 4)
+    placeholders = {}
+    for row_start in range(0, len(jobs), columns_per_row):
+        columns = st.columns(columns_per_row)
+        for index, column in enumerate(columns, start=row_start):
+            if index >= len(jobs):
+                break
+            with column:
+                st.markdown(f"**🤖 {jobs[index].label}**")
+                placeholders[index] = st.empty()
+                placeholders[index].info("⏳ Ожидание ответа...")
+    
+    job_indexes = {id(job): index for index, job in enumerate(jobs)}
+    progress_bar = st.progress(0)
+    started = time.perf_counter()
+    
+    deferred = 0
+    for done, (job, result) in enumerate(fan_out(provider, messages, jobs, budget=budget), start=1):
+        if is_deferred(result):
+            # Запрос не отправлялся — это пауза, а не ошибка запуска
+            deferred += 1
+            placeholders[job_indexes[id(job)]].warning(f"⏸️ Не отправлен: {result.error}")
+            progress_bar.progress(done / len(jobs))
+            continue
+        
+        # Запись идет через общий писатель, поток UI не ждет коммита
+        for run_kwargs in result_to_runs(task.id, "comet", job.model, job.params, messages, result):
+            writer.submit_run(**run_kwargs)
+        
+        with placeholders[job_indexes[id(job)]].container():
+            if result.error:
+                st.error(f"❌ {result.error}")
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Время", f"{result.latency_ms}ms")
+                with col2:
+                    st.metric("Токены", result.usage.get('total_tokens', 0))
+                if len(result.choices) > 1:
+                    for sample_tab, choice in zip(st.tabs([f"#{c['index'] + 1}" for c in result.choices]), result.choices):
+                        with sample_tab:
+                            st.markdown(choice["text"] or "")
+                else:
+                    st.markdown(result.text or "")
+        
+        progress_bar.progress(done / len(jobs))
+    
+    writer.flush()
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    st.success(f"✅ {len(jobs) - deferred} запусков завершено за {elapsed_ms}ms")
+    if deferred:
+        st.warning(f"⏸️ {deferred} запусков отложено (бюджет или временно отключенная модель)")
+
+
+def show_sweep_form(db_manager: DatabaseManager):
+    """Показывает форму перебора параметров с ранней остановкой"""
+    st.subheader("Перебор параметров (successive halving)")
+    
+    with db_manager.get_session() as session:
+        tasks = db_manager.get_task_repo(session).get_all_tasks()
+    
+    if not tasks:
+        st.warning("📝 Сначала создайте задачи в разделе Dataset")
+        return
+    
+    with st.form("sweep_form"):
+        task_options = {f"{task.name} (ID: {task.id[:8]}...)": task for task in tasks}
+        selected_task_names = st.multiselect(
+            "Задачи для оценки",
+            list(task_options.keys()),
+            default=list(task_options.keys())[:1],
+            help="Каждая конфигурация проходит выбранные задачи по кругу"
+        )
+        models = st.multiselect("Модели", DEFAULT_MODELS, default=["gpt-3.5-turbo"])
+        
+        st.markdown("### 📐 Пространство параметров")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            temperature_range = st.slider("Temperature", 0.0, 2.0, (0.0, 1.2), 0.1)
+            temperature_steps = st.number_input("Точек temperature", 1, 10, 4)
+        with col2:
+            top_p_range = st.slider("Top P", 0.0, 1.0, (0.5, 1.0), 0.05)
+            top_p_steps = st.number_input("Точек top_p", 1, 10, 2)
+        with col3:
+            max_tokens_values = st.text_input("Max tokens", value="256, 1000", help="Значения через запятую")
+            mode = st.radio("Режим", ["Сетка", "Случайный"], horizontal=True)
+            random_count = st.number_input("Конфигураций (случайный режим)", 2, 200, 16)
+        
+        st.markdown("### 🏁 Ранняя остановка и бюджет")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            eta = st.number_input("Во сколько раз сокращать (eta)", 2, 4, 2)
+            initial_samples = st.number_input("Запросов на конфигурацию в 1-м раунде", 1, 10, 1)
+        with col2:
+            token_budget = st.number_input("Бюджет токенов (0 — без ограничения)", 0, 10_000_000, 50_000, 1000)
+        with col3:
+            keywords = st.text_input(
+                "Ключевые слова для скора",
+                placeholder="Разделите запятыми",
+                help="Скор ответа — доля найденных ключевых слов"
+            )
+        
+        submitted = st.form_submit_button("🧪 Запустить перебор", type="primary")
+    
+    if not submitted:
+        return
+    
+    from llm_runner.core.cost import usage_cost
+    from llm_runner.core.providers.pool import provider_from_env
+    from llm_runner.core.runner import result_to_runs
+    from llm_runner.core.sweep import ParamRange, SweepSpace, keyword_score, successive_halving
+    from llm_runner.core.templates import build_prompt
+    
+    selected_tasks = [task_options[name] for name in selected_task_names]
+    keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
+    try:
+        max_tokens_list = [int(v) for v in max_tokens_values.split(',') if v.strip()]
+    except ValueError:
+        st.error("❌ Max tokens: укажите целые числа через запятую")
+        return
+    if not selected_tasks or not models:
+        st.error("❌ Выберите задачи и модели")
+        return
+    if not keyword_list:
+        st.error("❌ Укажите ключевые слова: без скора ранняя остановка невозможна")
+        return
+    
+    space = SweepSpace([
+        ParamRange("temperature", low=temperature_range[0], high=temperature_range[1], steps=temperature_steps),
+        ParamRange("top_p", low=top_p_range[0], high=top_p_range[1], steps=top_p_steps),
+        ParamRange("max_tokens", values=max_tokens_list or [1000]),
+    ])
+    configs = space.grid() if mode == "Сетка" else space.sample(random_count)
+    prompts = [[{"role": "user", "content": build_prompt(task)}] for task in selected_tasks]
+    task_by_prompt = {id(messages): task for messages, task in zip(prompts, selected_tasks)}
+    
+    provider = provider_from_env()
+    writer = db_manager.get_writer()
+    st.info(f"🧪 {len(configs)} конфигураций × {len(models)} моделей")
+    
+    for model in models:
+        status = st.empty()
+        
+        def save_result(arm, messages, result, model=model):
+            for run_kwargs in result_to_runs(task_by_prompt[id(messages)].id, "comet", model, arm.params, messages, result):
+                writer.submit_run(**run_kwargs)
+        
+        def show_round(round_index, alive, model=model, status=status):
+            status.text(f"⏳ {model}: раунд {round_index + 1}, конфигураций в игре: {len(alive)}")
+        
+        sweep = successive_halving(
+            provider,
+            model,
+            prompts,
+            configs,
+            keyword_score(keyword_list),
+            eta=eta,
+            initial_samples=initial_samples,
+            max_tokens_budget=token_budget or None,
+            cost_fn=usage_cost,
+            on_result=save_result,
+            on_round=show_round
+        )
+        writer.flush()
+        status.empty()
+        
+        st.markdown(f"### 🤖 {model}")
+        best = sweep.best
+        if best:
+            st.success(f"🏆 Лучшая конфигурация: `{json.dumps(best.params, ensure_ascii=False)}` — скор {best.mean_score:.2f}")
+        if sweep.budget_exhausted:
+            st.warning(f"⚠️ Бюджет исчерпан после {sweep.tokens_used} токенов")
+        st.dataframe(
+            [
+                {
+                    **{k: arm.params.get(k) for k in ("temperature", "top_p", "max_tokens")},
+                    "скор": round(arm.mean_score, 3) if arm.scores else None,
+                    "запросов": arm.calls,
+                    "ошибок": arm.errors,
+                    "токенов": arm.tokens,
+                    "остановлена в раунде": arm.stopped_round + 1 if arm.stopped_round is not None else "—"
+                }
+                for arm in sorted(sweep.arms, key=lambda a: a.mean_score, reverse=True)
+            ],
+            use_container_width=True
+        )
+
+
 def show_results(db_manager: DatabaseManager):
     """Показывает результаты запусков"""
     st.subheader("Результаты запусков")
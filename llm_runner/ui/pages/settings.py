@@ -2,14 +2,8 @@
 Страница настроек
 """
 import streamlit as st
-import sys
 import os
 
-# Добавляем путь к корню проекта
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
-
-from llm_runner.core.providers.comet import CometProvider
-
 
 def main():
     st.header("⚙️ Настройки")
@@ -51,6 +45,8 @@ def show_api_settings():
     
     st.info(f"🌐 Base URL: {current_url}")
     
+    show_pool_stats()
+    
     # Инструкции по настройке
     st.markdown("### 📝 Инструкции по настройке")
     
@@ -74,12 +70,15 @@ def show_api_settings():
             st.error("❌ Сначала настройте COMET_API_KEY в .env файле")
         else:
             try:
-                provider = CometProvider()
-                # Тестируем с простой моделью
-                test_result = provider.generate(
-                    messages=[{"role": "user", "content": "Hi"}],
-                    model="comet-7b",
-                    max_tokens=5
+                from llm_runner.core.providers.pool import provider_from_env
+                from llm_runner.core.runner import RunJob, generate_safely
+                from llm_runner.core.scheduler import INTERACTIVE
+                provider = provider_from_env()
+                # Тестируем с простой моделью (вне очереди батчей)
+                test_result = generate_safely(
+                    provider,
+                    [{"role": "user", "content": "Hi"}],
+                    RunJob(model="comet-7b", params={"max_tokens": 5}, priority=INTERACTIVE, flow="settings")
                 )
                 
                 if test_result.error:
@@ -92,6 +91,39 @@ def show_api_settings():
                 st.error(f"❌ Ошибка: {e}")
 
 
+def show_pool_stats():
+    """Показывает участников пула провайдеров и их статистику"""
+    from llm_runner.core.providers.pool import ProviderPool, provider_from_env
+    
+    if not (os.getenv("LLM_RUNNER_POOL") or os.getenv("COMET_API_KEYS") or os.getenv("COMET_BASE_URLS")):
+        return
+    try:
+        provider = provider_from_env()
+    except (ValueError, KeyError) as e:
+        st.error(f"❌ Неверная конфигурация пула: {e}")
+        return
+    if not isinstance(provider, ProviderPool):
+        return
+    
+    st.markdown(f"### 🔀 Пул провайдеров ({provider.strategy})")
+    st.dataframe(
+        [
+            {
+                "участник": member["name"],
+                "в ротации": "✅" if member["healthy"] else f"⏸️ {member['ejected_for_s']} с",
+                "запросов": member["requests"],
+                "ошибок": member["errors"],
+                "в полете": member["outstanding"],
+                "токенов": member["tokens"],
+                "латентность, ms": member["latency_ms"],
+                "последняя ошибка": member["last_error"] or ""
+            }
+            for member in provider.stats()
+        ],
+        use_container_width=True
+    )
+
+
 def show_model_settings():
     """Показывает настройки моделей"""
     st.subheader("🤖 Настройки моделей")
@@ -132,12 +164,19 @@ def show_model_settings():
                     st.error("❌ Сначала настройте COMET_API_KEY")
                 else:
                     try:
-                        provider = CometProvider()
-                        result = provider.generate(
-                            messages=[{"role": "user", "content": "Привет! Как дела?"}],
-                            model=model_id,
-                            max_tokens=50,
-                            temperature=info['recommended_temp']
+                        from llm_runner.core.providers.pool import provider_from_env
+                        from llm_runner.core.runner import RunJob, generate_safely
+                        from llm_runner.core.scheduler import INTERACTIVE
+                        provider = provider_from_env()
+                        result = generate_safely(
+                            provider,
+                            [{"role": "user", "content": "Привет! Как дела?"}],
+                            RunJob(
+                                model=model_id,
+                                params={"max_tokens": 50, "temperature": info['recommended_temp']},
+                                priority=INTERACTIVE,
+                                flow="settings"
+                            )
                         )
                         
                         if result.error:
@@ -0,0 +1,34 @@
+"""
+Реестр страниц приложения с ленивым импортом
+
+Streamlit выполняет app.py заново на каждый клик, поэтому кэши живут
+здесь, в обычном модуле пакета, а не в самом скрипте.
+"""
+import importlib
+from functools import lru_cache
+from types import ModuleType
+
+from dotenv import load_dotenv
+
+
+# Название страницы в навигации -> модуль с функцией main()
+PAGES = {
+    "📊 Dataset": "llm_runner.ui.pages.dataset",
+    "🚀 Runs": "llm_runner.ui.pages.runs",
+    "⭐ Evaluate": "llm_runner.ui.pages.evaluate",
+    "⚖️ Compare A/B": "llm_runner.ui.pages.compare",
+    "📋 History": "llm_runner.ui.pages.history",
+    "⚙️ Settings": "llm_runner.ui.pages.settings"
+}
+
+
+@lru_cache(maxsize=None)
+def load_environment() -> None:
+    """Загружает переменные окружения один раз на процесс"""
+    load_dotenv()
+
+
+@lru_cache(maxsize=None)
+def load_page(module_name: str) -> ModuleType:
+    """Импортирует модуль страницы при первом открытии и кэширует его"""
+    return importlib.import_module(module_name)
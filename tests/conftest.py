@@ -0,0 +1,37 @@
+"""
+Общие настройки тестов
+"""
+import os
+import sys
+
+import pytest
+
+# Тесты запускаются из корня репозитория без установки пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Отдельная база SQLite на тест (LLM_RUNNER_DB), схема создана"""
+    monkeypatch.setenv("LLM_RUNNER_DB", str(tmp_path / "test.db"))
+    from llm_runner.db.models import init_database
+
+    return init_database()
+
+
+@pytest.fixture
+def mock_server():
+    """Запускает мок-сервер Comet API на свободном порту: mock_server(**config)"""
+    from llm_runner.core.mock_server import MockServerConfig, start_mock_server
+
+    servers = []
+
+    def start(**config):
+        config = {"latency": "fixed", "latency_ms": 0, "seed": 1, **config}
+        server = start_mock_server(MockServerConfig(**config), port=0)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
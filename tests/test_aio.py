@@ -0,0 +1,91 @@
+"""
+Тесты асинхронного пути записи (llm_runner.db.aio)
+"""
+import asyncio
+
+import pytest
+
+from llm_runner.db.aio import AsyncDatabaseManager, async_available
+from llm_runner.db.repo import build_run
+
+pytestmark = pytest.mark.skipif(not async_available(), reason="нужны aiosqlite и greenlet")
+
+
+def run_kwargs(task_id, index):
+    return dict(
+        task_id=task_id, provider="comet", model="model", params={"temperature": 0.1},
+        messages=[{"role": "user", "content": f"q{index}"}], response_text=f"answer number {index}",
+        usage={"prompt_tokens": 3, "completion_tokens": 4, "total_tokens": 7}, latency_ms=index
+    )
+
+
+def test_writer_round_trip():
+    async def scenario():
+        async with AsyncDatabaseManager.in_memory() as db:
+            async with db.get_session() as session:
+                task = await db.get_task_repo(session).create_task("async", "{input}")
+            writer = db.get_writer()
+
+            # Корутины ставят запуски одновременно, писатель коммитит их пачками
+            futures = await asyncio.gather(*(writer.submit_run(**run_kwargs(task.id, i)) for i in range(50)))
+            await writer.flush()
+            saved = await asyncio.gather(*futures)
+            evaluation = await (await writer.submit_evaluation(saved[0].id, 5, "ok"))
+            await writer.flush()
+            assert writer.pending == 0
+
+            async with db.get_session() as session:
+                runs = await db.get_run_repo(session).get_runs_by_task(task.id)
+                stored = await db.get_evaluation_repo(session).get_evaluation_by_run_id(saved[0].id)
+            return saved, runs, evaluation, stored
+
+    saved, runs, evaluation, stored = asyncio.run(scenario())
+    assert len(runs) == 50
+    assert {r.id for r in runs} == {r.id for r in saved}
+    by_latency = {r.latency_ms: r for r in runs}
+    assert by_latency[7].response_text == "answer number 7"
+    assert by_latency[7].total_tokens == 7
+    assert stored is not None and stored.id == evaluation.id and stored.rating == 5
+
+
+def test_bad_object_does_not_drop_batch():
+    async def scenario():
+        async with AsyncDatabaseManager.in_memory() as db:
+            async with db.get_session() as session:
+                task = await db.get_task_repo(session).create_task("async", "{input}")
+            writer = db.get_writer()
+            good = build_run(**run_kwargs(task.id, 1))
+            duplicate = build_run(**run_kwargs(task.id, 2))
+            duplicate.id = good.id
+            futures = [await writer.submit(good), await writer.submit(duplicate)]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            async with db.get_session() as session:
+                runs = await db.get_run_repo(session).get_runs_by_task(task.id)
+            return results, runs
+
+    results, runs = asyncio.run(scenario())
+    assert results[0].id == runs[0].id
+    assert isinstance(results[1], Exception)
+    assert len(runs) == 1
+
+
+def test_fallback_reassigns_rolled_back_cluster():
+    text = "the quick brown fox jumps over the lazy dog while the cat sleeps on the warm windowsill all day long"
+
+    async def scenario():
+        async with AsyncDatabaseManager.in_memory() as db:
+            async with db.get_session() as session:
+                task = await db.get_task_repo(session).create_task("async", "{input}")
+            writer = db.get_writer()
+            # Первый запуск открывает кластер, второй к нему присоединяется, но первый не сохраняется
+            bad = build_run(**{**run_kwargs(task.id, 1), "response_text": text, "model": None})
+            near = build_run(**{**run_kwargs(task.id, 2), "response_text": text + "!"})
+            futures = [await writer.submit(bad), await writer.submit(near)]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            async with db.get_session() as session:
+                runs = await db.get_run_repo(session).get_runs_by_task(task.id)
+            return results, runs
+
+    results, runs = asyncio.run(scenario())
+    assert isinstance(results[0], Exception)
+    assert [r.cluster_id for r in runs] == [runs[0].id]
@@ -0,0 +1,148 @@
+"""
+Тесты архива запусков в Parquet (llm_runner.db.archive)
+"""
+import os
+from datetime import datetime
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from llm_runner.db import archive  # noqa: E402
+from llm_runner.db.models import Evaluation, Run, RunScore  # noqa: E402
+from llm_runner.db.repo import DatabaseManager  # noqa: E402
+
+
+CUTOFF = datetime(2025, 6, 1)
+
+
+@pytest.fixture
+def db(database, tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_ARCHIVE_DIR", str(tmp_path / "archive"))
+    return DatabaseManager()
+
+
+@pytest.fixture
+def runs(db):
+    """Два старых месяца (один запуск с оценкой и метриками) и свежий запуск"""
+    with db.get_session() as session:
+        task_id = db.get_task_repo(session).create_task("archive", "{input}").id
+        started = {
+            "jan-1": datetime(2025, 1, 10), "jan-2": datetime(2025, 1, 20),
+            "feb-1": datetime(2025, 2, 5), "hot": datetime(2026, 1, 1)
+        }
+        for run_id, started_at in started.items():
+            session.add(Run(
+                id=run_id, task_id=task_id, provider="comet", model="model",
+                started_at=started_at, response_text=f"answer about {run_id.replace('-', ' ')} topic"
+            ))
+        session.add(Evaluation(id="eval-jan-2", run_id="jan-2", rating=4, comment="хорошо", created_at=datetime(2025, 1, 21)))
+        session.add(RunScore(run_id="jan-2", exact_match=1.0, token_f1=0.5))
+        session.add(Evaluation(id="eval-hot", run_id="hot", rating=2, created_at=datetime(2026, 1, 2)))
+        session.commit()
+    return task_id
+
+
+def part_files():
+    root = archive.archive_dir()
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), root)
+        for directory, _, names in os.walk(root) for name in names
+    )
+
+
+def test_archive_moves_old_runs_to_monthly_parquet(db, runs):
+    with db.get_session() as session:
+        assert archive.archive_runs(session, before=CUTOFF) == 3
+        assert [run.id for run in session.query(Run).all()] == ["hot"]
+        assert session.query(Evaluation).count() == 1
+        assert session.query(RunScore).count() == 0
+
+    # Файл месяца называется по первому запуску пачки в этом месяце
+    assert part_files() == [
+        os.path.join("year=2025", "month=01", "part-jan-1.parquet"),
+        os.path.join("year=2025", "month=02", "part-feb-1.parquet"),
+    ]
+    assert archive.stats()["files"] == 2
+    table = archive.read_archive()
+    assert sorted(table["id"].to_pylist()) == ["feb-1", "jan-1", "jan-2"]
+
+
+def test_include_archived_merges_hot_and_cold(db, runs):
+    with db.get_session() as session:
+        archive.archive_runs(session, before=CUTOFF)
+
+    with db.get_session() as session:
+        run_repo = db.get_run_repo(session)
+        assert [run.id for run in run_repo.get_all_runs()] == ["hot"]
+        merged = run_repo.get_all_runs(include_archived=True)
+        assert [run.id for run in merged] == ["hot", "feb-1", "jan-2", "jan-1"]
+        assert [run.archived for run in merged] == [False, True, True, True]
+        assert [run.id for run in run_repo.get_runs_by_task(runs, include_archived=True)] == ["hot", "feb-1", "jan-2", "jan-1"]
+
+        cold = run_repo.get_run_by_id("jan-2", include_archived=True)
+        assert run_repo.get_run_by_id("jan-2") is None
+        assert cold.archived and cold.response_text == "answer about jan 2 topic"
+        assert cold.evaluation.rating == 4 and cold.evaluation.comment == "хорошо"
+        assert cold.score.exact_match == 1.0 and cold.score.rouge_l is None
+
+        evaluated = db.get_evaluation_repo(session).get_evaluated_runs(include_archived=True)
+        assert [(run.id, evaluation.rating) for run, evaluation in evaluated] == [("hot", 2), ("jan-2", 4)]
+
+    # Фильтры чтения: диапазон месяцев и список запусков
+    assert [run.id for run in archive.load_runs(since=datetime(2025, 2, 1))] == ["feb-1"]
+    assert [run.id for run in archive.load_runs(run_ids=["jan-1"])] == ["jan-1"]
+
+
+def test_retry_after_failure_rewrites_same_files(db, runs, monkeypatch):
+    chunks = archive._chunks
+
+    def fail(items, size=archive._IN_CHUNK):
+        raise RuntimeError("сбой до удаления строк")
+
+    # Файлы записаны, строки не удалены: запуски есть и в базе, и в архиве
+    monkeypatch.setattr(archive, "_chunks", fail)
+    with db.get_session() as session:
+        with pytest.raises(RuntimeError):
+            archive.archive_runs(session, before=CUTOFF)
+    files = part_files()
+    assert len(files) == 2
+    with db.get_session() as session:
+        assert len(session.query(Run).all()) == 4
+        merged = db.get_run_repo(session).get_all_runs(include_archived=True)
+        assert sorted(run.id for run in merged) == ["feb-1", "hot", "jan-1", "jan-2"]
+        assert not any(run.archived for run in merged)
+
+    monkeypatch.setattr(archive, "_chunks", chunks)
+    with db.get_session() as session:
+        assert archive.archive_runs(session, before=CUTOFF) == 3
+    assert part_files() == files
+    assert archive.read_archive().num_rows == 3
+
+
+def test_vacuum_rebuilds_search_index(db, runs):
+    with db.get_session() as session:
+        archive.archive_runs(session, before=CUTOFF)
+        archive.vacuum(session)
+
+    with db.get_session() as session:
+        run_repo = db.get_run_repo(session)
+        assert [hit.item.id for hit in run_repo.search_runs("topic")] == ["hot"]
+        assert run_repo.search_runs("jan") == []
+
+
+def test_export_includes_hot_and_archived_runs(db, runs, tmp_path):
+    with db.get_session() as session:
+        archive.archive_runs(session, before=CUTOFF)
+
+    path = str(tmp_path / "export.parquet")
+    with db.get_session() as session:
+        assert archive.export_runs(session, path) == 4
+        table = pq.read_table(path)
+        assert sorted(table["id"].to_pylist()) == ["feb-1", "hot", "jan-1", "jan-2"]
+        ratings = dict(zip(table["id"].to_pylist(), table["rating"].to_pylist()))
+        assert ratings["jan-2"] == 4 and ratings["hot"] == 2
+
+        assert archive.export_runs(session, path, include_archived=False) == 1
+        assert archive.export_runs(session, path, since=datetime(2025, 1, 15), until=datetime(2025, 2, 1)) == 1
+        assert pq.read_table(path)["id"].to_pylist() == ["jan-2"]
@@ -0,0 +1,144 @@
+"""
+Тесты бюджетов (llm_runner.core.budget)
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from llm_runner.core import cost, runner
+from llm_runner.core.budget import BatchBudget, BudgetExceeded, BudgetManager, UnpricedModel
+from llm_runner.core.providers.base import Provider, ProviderResult
+from llm_runner.core.runner import RunJob
+
+
+@pytest.fixture
+def prices(monkeypatch):
+    """Сбрасывает кэш цен до и после теста"""
+    def reset():
+        cost._price_table.cache_clear()
+        cost.price_for.cache_clear()
+        cost.fallback_price.cache_clear()
+
+    reset()
+    yield monkeypatch
+    reset()
+
+
+def test_concurrent_reservations_never_exceed_limit(database):
+    manager = BudgetManager(database, wait_s=0)
+    budget = BatchBudget(max_tokens=10_000)
+    granted = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(10):
+            try:
+                reservation = manager.reserve("gpt-4o", 300, budget)
+            except BudgetExceeded:
+                continue
+            with lock:
+                granted.append(reservation)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    tokens, _, in_flight = manager.usage(budget.scope)
+    assert len(granted) == 10_000 // 300
+    assert tokens == len(granted) * 300 <= 10_000
+    assert in_flight == len(granted)
+
+
+def test_settle_replaces_estimate_with_usage(database):
+    manager = BudgetManager(database)
+    budget = BatchBudget(max_tokens=1000)
+    reservation = manager.reserve("gpt-4o", 800, budget)
+    manager.settle(reservation, {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150})
+    assert manager.usage(budget.scope) == (150, pytest.approx(0.00075), 0)
+
+
+def test_unpriced_model_is_refused_under_usd_limit(database, prices):
+    manager = BudgetManager(database, wait_s=0)
+    with pytest.raises(UnpricedModel):
+        manager.reserve("deepseek-chat", 1000, BatchBudget(max_cost_usd=1.0))
+    # Без лимита в USD цена не нужна
+    manager.reserve("deepseek-chat", 1000, BatchBudget(max_tokens=5000))
+
+
+def test_unpriced_model_uses_fallback_price(database, prices):
+    prices.setenv("LLM_RUNNER_FALLBACK_PRICE", "[1000.0, 1000.0]")
+    manager = BudgetManager(database, wait_s=0)
+    budget = BatchBudget(max_cost_usd=1.5)
+    manager.reserve("deepseek-chat", 1000, budget)
+    assert manager.usage(budget.scope)[1] == pytest.approx(1.0)
+    with pytest.raises(BudgetExceeded):
+        manager.reserve("deepseek-chat", 1000, budget)
+
+
+def test_stale_reservations_stop_blocking(database):
+    manager = BudgetManager(database, wait_s=30, stale_s=0.1)
+    budget = BatchBudget(max_tokens=1000)
+    manager.reserve("gpt-4o", 800, budget)   # процесс "упал" до settle
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    with pytest.raises(BudgetExceeded):
+        manager.reserve("gpt-4o", 800, budget)
+    assert time.monotonic() - started < 5
+    assert manager.usage(budget.scope) == (800, pytest.approx(800 * 2.5 / 1_000_000), 0)
+
+
+class LockedBudgetManager:
+    """Менеджер бюджетов, база которого заблокирована"""
+
+    def __init__(self, fail_reserve: bool):
+        self.fail_reserve = fail_reserve
+
+    def reserve(self, *args, **kwargs):
+        if self.fail_reserve:
+            raise OperationalError("UPDATE budget_usage", {}, Exception("database is locked"))
+        return object()
+
+    def settle(self, reservation, usage):
+        raise OperationalError("UPDATE budget_usage", {}, Exception("database is locked"))
+
+
+class EchoProvider(Provider):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, messages, model, **params):
+        self.calls += 1
+        usage = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        return ProviderResult(text="ok", usage=usage, finish_reason="stop", raw={}, latency_ms=1)
+
+    def validate_model(self, model):
+        return True
+
+
+def test_database_error_on_reserve_defers_requests_without_aborting_fan_out(monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_CIRCUIT", "0")
+    monkeypatch.setattr(runner, "get_budget_manager", lambda: LockedBudgetManager(fail_reserve=True))
+    provider = EchoProvider()
+    jobs = [RunJob(model="gpt-4o", params={"max_tokens": 5, "temperature": 0.5}) for _ in range(4)]
+
+    results = [result for _, result in runner.fan_out(provider, [{"role": "user", "content": "hi"}], jobs, budget=BatchBudget(max_tokens=100))]
+
+    assert len(results) == 4
+    assert all(r.error_kind == "budget" and runner.is_deferred(r) for r in results)
+    assert provider.calls == 0
+
+
+def test_database_error_on_settle_keeps_result(monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_CIRCUIT", "0")
+    monkeypatch.setattr(runner, "get_budget_manager", lambda: LockedBudgetManager(fail_reserve=False))
+    job = RunJob(model="gpt-4o", params={"max_tokens": 5, "temperature": 0.5})
+
+    result = runner.generate_safely(EchoProvider(), [{"role": "user", "content": "hi"}], job, budget=BatchBudget(max_tokens=100))
+
+    assert result.error is None
+    assert result.text == "ok"
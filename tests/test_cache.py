@@ -0,0 +1,124 @@
+"""
+Тесты кэша запросов с инвалидацией по записи (llm_runner.db.cache)
+"""
+import pytest
+from sqlalchemy import delete, update
+
+from llm_runner.db.cache import QueryCache, query_cache
+from llm_runner.db.models import Run, Task
+from llm_runner.db.repo import DatabaseManager
+
+
+@pytest.fixture
+def db(database, monkeypatch):
+    monkeypatch.setattr(query_cache, "enabled", True)
+    query_cache.clear()
+    return DatabaseManager()
+
+
+def counters():
+    return query_cache.hits, query_cache.misses
+
+
+def test_repeated_read_is_a_hit(db):
+    with db.get_session() as session:
+        db.get_task_repo(session).create_task("one", "{input}")
+    with db.get_session() as session:
+        first = db.get_task_repo(session).get_all_tasks()
+    hits, misses = counters()
+    with db.get_session() as session:
+        second = db.get_task_repo(session).get_all_tasks()
+    assert counters() == (hits + 1, misses)
+    assert [t.id for t in second] == [t.id for t in first]
+    # Вызывающий получает свой список: изменения списка не портят кэш
+    second.clear()
+    with db.get_session() as session:
+        assert len(db.get_task_repo(session).get_all_tasks()) == 1
+
+
+def test_flush_and_commit_invalidate_table(db):
+    with db.get_session() as session:
+        repo = db.get_task_repo(session)
+        assert repo.get_all_tasks() == []
+        repo.create_task("new", "{input}")
+    with db.get_session() as session:
+        assert [t.name for t in db.get_task_repo(session).get_all_tasks()] == ["new"]
+
+
+def test_orm_dml_invalidates_table(db):
+    with db.get_session() as session:
+        task = db.get_task_repo(session).create_task("old", "{input}")
+        task_id = task.id
+    with db.get_session() as session:
+        assert db.get_task_repo(session).get_task_by_id(task_id).name == "old"
+        session.execute(update(Task).where(Task.id == task_id).values(name="renamed"))
+        session.commit()
+    with db.get_session() as session:
+        assert db.get_task_repo(session).get_task_by_id(task_id).name == "renamed"
+        session.execute(delete(Task).where(Task.id == task_id))
+        session.commit()
+    with db.get_session() as session:
+        assert db.get_task_repo(session).get_task_by_id(task_id) is None
+
+
+def test_write_to_other_table_keeps_entry(db):
+    with db.get_session() as session:
+        task = db.get_task_repo(session).create_task("t", "{input}")
+        db.get_task_repo(session).get_all_tasks()
+        db.get_run_repo(session).create_run(task.id, "comet", "m", {}, [], response_text="answer")
+    hits, _ = counters()
+    with db.get_session() as session:
+        db.get_task_repo(session).get_all_tasks()
+        assert [r.response_text for r in db.get_run_repo(session).get_runs_by_task(task.id)] == ["answer"]
+    assert query_cache.hits == hits + 1
+
+
+def test_rollback_does_not_invalidate(db):
+    with db.get_session() as session:
+        db.get_task_repo(session).create_task("t", "{input}")
+    with db.get_session() as session:
+        db.get_task_repo(session).get_all_tasks()
+        session.add(Task(id="rolled-back", name="x", prompt_template="y"))
+        session.flush()
+        session.rollback()
+    hits, _ = counters()
+    with db.get_session() as session:
+        assert [t.name for t in db.get_task_repo(session).get_all_tasks()] == ["t"]
+    assert query_cache.hits == hits + 1
+
+
+def test_cached_objects_are_detached_and_readable(db):
+    with db.get_session() as session:
+        task = db.get_task_repo(session).create_task("t", "{input}", input_text="text")
+        db.get_run_repo(session).create_run(task.id, "comet", "m", {"temperature": 0.1}, [], response_text="answer")
+        task_id = task.id
+    with db.get_session() as session:
+        runs = db.get_run_repo(session).get_runs_by_task(task_id)
+        cached_task = db.get_task_repo(session).get_task_by_id(task_id)
+        assert all(run not in session for run in runs)
+        assert cached_task not in session
+    # Сессия закрыта: атрибуты загружены заранее, ленивых запросов нет
+    assert runs[0].response_text == "answer"
+    assert runs[0].model == "m"
+    assert cached_task.input_text == "text"
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = QueryCache(max_entries=2, ttl_s=10)
+    clock = [100.0]
+    monkeypatch.setattr("llm_runner.db.cache.time.monotonic", lambda: clock[0])
+    loads = []
+
+    def load(key):
+        return cache.get_or_load(key, "db", ("t",), lambda: loads.append(key) or key)
+
+    for key in ("a", "b", "a", "c", "b"):
+        load(key)
+    # b вытеснена при добавлении c (a была использована позже)
+    assert loads == ["a", "b", "c", "b"]
+    clock[0] += 11
+    load("b")
+    assert loads[-1] == "b" and len(loads) == 5
+    cache.bump("db", ["t"])
+    load("b")
+    assert len(loads) == 6
@@ -0,0 +1,122 @@
+"""
+Тесты автоматического выключателя (llm_runner.core.circuit)
+"""
+import pytest
+
+from llm_runner.core import circuit
+from llm_runner.core.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_circuit_breaker, is_failure
+from llm_runner.core.providers.base import Provider, ProviderResult
+from llm_runner.core.runner import RunJob, generate_safely, is_deferred
+
+
+class Clock:
+    def __init__(self):
+        self.now = 500.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit, "time", clock)
+    return clock
+
+
+def failed(kind):
+    return ProviderResult(text=None, usage={}, finish_reason=None, raw={}, latency_ms=0, error="сбой", error_kind=kind)
+
+
+def test_failure_kinds():
+    assert all(is_failure(failed(kind)) for kind in ("server", "timeout", "network"))
+    # Ошибки самого запроса и 429 не говорят о нездоровье модели
+    assert not any(is_failure(failed(kind)) for kind in ("context_length", "auth", "rate_limit", "not_found"))
+    assert not is_failure(ProviderResult(text="ok", usage={}, finish_reason="stop", raw={}, latency_ms=1))
+
+
+def test_opens_at_failure_rate_after_min_requests(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, window=10, open_s=30)
+    for outcome in (True, True, True):
+        breaker.record(outcome)
+    # Меньше min_requests исходов — цепь не размыкается даже при 100% сбоев
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+
+
+def test_stays_closed_below_failure_rate(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, window=4)
+    for outcome in (True, False, False, False, True, False, False, False):
+        breaker.record(outcome)
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_half_open_success_closes(clock):
+    breaker = CircuitBreaker(min_requests=1, open_s=30)
+    breaker.record(True)
+    assert breaker.state == OPEN
+
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.state == HALF_OPEN
+    assert breaker.retry_in() == 0
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    # Окно очищено: старые сбои не размыкают цепь снова
+    assert breaker.allow()
+
+
+def test_half_open_failure_reopens(clock):
+    breaker = CircuitBreaker(min_requests=1, open_s=30)
+    breaker.record(True)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 30
+
+
+def test_half_open_limits_probes(clock):
+    breaker = CircuitBreaker(min_requests=1, open_s=10, half_open_probes=2)
+    breaker.record(True)
+    clock.now += 10
+    assert [breaker.allow() for _ in range(3)] == [True, True, False]
+
+    # Исходы запросов, отправленных до размыкания, в open игнорируются
+    breaker.record(True)
+    assert breaker.state == OPEN
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+
+def test_open_circuit_defers_requests_without_calling_api(clock, monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_CIRCUIT", "1")
+
+    class CountingProvider(Provider):
+        base_url = "https://circuit.example"
+        calls = 0
+
+        def generate(self, messages, model, **params):
+            CountingProvider.calls += 1
+            return failed("server")
+
+        def validate_model(self, model):
+            return True
+
+    model = "circuit-test-model"
+    breaker = get_circuit_breaker(CountingProvider.base_url, model)
+    monkeypatch.setattr(breaker, "min_requests", 2)
+    job = RunJob(model=model, params={"max_tokens": 5, "temperature": 0.5})
+    messages = [{"role": "user", "content": "hi"}]
+
+    results = [generate_safely(CountingProvider(), messages, job) for _ in range(4)]
+
+    assert [r.error_kind for r in results] == ["server", "server", "circuit_open", "circuit_open"]
+    assert is_deferred(results[-1])
+    assert CountingProvider.calls == 2
@@ -0,0 +1,136 @@
+"""
+Тесты объединения одинаковых запросов (llm_runner.core.coalesce)
+"""
+import threading
+import time
+
+import pytest
+
+from llm_runner.core.coalesce import SingleFlight, is_deterministic, single_flight
+from llm_runner.core.providers.base import Provider, ProviderResult
+from llm_runner.core.runner import RunJob, generate_safely
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось"
+        time.sleep(0.005)
+
+
+def run_concurrently(flight, key, fn, followers):
+    """Ведущий вызов и followers ведомых, которые подключаются, пока он выполняется"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(followers + 1)]
+    threads[0].start()
+    wait_for(lambda: flight.in_flight == 1)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flight._calls and flight._calls[key].waiters == followers)
+    return threads, results, errors
+
+
+def test_followers_share_one_call_and_get_copies():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return ProviderResult(text="ok", usage={"total_tokens": 7}, finish_reason="stop", raw={"id": "x"}, latency_ms=5)
+
+    threads, results, errors = run_concurrently(flight, "key", fn, followers=3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == [] and len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert flight.shared == 3 and flight.in_flight == 0
+    leader = next(result for result, shared in results if not shared)
+    followers = [result for result, shared in results if shared]
+    assert all(f.text == "ok" and f.usage == {"total_tokens": 7} for f in followers)
+    # Изменения копии не видны ведущему и другим ведомым
+    followers[0].usage["total_tokens"] = 0
+    followers[0].raw["id"] = "changed"
+    assert leader.usage == {"total_tokens": 7} and leader.raw == {"id": "x"}
+    assert followers[1].usage == {"total_tokens": 7}
+
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise RuntimeError("API недоступен")
+
+    threads, results, errors = run_concurrently(flight, "key", fn, followers=2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == []
+    assert len(errors) == 3 and all(str(e) == "API недоступен" for e in errors)
+    # После завершения ключ свободен: следующий вызов идет в API заново
+    assert flight.do("key", lambda: ProviderResult(text="ok", usage={}, finish_reason=None, raw={}, latency_ms=0))[1] is False
+
+
+@pytest.mark.parametrize("params, expected", [
+    ({"temperature": 0}, True),
+    ({"temperature": 0.7, "seed": 1}, True),
+    ({"temperature": 0.7}, False),
+    ({}, False),
+    ({"temperature": 0, "n": 2}, False),
+])
+def test_is_deterministic(params, expected):
+    assert is_deterministic(params) is expected
+
+
+class GatedProvider(Provider):
+    """Держит запросы до release, считает вызовы API"""
+
+    def __init__(self):
+        self.base_url = "https://coalesce.example"
+        self.release = threading.Event()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, messages, model, **params):
+        with self._lock:
+            self.calls += 1
+        self.release.wait(5)
+        usage = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        return ProviderResult(text="ok", usage=usage, finish_reason="stop", raw={}, latency_ms=1)
+
+    def validate_model(self, model):
+        return True
+
+
+@pytest.mark.parametrize("params, api_calls", [({"temperature": 0}, 1), ({"temperature": 0.7}, 4)])
+def test_generate_safely_coalesces_only_deterministic_requests(monkeypatch, params, api_calls):
+    monkeypatch.setenv("LLM_RUNNER_CIRCUIT", "0")
+    provider = GatedProvider()
+    job = RunJob(model="gpt-4o-mini", params={"max_tokens": 5, **params})
+    messages = [{"role": "user", "content": f"coalesce {params}"}]
+    results = []
+    shared_before = single_flight.shared
+    threads = [threading.Thread(target=lambda: results.append(generate_safely(provider, messages, job))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: provider.calls == api_calls and single_flight.shared - shared_before == 4 - api_calls)
+    provider.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert provider.calls == api_calls
+    assert len(results) == 4 and all(r.text == "ok" for r in results)
+    assert sum(r.coalesced for r in results) == 4 - api_calls
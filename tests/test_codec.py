@@ -0,0 +1,83 @@
+"""
+Тесты JSON кодека и ленивых полей (llm_runner.core.codec)
+"""
+import datetime
+
+import pytest
+
+from llm_runner.core import codec
+from llm_runner.db.models import Run, Task
+from llm_runner.db.repo import DatabaseManager
+
+BACKENDS = ["json"] + (["orjson"] if codec.orjson is not None else [])
+
+TEXT = "Привет, 世界 🚀 — «кавычки»"
+MOMENT = datetime.datetime(2026, 1, 2, 3, 4, 5, 123456)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_JSON", request.param)
+    assert codec.backend() == request.param
+    return request.param
+
+
+def test_non_ascii_is_not_escaped(backend):
+    encoded = codec.dumps({"text": TEXT})
+    assert TEXT in encoded
+    assert codec.loads(encoded) == {"text": TEXT}
+
+
+def test_datetimes_encode_as_iso_strings(backend):
+    value = {
+        "at": MOMENT,
+        "utc": datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc),
+        "day": datetime.date(2026, 1, 2),
+    }
+    assert codec.loads(codec.dumps(value)) == {
+        "at": "2026-01-02T03:04:05.123456", "utc": "2026-01-02T00:00:00+00:00", "day": "2026-01-02"
+    }
+
+
+def test_values_orjson_rejects_fall_back_to_json(backend):
+    # Ключи не строки и целые больше 64 бит orjson не кодирует
+    assert codec.loads(codec.dumps({1: MOMENT})) == {"1": "2026-01-02T03:04:05.123456"}
+    assert codec.loads(codec.dumps([2 ** 70])) == [2 ** 70]
+    with pytest.raises(TypeError):
+        codec.dumps({"bad": object()})
+
+
+def test_json_field_decodes_once_until_column_changes(backend):
+    run = Run(params_json=codec.dumps({"temperature": 0.5, "note": TEXT}))
+    params = run.params
+    assert params == {"temperature": 0.5, "note": TEXT}
+    assert run.params is params
+
+    run.params_json = codec.dumps({"temperature": 0})
+    assert run.params == {"temperature": 0}
+    assert Run.params.column == "params_json"
+
+
+def test_empty_json_field_gives_fresh_default(backend):
+    first, second = Run(), Run()
+    first.messages.append({"role": "user", "content": "hi"})
+    assert second.messages == []
+    assert Run().response is None
+
+
+def test_json_fields_round_trip_through_database(database, backend):
+    db = DatabaseManager()
+    messages = [{"role": "user", "content": TEXT}]
+    with db.get_session() as session:
+        task_id = db.get_task_repo(session).create_task("codec", "{input}", vars={"city": "Москва", "since": MOMENT}).id
+        run_id = db.get_run_repo(session).create_run(
+            task_id, "comet", "model", {"seed": 1}, messages,
+            response_text=TEXT, response_json={"choices": [{"message": {"content": TEXT}}], "created": MOMENT}
+        ).id
+
+    with db.get_session() as session:
+        run = session.get(Run, run_id)
+        assert run.messages == messages
+        assert run.params == {"seed": 1}
+        assert run.response == {"choices": [{"message": {"content": TEXT}}], "created": "2026-01-02T03:04:05.123456"}
+        assert session.get(Task, task_id).variables == {"city": "Москва", "since": "2026-01-02T03:04:05.123456"}
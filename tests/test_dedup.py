@@ -0,0 +1,55 @@
+"""
+Тесты поиска почти одинаковых ответов (llm_runner.core.minhash, llm_runner.db.dedup)
+"""
+from llm_runner.core import minhash
+from llm_runner.db.dedup import find_cluster
+from llm_runner.db.repo import DatabaseManager
+
+
+BASE = (
+    "Python is a high-level general-purpose programming language. Its design philosophy "
+    "emphasizes code readability with the use of significant indentation. Python is "
+    "dynamically typed and garbage-collected, and it supports multiple programming paradigms."
+)
+# Тот же ответ с другим регистром, пробелами и одним измененным словом в конце
+NEAR = BASE.upper().replace(" ", "  ").replace("PARADIGMS", "styles")
+OTHER = (
+    "The mitochondrion is an organelle found in the cells of most eukaryotes. It uses "
+    "aerobic respiration to generate adenosine triphosphate, which is used as chemical energy."
+)
+
+
+def test_signature_similarity_tracks_jaccard():
+    base, near, other = (minhash.signature(t) for t in (BASE, NEAR, OTHER))
+    assert minhash.similarity(base, minhash.signature(BASE)) == 1.0
+    assert minhash.similarity(base, near) >= 0.8
+    assert minhash.similarity(base, other) < 0.2
+    assert minhash.signature("   ") is None
+
+
+def test_signature_roundtrip_and_band_keys():
+    sig = minhash.signature(BASE)
+    assert (minhash.from_bytes(minhash.to_bytes(sig)) == sig).all()
+    keys = minhash.band_keys(sig)
+    assert len(keys) == minhash.BANDS
+    assert len(set(keys) & set(minhash.band_keys(minhash.signature(NEAR)))) > 0
+
+
+def test_near_duplicates_share_a_cluster(database):
+    db = DatabaseManager()
+    with db.get_session() as session:
+        task = db.get_task_repo(session).create_task("dedup", "{input}")
+        runs = db.get_run_repo(session)
+        created = [
+            runs.create_run(task.id, "comet", "model", {}, [], response_text=text)
+            for text in (BASE, NEAR, OTHER, BASE)
+        ]
+        base, near, other, repeat = created
+
+        assert base.cluster_id == base.id
+        assert near.cluster_id == base.cluster_id
+        assert repeat.cluster_id == base.cluster_id
+        assert other.cluster_id == other.id != base.cluster_id
+
+        assert find_cluster(session, NEAR)[0] == base.cluster_id
+        assert find_cluster(session, "Completely unrelated text about sailing boats and wind") is None
@@ -0,0 +1,77 @@
+"""
+Тесты хеджирования (llm_runner.core.hedging, runner._dispatch)
+"""
+import threading
+import time
+
+from llm_runner.core import hedging
+from llm_runner.core.hedging import HedgePolicy, get_latency_tracker
+from llm_runner.core.providers.base import Provider, ProviderResult
+from llm_runner.core.runner import RunJob, _dispatch
+from llm_runner.core.tokens import estimate_request
+
+
+class SlowFirstProvider(Provider):
+    """Первый запрос висит slow_s секунд, остальные отвечают сразу"""
+
+    def __init__(self, slow_s: float):
+        self.slow_s = slow_s
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, messages, model, **params):
+        with self._lock:
+            self.calls += 1
+            first = self.calls == 1
+        started = time.perf_counter()
+        if first:
+            time.sleep(self.slow_s)
+        usage = {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10}
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        return ProviderResult(text="ok", usage=usage, finish_reason="stop", raw={}, latency_ms=latency_ms)
+
+    def validate_model(self, model):
+        return True
+
+
+def test_hedged_latency_is_measured_from_primary_start(monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_HEDGE", "1")
+    monkeypatch.setenv("LLM_RUNNER_CIRCUIT", "0")
+    monkeypatch.setattr(hedging, "_policy", HedgePolicy(max_rate=1.0, min_delay_ms=100))
+    model = "hedge-test-model"
+    tracker = get_latency_tracker(model)
+    for _ in range(20):
+        tracker.record(100)
+
+    provider = SlowFirstProvider(slow_s=0.5)
+    messages = [{"role": "user", "content": "hi"}]
+    job = RunJob(model=model, params={"max_tokens": 5})
+    result = _dispatch(provider, messages, job, estimate_request(messages, model, job.params))
+
+    assert result.raw.get("hedged") is True
+    # Выиграл дубль (его собственная латентность ~0), но запрос ждали не меньше задержки хеджа
+    assert 100 <= result.latency_ms < 500
+    assert tracker.percentile(100) == result.latency_ms
+
+
+def test_hedge_delay_excludes_executor_queue_wait(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hedging, "_executor", executor)
+    try:
+        # Единственный поток занят: первая попытка ждет его дольше задержки хеджа
+        executor.submit(time.sleep, 0.3)
+        hedges = []
+
+        def call():
+            time.sleep(0.01)
+            return ProviderResult(text="ok", usage={}, finish_reason="stop", raw={}, latency_ms=10)
+
+        result, hedged = hedging.hedged_call(call, 0.1, lambda: hedges.append(1) or True, lambda loser: None)
+
+        assert result.text == "ok"
+        assert hedged is False
+        assert hedges == []
+    finally:
+        executor.shutdown(wait=True)
@@ -0,0 +1,30 @@
+"""
+Тяжелые зависимости не загружаются при открытии страниц (llm_runner.ui.registry)
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from llm_runner.ui.registry import PAGES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Страница истории читает Parquet архив и загружает pyarrow сама
+LIGHT_PAGES = [module for module in PAGES.values() if not module.endswith(".history")]
+
+
+@pytest.mark.parametrize("module", LIGHT_PAGES)
+def test_page_import_does_not_load_numpy(module):
+    code = (
+        "import sys\n"
+        "from llm_runner.ui.registry import load_page\n"
+        f"load_page({module!r})\n"
+        "print(','.join(name for name in ('numpy', 'pandas', 'pyarrow') if name in sys.modules))\n"
+    )
+    # Отдельный процесс: в процессе pytest numpy уже импортирован другими тестами
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    assert output == ""
@@ -0,0 +1,91 @@
+"""
+Тесты CometProvider против мок-сервера (llm_runner.core.mock_server)
+"""
+import time
+
+import pytest
+
+from llm_runner.core.providers.comet import CometProvider
+from llm_runner.core.runner import RunJob, generate_safely
+
+
+MESSAGES = [{"role": "user", "content": "Say something"}]
+
+
+@pytest.fixture(autouse=True)
+def no_circuit(monkeypatch):
+    # Инъекции сбоев не должны открывать общий автомат между тестами
+    monkeypatch.setenv("LLM_RUNNER_CIRCUIT", "0")
+
+
+def provider_for(server, timeout=5.0):
+    return CometProvider(api_key="test", base_url=server.base_url, timeout=timeout)
+
+
+def test_completion(mock_server):
+    server = mock_server()
+    result = generate_safely(provider_for(server), MESSAGES, RunJob(model="gpt-4o-mini", params={"n": 2}))
+
+    assert result.error is None
+    assert result.status_code == 200
+    assert result.text
+    assert len(result.choices) == 2
+    assert result.usage["completion_tokens"] > 0
+    assert server.stats.snapshot()["status_200"] == 1
+
+
+def test_rate_limit_with_retry_after(mock_server):
+    server = mock_server(error_429_rate=1.0, retry_after_s=2)
+    result = generate_safely(provider_for(server), MESSAGES, RunJob(model="gpt-4o-mini"))
+
+    assert result.error_kind == "rate_limit"
+    assert result.status_code == 429
+    assert result.retry_after_s == 2.0
+    assert server.stats.snapshot()["status_429"] == 1
+
+
+def test_server_error(mock_server):
+    server = mock_server(error_5xx_rate=1.0)
+    result = generate_safely(provider_for(server), MESSAGES, RunJob(model="gpt-4o-mini"))
+
+    assert result.error_kind == "server"
+    assert result.status_code in (500, 502, 503)
+    # Retry-After сервер присылает только с 503
+    assert (result.retry_after_s is not None) == (result.status_code == 503)
+
+
+def test_timeout(mock_server):
+    server = mock_server(timeout_rate=1.0, timeout_s=1.5)
+    started = time.perf_counter()
+    result = generate_safely(provider_for(server, timeout=0.3), MESSAGES, RunJob(model="gpt-4o-mini"))
+
+    assert result.error_kind == "timeout"
+    assert result.status_code is None
+    assert time.perf_counter() - started < 1.2
+    assert server.stats.snapshot()["timeouts"] == 1
+
+
+def test_unknown_model(mock_server):
+    server = mock_server(models=["gpt-4o-mini"])
+    result = generate_safely(provider_for(server), MESSAGES, RunJob(model="gpt-4o"))
+
+    assert result.error_kind == "not_found"
+
+
+def test_stream_is_assembled_into_result(mock_server):
+    server = mock_server(latency_ms=50)
+    provider = provider_for(server)
+    job = RunJob(model="gpt-4o-mini", params={"n": 2})
+    server.rng.seed(1)
+    plain = generate_safely(provider, MESSAGES, job)
+    # Тот же seed — тот же ответ, только отданный SSE потоком
+    server.rng.seed(1)
+    streamed = generate_safely(provider, MESSAGES, RunJob(model="gpt-4o-mini", params={"n": 2, "stream": True}))
+
+    assert streamed.error is None
+    assert streamed.text == plain.text
+    assert streamed.choices == plain.choices
+    # usage приходит последним фрагментом (stream_options.include_usage)
+    assert streamed.usage == plain.usage
+    assert streamed.raw["object"] == "chat.completion"
+    assert 0 <= streamed.raw["time_to_first_token_ms"] <= streamed.latency_ms
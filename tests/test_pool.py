@@ -0,0 +1,183 @@
+"""
+Тесты пула провайдеров (llm_runner.core.providers.pool)
+"""
+import pytest
+
+from llm_runner.core.providers import pool as pool_module
+from llm_runner.core.providers.base import Provider, ProviderResult
+from llm_runner.core.providers.pool import PoolMember, ProviderPool
+from llm_runner.core.ratelimit import get_rate_limiter
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class Clock:
+    """Управляемые часы вместо time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class ScriptedProvider(Provider):
+    """Отвечает с заданной латентностью или ошибкой error_kind"""
+
+    def __init__(self, name: str, latency_ms: int = 10):
+        self.base_url = f"https://{name}.example"
+        self.latency_ms = latency_ms
+        self.error_kind = None
+        self.calls = 0
+
+    def generate(self, messages, model, **params):
+        self.calls += 1
+        if self.error_kind:
+            return ProviderResult(
+                text=None, usage={}, finish_reason=None, raw={}, latency_ms=self.latency_ms,
+                error=f"сбой {self.error_kind}", error_kind=self.error_kind
+            )
+        usage = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        return ProviderResult(text="ok", usage=usage, finish_reason="stop", raw={}, latency_ms=self.latency_ms)
+
+    def validate_model(self, model):
+        return True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(pool_module, "time", clock)
+    return clock
+
+
+def make_pool(strategy="round_robin", latencies=(10, 10, 10), **kwargs):
+    members = [PoolMember(ScriptedProvider(name, latency), name) for name, latency in zip("abc", latencies)]
+    return ProviderPool(members, strategy=strategy, **kwargs), {m.name: m for m in members}
+
+
+def picks(pool, count):
+    """Имена участников, обслуживших count запросов подряд"""
+    names = []
+    for _ in range(count):
+        before = {m.name: m.stats.requests for m in pool.members}
+        pool.generate(MESSAGES, "model")
+        names.append(next(m.name for m in pool.members if m.stats.requests > before[m.name]))
+    return names
+
+
+def test_round_robin_cycles_through_members(clock):
+    pool, _ = make_pool("round_robin")
+    assert picks(pool, 6) == ["a", "b", "c", "a", "b", "c"]
+
+
+def test_least_outstanding_prefers_idle_member(clock):
+    pool, members = make_pool("least_outstanding")
+    members["a"].stats.outstanding = 2
+    members["c"].stats.outstanding = 1
+    assert picks(pool, 3) == ["b", "b", "b"]
+
+    # При равной загрузке старт поиска сдвигается — запросы расходятся по всем
+    members["a"].stats.outstanding = members["c"].stats.outstanding = 0
+    assert sorted(picks(pool, 3)) == ["a", "b", "c"]
+
+
+def test_least_latency_probes_new_members_then_picks_fastest(clock):
+    pool, _ = make_pool("least_latency", latencies=(100, 20, 50))
+    # Участники без истории идут первыми
+    assert sorted(picks(pool, 3)) == ["a", "b", "c"]
+    assert picks(pool, 4) == ["b"] * 4
+
+
+@pytest.mark.parametrize("kind", ["auth", "rate_limit"])
+def test_auth_and_rate_limit_eject_immediately(clock, kind):
+    pool, members = make_pool("round_robin", eject_s=30)
+    members["a"].provider.error_kind = kind
+    pool.generate(MESSAGES, "model")
+
+    assert members["a"].stats.ejections == 1
+    assert not members["a"].healthy(clock.now)
+    assert "a" not in picks(pool, 4)
+    assert pool.healthy_count() == 2
+
+    # Через eject_s участник возвращается в ротацию
+    clock.now += 30
+    assert members["a"].healthy(clock.now)
+    assert pool.healthy_count() == 3
+
+
+def test_ejection_after_consecutive_failures(clock):
+    pool, members = make_pool("round_robin", max_consecutive_failures=3)
+    member = members["a"]
+    pool.members = [member]
+
+    member.provider.error_kind = "server"
+    picks(pool, 2)
+    member.provider.error_kind = None
+    picks(pool, 1)
+    # Успех обнуляет серию: двух сбоев подряд мало
+    member.provider.error_kind = "server"
+    picks(pool, 2)
+    assert member.stats.ejections == 0
+    assert member.healthy(clock.now)
+
+    picks(pool, 1)
+    assert member.stats.ejections == 1
+    assert not member.healthy(clock.now)
+
+
+def test_request_errors_do_not_eject(clock):
+    pool, members = make_pool("round_robin", max_consecutive_failures=1)
+    pool.members = [members["a"]]
+    members["a"].provider.error_kind = "context_length"
+    picks(pool, 3)
+    assert members["a"].stats.errors == 3
+    assert members["a"].stats.ejections == 0
+
+
+def test_ejection_backoff_doubles_up_to_cap(clock):
+    pool, members = make_pool("round_robin", eject_s=30, max_eject_s=200)
+    member = members["a"]
+    pool.members = [member]
+    member.provider.error_kind = "rate_limit"
+
+    durations = []
+    for _ in range(5):
+        pool.generate(MESSAGES, "model")
+        durations.append(member.stats.ejected_until - clock.now)
+        clock.now = member.stats.ejected_until
+    assert durations == [30, 60, 120, 200, 200]
+
+    # Успешный ответ сбрасывает счетчик выводов
+    member.provider.error_kind = None
+    pool.generate(MESSAGES, "model")
+    member.provider.error_kind = "rate_limit"
+    pool.generate(MESSAGES, "model")
+    assert member.stats.ejected_until - clock.now == 30
+
+
+def test_all_ejected_tries_member_returning_first(clock):
+    pool, members = make_pool("round_robin")
+    members["a"].stats.ejected_until = clock.now + 50
+    members["b"].stats.ejected_until = clock.now + 10
+    members["c"].stats.ejected_until = clock.now + 30
+
+    assert picks(pool, 2) == ["b", "b"]
+    assert pool.healthy_count() == 1
+
+
+def test_healthy_count_scales_rate_limiter(clock, monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_RPM", "60")
+    pool, members = make_pool("round_robin", eject_s=30)
+    pool.base_url = "pool:test-healthy-count"
+
+    assert get_rate_limiter("pool-model", pool).scale == 3
+    members["b"].provider.error_kind = "auth"
+    picks(pool, 3)
+    limiter = get_rate_limiter("pool-model", pool)
+    assert limiter.scale == 2
+    assert limiter._requests.capacity == 120
+
+    clock.now += 30
+    assert get_rate_limiter("pool-model", pool).scale == 3
@@ -0,0 +1,108 @@
+"""
+Тесты рейтинга моделей (llm_runner.core.ranking)
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from llm_runner.core.ranking import ELO_INITIAL, bradley_terry, elo_expected, elo_update
+
+
+def synthetic_comparisons(strengths, games_per_pair, seed=0):
+    """Сравнения всех пар, победитель — по вероятностям Bradley–Terry"""
+    rng = np.random.default_rng(seed)
+    model_a, model_b, outcome = [], [], []
+    for (a, sa), (b, sb) in itertools.combinations(strengths.items(), 2):
+        wins = rng.random(games_per_pair) < sa / (sa + sb)
+        model_a += [a] * games_per_pair
+        model_b += [b] * games_per_pair
+        outcome += wins.astype(float).tolist()
+    return model_a, model_b, outcome
+
+
+def test_order_follows_true_strength():
+    strengths = {"weak": 1.0, "mid": 2.0, "strong": 4.0, "best": 8.0}
+    ranked = bradley_terry(*synthetic_comparisons(strengths, 300), bootstrap=100)
+    assert [r.model for r in ranked] == ["best", "strong", "mid", "weak"]
+    # Разница между соседями ~ log(2) в шкале Elo ≈ 120 пунктов
+    gaps = [upper.score - lower.score for upper, lower in zip(ranked, ranked[1:])]
+    assert all(60 < gap < 200 for gap in gaps)
+
+
+def test_confidence_intervals_cover_point_and_shrink_with_data():
+    strengths = {"a": 1.0, "b": 3.0}
+    small = {r.model: r for r in bradley_terry(*synthetic_comparisons(strengths, 40), bootstrap=300)}
+    large = {r.model: r for r in bradley_terry(*synthetic_comparisons(strengths, 2000), bootstrap=300)}
+    for ranked in (small, large):
+        for r in ranked.values():
+            assert r.ci_low <= r.score <= r.ci_high
+    width = lambda r: r.ci_high - r.ci_low
+    assert width(large["b"]) < width(small["b"]) / 3
+    # Значимое превосходство: интервалы не пересекаются
+    assert large["b"].ci_low > large["a"].ci_high
+
+
+def test_grouped_counts_equal_expanded_rows():
+    expanded = bradley_terry(["x"] * 7 + ["y"] * 3 + ["x"] * 2, ["y"] * 7 + ["x"] * 3 + ["y"] * 2,
+                             [1.0] * 7 + [1.0] * 3 + [0.5] * 2, bootstrap=0)
+    grouped = bradley_terry(["x", "y", "x"], ["y", "x", "y"], [1.0, 1.0, 0.5], counts=[7, 3, 2], bootstrap=0)
+    assert [(r.model, r.comparisons) for r in grouped] == [(r.model, r.comparisons) for r in expanded]
+    for g, e in zip(grouped, expanded):
+        assert g.score == pytest.approx(e.score)
+        assert g.win_rate == pytest.approx(e.win_rate)
+    assert grouped[0].win_rate == pytest.approx(8 / 12)
+
+
+def test_undefeated_model_has_finite_score():
+    ranked = bradley_terry(["a"] * 5, ["b"] * 5, [1.0] * 5, bootstrap=50)
+    assert ranked[0].model == "a"
+    assert np.isfinite([r.score for r in ranked]).all()
+    assert sum(r.score - ELO_INITIAL for r in ranked) == pytest.approx(0.0, abs=1e-6)
+
+
+def test_elo_update_is_zero_sum():
+    assert elo_expected(1000, 1000) == pytest.approx(0.5)
+    a, b = elo_update(1000, 1200, 1.0)
+    assert a > 1000 and b < 1200
+    assert a + b == pytest.approx(2200)
+    # Победа слабого дает больше очков, чем победа сильного
+    assert a - 1000 > elo_update(1200, 1000, 1.0)[0] - 1200
+
+
+def test_concurrent_judgments_keep_elo_zero_sum(database):
+    import threading
+
+    from llm_runner.db.repo import DatabaseManager
+
+    db = DatabaseManager()
+    models = ["alpha", "beta", "gamma"]
+    with db.get_session() as session:
+        task = db.get_task_repo(session).create_task("elo", "{input}")
+        runs = db.get_run_repo(session)
+        run_ids = {model: runs.create_run(task.id, "comet", model, {}, [], response_text=model).id for model in models}
+
+    pairs = list(itertools.permutations(models, 2))
+    errors = []
+
+    def judge(worker):
+        try:
+            for i in range(15):
+                a, b = pairs[(worker + i) % len(pairs)]
+                with db.get_session() as session:
+                    db.get_pairwise_repo(session).create_judgment(run_ids[a], run_ids[b], ("a", "b", "draw")[i % 3])
+        except Exception as e:  # pragma: no cover - ошибка потока видна в assert
+            errors.append(e)
+
+    threads = [threading.Thread(target=judge, args=(worker,)) for worker in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with db.get_session() as session:
+        ratings = db.get_pairwise_repo(session).get_elo_ratings()
+    # Каждое сравнение переносит очки от одной модели к другой: потерянное обновление нарушило бы сумму
+    assert sum(r.rating - ELO_INITIAL for r in ratings) == pytest.approx(0, abs=1e-6)
+    assert sum(r.comparisons for r in ratings) == 2 * 6 * 15
@@ -0,0 +1,43 @@
+"""
+Тесты ограничителя скорости (llm_runner.core.ratelimit)
+"""
+from llm_runner.core.providers.base import Provider
+from llm_runner.core.providers.pool import PoolMember, ProviderPool
+from llm_runner.core.ratelimit import get_rate_limiter
+
+
+class NullProvider(Provider):
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def generate(self, messages, model, **params):
+        raise NotImplementedError
+
+    def validate_model(self, model):
+        return True
+
+
+def test_limiters_are_per_provider(monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_RPM", "60")
+    first = get_rate_limiter("rl-model", NullProvider("https://a.example"))
+    second = get_rate_limiter("rl-model", NullProvider("https://b.example"))
+    assert first is not second
+    assert get_rate_limiter("rl-model", NullProvider("https://a.example")) is first
+
+
+def test_pool_limits_scale_with_healthy_members(monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_RPM", "60")
+    monkeypatch.setenv("LLM_RUNNER_TPM", "1000")
+    members = [PoolMember(NullProvider(f"https://{i}.example"), f"m{i}") for i in range(3)]
+    pool = ProviderPool(members)
+
+    limiter = get_rate_limiter("rl-pool-model", pool)
+    assert limiter.scale == 3
+    assert limiter._requests.capacity == 180
+    assert limiter._tokens.capacity == 3000
+
+    members[0].stats.ejected_until = float("inf")
+    limiter = get_rate_limiter("rl-pool-model", pool)
+    assert limiter.scale == 2
+    assert limiter._requests.capacity == 120
+    assert limiter._requests.level <= 120
@@ -0,0 +1,71 @@
+"""
+Тесты очереди ожидающих лимит (llm_runner.core.scheduler)
+"""
+from collections import Counter
+
+import pytest
+
+from llm_runner.core.scheduler import BATCH, INTERACTIVE, FairQueue
+
+
+def drain(queue: FairQueue, count: int):
+    """Обслуживает count запросов из головы очереди"""
+    served = []
+    for _ in range(count):
+        waiter = queue.head()
+        queue.grant(waiter)
+        served.append(waiter)
+    return served
+
+
+def test_interactive_is_served_before_batch():
+    queue = FairQueue()
+    for _ in range(5):
+        queue.push(BATCH, "batch-job")
+    queue.push(INTERACTIVE, "user")
+    queue.push(INTERACTIVE, "user")
+    served = drain(queue, 7)
+    assert [w.priority for w in served] == [INTERACTIVE] * 2 + [BATCH] * 5
+    assert queue.head() is None
+
+
+def test_flows_share_in_proportion_to_weights():
+    queue = FairQueue({"heavy": 3.0, "light": 1.0})
+    for _ in range(100):
+        queue.push(BATCH, "heavy")
+        queue.push(BATCH, "light")
+    shares = Counter(w.flow for w in drain(queue, 80))
+    assert shares["heavy"] == pytest.approx(60, abs=1)
+    assert shares["light"] == pytest.approx(20, abs=1)
+
+
+def test_shares_count_cost_not_requests():
+    queue = FairQueue()
+    for _ in range(50):
+        queue.push(BATCH, "big", cost=4)
+        queue.push(BATCH, "small", cost=1)
+    served = drain(queue, 50)
+    cost = Counter()
+    for waiter in served:
+        cost[waiter.flow] += waiter.cost
+    assert cost["big"] == pytest.approx(cost["small"], abs=4)
+
+
+def test_returning_flow_gets_no_idle_credit():
+    queue = FairQueue()
+    for _ in range(20):
+        queue.push(BATCH, "busy")
+    drain(queue, 10)
+    for _ in range(10):
+        queue.push(BATCH, "late")
+    shares = Counter(w.flow for w in drain(queue, 10))
+    assert shares["busy"] == pytest.approx(5, abs=1)
+
+
+def test_fifo_within_flow_and_remove():
+    queue = FairQueue()
+    first, second, third = (queue.push(BATCH, "f") for _ in range(3))
+    queue.remove(second)
+    assert drain(queue, 2) == [first, third]
+    with pytest.raises(ValueError):
+        queue.push("urgent", "f")
@@ -0,0 +1,61 @@
+"""
+Тесты автоматических метрик (llm_runner.core.scoring)
+"""
+import random
+
+import numpy as np
+import pytest
+
+from llm_runner.core.scoring import METRICS, lcs_length, score_batch, score_pair
+
+
+def lcs_reference(a, b):
+    """LCS таблицей динамического программирования"""
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a, 1):
+        for j, y in enumerate(b, 1):
+            table[i][j] = table[i - 1][j - 1] + 1 if x == y else max(table[i - 1][j], table[i][j - 1])
+    return table[-1][-1]
+
+
+def test_lcs_matches_dynamic_programming():
+    rng = random.Random(7)
+    for _ in range(300):
+        vocabulary = [f"w{i}" for i in range(rng.randint(1, 6))]
+        a = [rng.choice(vocabulary) for _ in range(rng.randint(0, 40))]
+        b = [rng.choice(vocabulary) for _ in range(rng.randint(0, 90))]
+        assert lcs_length(a, b) == lcs_reference(a, b)
+
+
+def test_lcs_longer_than_machine_word():
+    a = [f"t{i % 17}" for i in range(300)]
+    b = [f"t{i % 13}" for i in range(200)]
+    assert lcs_length(a, b) == lcs_reference(a, b)
+
+
+def test_identical_texts_score_one():
+    assert score_pair("The cat sat on the mat", "the cat sat on the mat") == pytest.approx((1.0, 1.0, 1.0, 1.0))
+
+
+def test_disjoint_texts_score_zero():
+    assert score_pair("alpha beta", "gamma delta") == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_rouge_l_of_known_pair():
+    # LCS("a b c d", "a c d e") = 3: P = R = 3/4
+    _, _, rouge_l, _ = score_pair("a b c d", "a c d e")
+    assert rouge_l == pytest.approx(0.75)
+
+
+def test_batch_matches_pairwise_scores():
+    predictions = ["a b c", "hello world", "a b c", ""]
+    references = ["a b d", "hello there world", "a b d", "x"]
+    scores = score_batch(predictions, references, max_workers=1)
+    assert scores.shape == (4, len(METRICS))
+    expected = np.array([score_pair(p, r) for p, r in zip(predictions, references)])
+    assert np.allclose(scores, expected)
+
+
+def test_batch_length_mismatch():
+    with pytest.raises(ValueError):
+        score_batch(["a"], [])
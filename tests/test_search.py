@@ -0,0 +1,115 @@
+"""
+Тесты полнотекстового поиска (FTS5: runs_fts, tasks_fts в llm_runner.db)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from llm_runner.db.models import Run
+from llm_runner.db.repo import RANK_MAX_MATCHES, DatabaseManager, to_fts_query
+
+
+@pytest.fixture
+def db(database):
+    return DatabaseManager()
+
+
+@pytest.fixture
+def task_id(db):
+    with db.get_session() as session:
+        return db.get_task_repo(session).create_task("search", "Explain photosynthesis to a child", input_text="plants").id
+
+
+def create_run(db, task_id, response_text):
+    with db.get_session() as session:
+        return db.get_run_repo(session).create_run(task_id, "comet", "model", {}, [], response_text=response_text).id
+
+
+def found_ids(db, query, **kwargs):
+    with db.get_session() as session:
+        return [hit.item.id for hit in db.get_run_repo(session).search_runs(query, **kwargs)]
+
+
+def count(db, query, **kwargs):
+    with db.get_session() as session:
+        return db.get_run_repo(session).count_search_runs(query, **kwargs)
+
+
+def test_fts_query_escapes_syntax():
+    assert to_fts_query('quantum AND "entangle') == '"quantum" "AND" "entangle"*'
+    assert to_fts_query('*"() -') == ""
+
+
+def test_inserted_run_is_found(db, task_id):
+    run_id = create_run(db, task_id, "Quantum entanglement links particles across distance")
+    create_run(db, task_id, "Bread needs flour, water and salt")
+
+    assert found_ids(db, "entanglement") == [run_id]
+    assert found_ids(db, "quantum entangl") == [run_id]  # последнее слово — префикс
+    assert found_ids(db, "quantum bread") == []          # все слова обязательны
+    assert count(db, "particles") == 1
+    assert found_ids(db, "") == [] and count(db, "") == 0
+
+    with db.get_session() as session:
+        hit = db.get_run_repo(session).search_runs("particles")[0]
+    assert "**particles**" in hit.snippet
+
+
+def test_updated_run_is_reindexed(db, task_id):
+    run_id = create_run(db, task_id, "The capital of France is Paris")
+    with db.get_session() as session:
+        session.get(Run, run_id).response_text = "The capital of Italy is Rome"
+        session.commit()
+
+    assert found_ids(db, "Paris") == []
+    assert found_ids(db, "Rome") == [run_id]
+    assert count(db, "capital") == 1
+
+
+def test_deleted_run_leaves_index(db, task_id):
+    run_id = create_run(db, task_id, "Mitochondria produce energy")
+    with db.get_session() as session:
+        session.delete(session.get(Run, run_id))
+        session.commit()
+
+    assert found_ids(db, "mitochondria") == []
+    assert count(db, "mitochondria") == 0
+
+
+def test_results_are_ranked_by_relevance(db, task_id):
+    weak = create_run(db, task_id, "A long answer that mentions kernels once among many other unrelated words here")
+    strong = create_run(db, task_id, "kernels kernels kernels")
+    assert found_ids(db, "kernels") == [strong, weak]
+    assert found_ids(db, "kernels", limit=1, offset=1) == [weak]
+
+
+def test_search_in_tasks_returns_their_runs(db, task_id):
+    run_ids = {create_run(db, task_id, f"answer {i}") for i in range(3)}
+    assert set(found_ids(db, "photosynthesis", in_tasks=True)) == run_ids
+    assert count(db, "plants", in_tasks=True) == 3
+    with db.get_session() as session:
+        hits = db.get_task_repo(session).search_tasks("photosynth")
+    assert [hit.item.id for hit in hits] == [task_id]
+
+
+def test_frequent_query_is_ordered_newest_first(db, task_id):
+    started = datetime(2026, 1, 1)
+    rows = [
+        {
+            "id": f"run-{i:05d}", "task_id": task_id, "provider": "comet", "model": "model",
+            "started_at": started + timedelta(seconds=i), "response_text": f"common answer number {i}"
+        }
+        for i in range(RANK_MAX_MATCHES + 1)
+    ]
+    with db.get_session() as session:
+        session.execute(insert(Run), rows)
+        session.commit()
+    # Редкое слово все еще ранжируется по релевантности
+    rare = create_run(db, task_id, "common rare rare rare")
+
+    # Совпадений больше RANK_MAX_MATCHES: без bm25, от новых строк к старым
+    assert count(db, "common") == RANK_MAX_MATCHES + 2
+    assert found_ids(db, "common", limit=3) == [rare, f"run-{RANK_MAX_MATCHES:05d}", f"run-{RANK_MAX_MATCHES - 1:05d}"]
+    assert found_ids(db, "common", limit=2, offset=3) == [f"run-{RANK_MAX_MATCHES - 2:05d}", f"run-{RANK_MAX_MATCHES - 3:05d}"]
+    assert found_ids(db, "rare") == [rare]
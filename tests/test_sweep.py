@@ -0,0 +1,37 @@
+"""
+Тесты перебора параметров (llm_runner.core.sweep)
+"""
+import threading
+
+from llm_runner.core.providers.base import Provider, ProviderResult
+from llm_runner.core.sweep import keyword_score, successive_halving
+
+
+class FixedProvider(Provider):
+    """Отвечает мгновенно и всегда одинаково по usage"""
+
+    def __init__(self, prompt_tokens: int = 50, completion_tokens: int = 400):
+        self.usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, messages, model, **params):
+        with self._lock:
+            self.calls += 1
+        return ProviderResult(text="ok", usage=dict(self.usage), finish_reason="stop", raw={}, latency_ms=1)
+
+    def validate_model(self, model):
+        return True
+
+
+def test_first_round_respects_token_budget(database, monkeypatch):
+    monkeypatch.setenv("LLM_RUNNER_BUDGET_WAIT", "1")
+    provider = FixedProvider()
+    configs = [{"temperature": i / 10, "max_tokens": 500} for i in range(30)]
+    result = successive_halving(
+        provider, "gpt-3.5-turbo", [[{"role": "user", "content": "hi"}]], configs,
+        keyword_score(["ok"]), max_tokens_budget=10_000
+    )
+    assert result.budget_exhausted
+    assert 0 < provider.calls < len(configs)
+    assert result.tokens_used <= 10_000
@@ -0,0 +1,64 @@
+"""
+Тесты шаблонов промптов (llm_runner.core.templates)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from llm_runner.core.templates import build_prompt, compile_template, render
+
+
+def test_substitutes_variables_and_keeps_missing():
+    assert render("Переведи {text} на {lang}", {"text": "hello"}) == "Переведи hello на {lang}"
+
+
+def test_format_spec_and_conversion():
+    assert render("{n:>4}|{s!r}", {"n": 7, "s": "x"}) == "   7|'x'"
+
+
+def test_strict_raises_for_missing():
+    with pytest.raises(KeyError):
+        render("{a}", {}, strict=True)
+
+
+@pytest.mark.parametrize("template", ["function f() {", "close }", "if (x) { return {a: 1} }", "}{"])
+def test_stray_braces_are_literal_text(template):
+    assert render(template, {"a": 2}) == template
+
+
+def test_stray_braces_still_substitute_known_fields():
+    template = "def f():\n    return {\n        'lang': '{lang}',\n        'n': {n:>3}\n    "
+    assert render(template, {"lang": "ru", "n": 5}) == "def f():\n    return {\n        'lang': 'ru',\n        'n': {n:>3}\n    "
+    assert compile_template(template).variables == ("lang",)
+
+
+def test_template_without_fields_keeps_escaped_braces():
+    assert render('JSON: {{"a": 1}}', {}) == 'JSON: {{"a": 1}}'
+
+
+def test_escaped_braces_in_template_with_fields():
+    assert render("{{literal}} {x}", {"x": 1}) == "{literal} 1"
+
+
+def test_invalid_spec_keeps_placeholder():
+    assert render("const o = {x: 1}", {"x": "v"}) == "const o = {x: 1}"
+
+
+def test_json_braces_fall_back_to_loose_fields():
+    template = 'Return JSON {"answer": "{x}"}'
+    assert render(template, {"x": 1}) == 'Return JSON {"answer": "1"}'
+    assert compile_template(template).variables == ("x",)
+
+
+def test_invalid_conversion_is_not_dropped():
+    assert render("{x!z} and {y}", {"x": 1, "y": 2}) == "{x!z} and 2"
+
+
+@pytest.mark.parametrize("template", ["{a.b} {x}", "{a[0]} {x}"])
+def test_attribute_and_index_fields_are_text(template):
+    assert render(template, {"x": 1, "a": [5]}) == template.replace("{x}", "1")
+
+
+def test_build_prompt_with_code_in_input():
+    task = SimpleNamespace(prompt_template="Объясни код на {lang}:", input_text="int main() {\n  return 0;\n}", vars_json='{"lang": "C"}')
+    assert build_prompt(task) == "Объясни код на C:\n\nint main() {\n  return 0;\n}"
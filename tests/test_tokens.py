@@ -0,0 +1,36 @@
+"""
+Тесты предварительной проверки запросов (llm_runner.core.tokens)
+"""
+import pytest
+
+from llm_runner.core.tokens import ContextOverflowError, context_window, estimate_batch, preflight
+
+
+def long_prompt(tokens: int):
+    return [{"role": "user", "content": "word " * tokens}]
+
+
+def test_known_model_overflow_is_rejected():
+    with pytest.raises(ContextOverflowError):
+        preflight(long_prompt(5000), "comet-7b", {"max_tokens": 100}, on_overflow="reject")
+
+
+def test_known_model_overflow_is_truncated():
+    messages, estimate = preflight(long_prompt(5000), "comet-7b", {"max_tokens": 100}, on_overflow="truncate")
+    assert estimate.overflow == 0
+    assert len(messages[0]["content"]) < len(long_prompt(5000)[0]["content"])
+
+
+@pytest.mark.parametrize("model", ["deepseek-chat", "llama-3.1-405b", "qwen2.5-72b"])
+def test_unknown_model_is_not_rejected(model):
+    assert context_window(model) is None
+    messages, estimate = preflight(long_prompt(20000), model, {"max_tokens": 4000}, on_overflow="reject")
+    assert messages == long_prompt(20000)
+    assert estimate.context_window is None
+    assert estimate.overflow == 0
+
+
+def test_batch_estimate_flags_only_known_windows():
+    prompts = ["word " * 5000, "short"]
+    assert estimate_batch(prompts, "comet-7b").over_context == [0]
+    assert estimate_batch(prompts, "deepseek-chat").over_context == []
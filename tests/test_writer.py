@@ -0,0 +1,160 @@
+"""
+Тесты группового писателя (llm_runner.db.writer)
+"""
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from llm_runner.db import writer as writer_module
+from llm_runner.db.models import DedupCluster, Run
+from llm_runner.db.repo import DatabaseManager, build_run
+from llm_runner.db.writer import DatabaseWriter, get_database_writer
+
+
+BASE = (
+    "Python is a high-level general-purpose programming language. Its design philosophy "
+    "emphasizes code readability with the use of significant indentation. Python is "
+    "dynamically typed and garbage-collected, and it supports multiple programming paradigms."
+)
+NEAR = BASE.upper().replace(" ", "  ").replace("PARADIGMS", "styles")
+
+
+@pytest.fixture
+def task_id(database):
+    db = DatabaseManager()
+    with db.get_session() as session:
+        return db.get_task_repo(session).create_task("writer", "{input}").id
+
+
+@pytest.fixture
+def writer(database):
+    writer = DatabaseWriter(flush_interval=0.5)
+    yield writer
+    writer.close()
+
+
+class BatchLog:
+    """Запоминает размеры пачек, которые коммитит писатель"""
+
+    def __init__(self, writer):
+        self.sizes = []
+        self.objects = []
+        commit_batch = writer._commit_batch
+
+        def record(batch):
+            self.sizes.append(len(batch))
+            self.objects.append([obj for obj, _, _ in batch])
+            commit_batch(batch)
+
+        writer._commit_batch = record
+
+
+def new_run(task_id, **kwargs):
+    return build_run(task_id=task_id, provider="comet", model=kwargs.pop("model", "model"), params={}, messages=[], **kwargs)
+
+
+def run_count():
+    with DatabaseManager().get_session() as session:
+        return session.scalar(select(func.count()).select_from(Run))
+
+
+def test_submitted_runs_are_committed(writer, task_id):
+    futures = [writer.submit(new_run(task_id, response_text=f"answer {i}")) for i in range(50)]
+    writer.flush(timeout=5)
+
+    assert all(f.done() and f.exception() is None for f in futures)
+    assert run_count() == 50
+
+
+def test_bad_row_does_not_drop_its_batch(writer, task_id):
+    log = BatchLog(writer)
+    good = [writer.submit(new_run(task_id)) for _ in range(3)]
+    bad = writer.submit(new_run(task_id, model=None))  # NOT NULL
+    good += [writer.submit(new_run(task_id)) for _ in range(3)]
+    writer.flush(timeout=5)
+
+    assert log.sizes[0] == 8  # семь запусков и маркер flush — одна пачка
+    assert isinstance(bad.exception(), Exception)
+    assert all(f.exception() is None for f in good)
+    assert run_count() == 6
+
+
+def test_fallback_does_not_keep_rolled_back_clusters(writer, task_id):
+    # Оба ответа в одной пачке: NEAR попадает в кластер BASE, открытый этой же пачкой,
+    # а запуск с BASE не сохраняется — кластер откатывается вместе с ним
+    bad = writer.submit(new_run(task_id, model=None, response_text=BASE))
+    near = writer.submit(new_run(task_id, response_text=NEAR))
+    writer.flush(timeout=5)
+
+    assert bad.exception() is not None
+    run = near.result()
+    with DatabaseManager().get_session() as session:
+        cluster_ids = set(session.scalars(select(DedupCluster.id)))
+        stored = session.get(Run, run.id)
+        assert stored.cluster_id == run.id
+        assert cluster_ids == {run.id}
+
+
+def test_batch_is_cut_at_max_batch(database, task_id):
+    writer = DatabaseWriter(max_batch=3, flush_interval=30)
+    log = BatchLog(writer)
+    try:
+        # Пачка из трех объектов коммитится, не дожидаясь flush_interval
+        futures = [writer.submit(new_run(task_id)) for _ in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        assert log.sizes == [3]
+    finally:
+        writer.close()
+
+
+def test_batch_is_cut_at_flush_interval(database, task_id):
+    writer = DatabaseWriter(max_batch=1000, flush_interval=0.05)
+    try:
+        writer.submit(new_run(task_id)).result(timeout=5)
+        assert writer.pending == 0
+        assert run_count() == 1
+    finally:
+        writer.close()
+
+
+def test_flush_waits_for_earlier_submissions_only(database, task_id):
+    writer = DatabaseWriter(max_batch=2, flush_interval=0.2)
+    log = BatchLog(writer)
+    gate = threading.Event()
+    commit_batch = writer._commit_batch
+
+    def slow(batch):
+        gate.wait(5)
+        commit_batch(batch)
+
+    writer._commit_batch = slow
+    try:
+        before = [writer.submit(new_run(task_id)) for _ in range(3)]
+        marker = writer.submit(None)
+        after = writer.submit(new_run(task_id))
+        gate.set()
+        marker.result(timeout=5)
+
+        # Маркер завершается после всех объектов, поставленных перед ним
+        assert all(f.done() for f in before)
+        after.result(timeout=5)
+        flat = [obj for objects in log.objects for obj in objects]
+        assert flat.index(None) == 3
+    finally:
+        writer.close()
+
+
+def test_close_at_exit_drains_queue(database, task_id, monkeypatch):
+    monkeypatch.setattr(writer_module, "_writers", {})
+    shared = get_database_writer()
+    assert get_database_writer() is shared
+    futures = [shared.submit(new_run(task_id)) for _ in range(10)]
+
+    writer_module._close_writers()
+
+    assert writer_module._writers == {}
+    assert all(f.done() for f in futures)
+    assert shared._thread is None
+    assert run_count() == 10